@@ -0,0 +1,109 @@
+"""
+Benchmarks loading a large upkit.yaml against the former two-pass Jinja rendering and pure-Python YAML loader.
+
+Usage:
+    python benchmarks/bench_config_load.py [--lines 2000] [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import jinja2
+import yaml
+import yamlordereddictloader
+from jinja2 import Template, Environment, meta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upkit.package_linker import PackageLinker  # noqa: E402
+
+
+def legacy_load_config(config_file, params):
+    """
+    The config loading PackageLinker used before single-pass rendering, without params expansion.
+    """
+    with open(config_file, 'r') as fh:
+        content = fh.read()
+
+    params = dict(params,
+                  __cwd__=os.path.abspath(os.getcwd()),
+                  __dir__=os.path.abspath(os.path.dirname(config_file)))
+    result = dict(params)
+
+    template = Template(content)
+    default_variables = set(
+        name for name in dir(template.module)
+        if not name.startswith('__') and getattr(template.module, name)
+    )
+
+    ast = Environment().parse(content)
+    undeclared_variables = meta.find_undeclared_variables(ast)
+    second_pass_params = dict(params)
+
+    for v in undeclared_variables:
+        if v not in second_pass_params and v not in default_variables:
+            second_pass_params[v] = '{{%s}}' % v
+
+    @jinja2.contextfunction
+    def __complete_internal__(context):
+        result.update(context.vars)
+        return ''
+
+    content = '%s\n{{ __complete_internal__() }}' % content
+    content = Template(content).render(__complete_internal__=__complete_internal__, **second_pass_params)
+
+    return result, yaml.load(content, Loader=yamlordereddictloader.Loader)
+
+
+def write_config(path, lines):
+    """
+    Writes a config of about the given number of lines, half params and half links.
+    """
+    links = max(1, lines // 8)
+    params = max(1, lines // 2 - 4)
+
+    with open(path, 'w') as fh:
+        fh.write("{% if root is undefined %}\n  {% set root = __dir__ %}\n{% endif %}\n")
+        fh.write('params:\n')
+        for i in range(params):
+            fh.write("  p%05d: '{{root}}/packages/p%05d'\n" % (i, i))
+        fh.write('links:\n')
+        for i in range(links):
+            fh.write("  - source: '{{p%05d}}'\n" % (i % params))
+            fh.write("    target: '{{root}}/Assets/p%05d'\n" % i)
+            fh.write("    content: ['*.cs', 'Editor']\n")
+            fh.write("    exclude: ['*.meta']\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark config loading.')
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='upkit-bench-')
+    config_file = os.path.join(workdir, 'upkit.yaml')
+    write_config(config_file, args.lines)
+
+    results = []
+    for label, function in (('legacy', lambda: legacy_load_config(config_file, {})),
+                            ('current', lambda: PackageLinker(config_file=config_file))):
+        started = time.time()
+        for _ in range(args.repeat):
+            function()
+        results.append((label, (time.time() - started) / args.repeat))
+
+    with open(config_file, 'r') as fh:
+        print('%d lines' % len(fh.readlines()))
+    for label, elapsed in results:
+        print('%-8s load: %8.3fs' % (label, elapsed))
+    print('speedup  load: %8.1fx' % (results[0][1] / results[1][1]))
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
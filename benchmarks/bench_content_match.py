@@ -0,0 +1,116 @@
+"""
+Benchmarks ContentMatcher against the former matching, one glob.glob per content and exclude pattern, and
+excluding a large sub-folder by pruning against expanding it.
+
+Usage:
+    python benchmarks/bench_content_match.py [--entries 20000] [--repeat 5]
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upkit import utils  # noqa: E402
+from upkit.content_matcher import ContentMatcher  # noqa: E402
+
+CONTENT = ['*.cs', '*.dll', '*.asset', 'Editor', 'Resources', '*.txt']
+EXCLUDE = ['*.meta', 'Test*', '*.pdb', 'readme.txt']
+
+
+def legacy_match(source, content, exclude):
+    exclude_items = set(
+        p for item in exclude for p in glob.glob(os.path.abspath(os.path.join(source, item)))
+    )
+    return [p for item in content for p in glob.glob(os.path.abspath(os.path.join(source, item)))
+            if p not in exclude_items]
+
+
+def current_match(source, content, exclude):
+    return list(ContentMatcher([os.path.abspath(os.path.join(source, i)) for i in content],
+                               [os.path.abspath(os.path.join(source, i)) for i in exclude]).matches())
+
+
+def expanded_exclude(source, folder):
+    """
+    Excludes a sub-folder by expanding every path under source, then filtering.
+    """
+    excluded = os.path.join(source, folder)
+    return [p for p in glob.glob(os.path.join(source, '**'), recursive=True)
+            if p != excluded and not p.startswith(excluded + os.sep)]
+
+
+def pruned_exclude(source, folder):
+    return list(ContentMatcher([os.path.join(source, '*')], [os.path.join(source, folder)]).walk())
+
+
+def make_plugin_tree(folder, entries):
+    for platform in ('Android', 'iOS'):
+        utils.mkdir_p(os.path.join(folder, 'Plugins', platform))
+    for i in range(entries):
+        utils.touch(os.path.join(folder, 'Plugins', 'Android', 'lib%05d.so' % i))
+    utils.touch(os.path.join(folder, 'Plugins', 'iOS', 'lib.a'))
+    utils.touch(os.path.join(folder, 'Scripts.cs'))
+
+
+def make_source_tree(folder, entries):
+    utils.mkdir_p(folder)
+    extensions = ('.cs', '.cs.meta', '.dll', '.dll.meta', '.pdb', '.asset', '.txt')
+    for i in range(entries):
+        prefix = 'Test' if i % 10 == 0 else 'File'
+        utils.touch(os.path.join(folder, '%s%05d%s' % (prefix, i, extensions[i % len(extensions)])))
+    utils.mkdir_p(os.path.join(folder, 'Editor'))
+    utils.mkdir_p(os.path.join(folder, 'Resources'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark content matching.')
+    parser.add_argument('--entries', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='upkit-bench-')
+    source = os.path.join(workdir, 'source')
+    make_source_tree(source, args.entries)
+
+    results = []
+    matches = []
+    for label, function in (('legacy', legacy_match), ('current', current_match)):
+        started = time.time()
+        for _ in range(args.repeat):
+            matched = function(source, CONTENT, EXCLUDE)
+        results.append((label, (time.time() - started) / args.repeat))
+        matches.append(matched)
+
+    if matches[0] != matches[1]:
+        raise RuntimeError('Matched paths differ.')
+
+    print('%d entries, %d patterns, %d matches' % (args.entries, len(CONTENT) + len(EXCLUDE), len(matches[0])))
+    for label, elapsed in results:
+        print('%-8s match: %8.3fs' % (label, elapsed))
+    print('speedup  match: %8.1fx' % (results[0][1] / results[1][1]))
+
+    plugins = os.path.join(workdir, 'plugins')
+    make_plugin_tree(plugins, args.entries)
+
+    results = []
+    for label, function in (('expand', expanded_exclude), ('prune', pruned_exclude)):
+        started = time.time()
+        for _ in range(args.repeat):
+            function(plugins, 'Plugins/Android')
+        results.append((label, (time.time() - started) / args.repeat))
+
+    print('exclude a folder of %d entries' % args.entries)
+    for label, elapsed in results:
+        print('%-8s exclude: %8.3fs' % (label, elapsed))
+    print('speedup  exclude: %8.1fx' % (results[0][1] / results[1][1]))
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmarks link_plan.execute applying a plan serially against a thread pool, and checks both give the same
+layout. Filesystem latency of network or overlay filesystems can be simulated with --latency, which delays each
+symlink, unlink and mkdir system call.
+
+Usage:
+    python benchmarks/bench_fs_executor.py [--folders 50] [--entries 100] [--jobs 1 4 8 16] [--latency 0.5]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upkit import link_plan, utils  # noqa: E402
+from upkit.link_plan import LinkOperation  # noqa: E402
+
+
+def simulate_latency(seconds):
+    """
+    Delays the system calls creating and removing links and folders, sleeping releases the GIL as a blocking
+    system call would.
+    """
+    def delayed(function):
+        def wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return function(*args, **kwargs)
+        return wrapper
+
+    for name in ('symlink', 'unlink', 'mkdir'):
+        setattr(os, name, delayed(getattr(os, name)))
+
+
+def make_plan(workdir, folders, entries):
+    source = os.path.join(workdir, 'source')
+    utils.mkdir_p(source)
+
+    operations = []
+    for f in range(folders):
+        target = os.path.join(workdir, 'target', 'Folder%03d' % f)
+        # a folder split into links to some of its entries, as for excluded entries.
+        operations.append(LinkOperation(LinkOperation.MKDIR, source, os.path.join(target, 'Split')))
+        for i in range(entries):
+            path = os.path.join(source, 'file%03d-%04d.txt' % (f, i))
+            utils.touch(path)
+            operations.append(LinkOperation(LinkOperation.LINK, path, os.path.join(target, os.path.basename(path))))
+        operations.append(LinkOperation(LinkOperation.LINK, path, os.path.join(target, 'Split', 'last.txt')))
+    return operations
+
+
+def layout(folder):
+    result = []
+    for root, folders, files in os.walk(folder):
+        for name in folders + files:
+            path = os.path.join(root, name)
+            result.append((os.path.relpath(path, folder), os.readlink(path) if os.path.islink(path) else None))
+    return sorted(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark applying link plans concurrently.')
+    parser.add_argument('--folders', type=int, default=50)
+    parser.add_argument('--entries', type=int, default=100, help='Links per folder.')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated latency per system call, in ms.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='upkit-bench-')
+    operations = make_plan(workdir, args.folders, args.entries)
+    target = os.path.join(workdir, 'target')
+    if args.latency:
+        simulate_latency(args.latency / 1000.0)
+
+    print('%d operations, %.1fms latency' % (len(operations), args.latency))
+    expected = None
+    baseline = None
+    for jobs in args.jobs:
+        utils.rmdir(target)
+        started = time.time()
+        link_plan.execute(operations, forced=True, jobs=jobs)
+        create = time.time() - started
+
+        # second pass replaces every existing link.
+        started = time.time()
+        link_plan.execute(operations, forced=True, jobs=jobs)
+        replace = time.time() - started
+
+        result = layout(target)
+        if expected is None:
+            expected = result
+        elif result != expected:
+            raise RuntimeError('The layout with %d jobs differs.' % jobs)
+
+        baseline = baseline or (create, replace)
+        print('%3d jobs  create: %8.3fs (%5.1fx)  replace: %8.3fs (%5.1fx)'
+              % (jobs, create, baseline[0] / create, replace, baseline[1] / replace))
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmarks utils.fs_link against the former shell-out implementation (`ln -s`, `rm`).
+
+Usage:
+    python benchmarks/bench_fs_link.py [--entries 10000] [--workdir /tmp/upkit-bench]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import call
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upkit import utils  # noqa: E402
+
+
+def legacy_fs_link(source, target, forced=False):
+    """
+    The shell-out implementation fs_link used before the in-process engine (POSIX only).
+    """
+    source = utils.realpath(source)
+    target = os.path.abspath(target)
+
+    if not os.path.exists(source):
+        raise ValueError('Path "%s" does not exist.' % source)
+
+    if os.path.exists(target):
+        if not forced:
+            raise RuntimeError('Path "%s" exists.' % target)
+
+        if utils.is_link(target):
+            call('rm "%s"' % target, shell=True)
+        else:
+            if os.path.isdir(target):
+                call('rm -rf "%s"' % target, shell=True)
+            else:
+                call('rm "%s"' % target, shell=True)
+    else:
+        utils.mkdir_p(os.path.dirname(target))
+
+    call('ln -s "%s" "%s"' % (source, target), shell=True)
+
+
+def make_source_tree(folder, entries):
+    utils.mkdir_p(folder)
+    for i in range(entries):
+        if i % 2:
+            utils.mkdir_p(os.path.join(folder, 'dir%05d' % i))
+        else:
+            utils.touch(os.path.join(folder, 'file%05d.txt' % i))
+    return sorted(os.listdir(folder))
+
+
+def time_link(link_function, source, target, names):
+    started = time.time()
+    for name in names:
+        link_function(os.path.join(source, name), os.path.join(target, name), forced=True)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fs_link.')
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--workdir', default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='upkit-bench-')
+    source = os.path.join(workdir, 'source')
+    names = make_source_tree(source, args.entries)
+
+    # fs_link prints one line per link, keep it out of the measurement output.
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = []
+        for label, function in (('legacy', legacy_fs_link), ('native', utils.fs_link)):
+            target = os.path.join(workdir, 'target-%s' % label)
+            utils.rmdir(target)
+            create = time_link(function, source, target, names)
+            # second pass replaces every existing link.
+            replace = time_link(function, source, target, names)
+            results.append((label, create, replace))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print('%d entries' % args.entries)
+    for label, create, replace in results:
+        print('%-8s create: %8.3fs  replace: %8.3fs' % (label, create, replace))
+    print('speedup  create: %8.1fx  replace: %8.1fx' % (results[0][1] / results[1][1],
+                                                        results[0][2] / results[1][2]))
+
+    if not args.workdir:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmarks the link modes of materialize.materialize on a synthetic package tree: the time to create a target,
+and the disk space it takes. Modes the filesystem does not support are reported as such.
+
+Usage:
+    python benchmarks/bench_materialize.py [--files 2000] [--size 65536] [--workdir /tmp/upkit-bench]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from upkit import materialize, utils  # noqa: E402
+
+
+def make_source_tree(folder, files, size):
+    data = os.urandom(size)
+    for i in range(files):
+        path = os.path.join(folder, 'dir%03d' % (i // 100), 'file%05d.bin' % i)
+        utils.mkdir_p(os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+
+def free_bytes(folder):
+    st = os.statvfs(folder)
+    return st.f_bavail * st.f_frsize
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark link modes.')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=65536, help='Size of each file in bytes.')
+    parser.add_argument('--workdir', default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='upkit-bench-')
+    source = os.path.join(workdir, 'source')
+    make_source_tree(source, args.files, args.size)
+    print('%d files of %d bytes in "%s", auto picks %s' % (
+        args.files, args.size, workdir,
+        materialize.probe(os.path.join(source, 'dir000', 'file00000.bin'), workdir)))
+
+    for mode in (materialize.SYMLINK, materialize.HARDLINK, materialize.REFLINK, materialize.COPY):
+        target = os.path.join(workdir, 'target-%s' % mode)
+        utils.rmdir(target)
+        os.sync()
+
+        free = free_bytes(workdir)
+        started = time.time()
+        try:
+            materialize.materialize(source, target, mode)
+        except OSError as err:
+            print('%-8s unsupported: %s' % (mode, err.strerror))
+            utils.rmdir(target)
+            continue
+        elapsed = time.time() - started
+        os.sync()
+
+        print('%-8s create: %8.3fs  disk: %8.1f MB' % (mode, elapsed, (free - free_bytes(workdir)) / 1e6))
+        utils.rmdir(target)
+
+    if not args.workdir:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
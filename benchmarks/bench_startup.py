@@ -0,0 +1,99 @@
+"""
+Benchmarks the start up of the upkit command line, which build hooks run many times: the wall time of each
+command in a new interpreter, and the slowest imports reported by `python -X importtime`. Exits with an error if a
+command exceeds its time budget, or imports a module it should not need.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 10] [--budget 1.0] [--top 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# (label, code, budget as a multiple of a bare interpreter start up plus the given seconds, unwanted modules).
+COMMANDS = [
+    ('upkit --version',
+     'import sys; sys.argv = ["upkit", "--version"]\n'
+     'from upkit.tools import execute_from_command_line\n'
+     'try:\n'
+     '    execute_from_command_line()\n'
+     'except SystemExit:\n'
+     '    pass',
+     0.1, ('yaml', 'jinja2', 'xmltodict', 'git')),
+    ('import upkit.package_linker',
+     'import upkit.package_linker',
+     0.3, ('xmltodict', 'git')),
+]
+
+
+def run(code, *options):
+    return subprocess.run([sys.executable] + list(options) + ['-c', code], cwd=ROOT, env=dict(os.environ),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+
+def measure(code, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        started = time.time()
+        run(code)
+        elapsed.append(time.time() - started)
+    return statistics.median(elapsed)
+
+
+def slowest_imports(code, top):
+    """
+    :return: a list of (cumulative seconds, module) of the slowest top-level imports.
+    """
+    imports = []
+    for line in run(code, '-X', 'importtime').stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and module.startswith(' ') and not module.startswith('  '):
+            imports.append((int(cumulative) / 1e6, module.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def loaded_modules(code, modules):
+    check = '%s\nimport sys\nprint("loaded:" + ",".join(m for m in %r if m in sys.modules))' % (code, modules)
+    output = run(check).stdout
+    return [m for m in output[output.rindex('loaded:') + len('loaded:'):].strip().split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the upkit command line start up.')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Scales the budget of each command, e.g. 2 on slow machines.')
+    parser.add_argument('--top', type=int, default=5, help='Number of slowest imports to print.')
+    args = parser.parse_args()
+
+    baseline = measure('pass', args.repeat)
+    print('%-30s %8.3fs' % ('python -c pass', baseline))
+
+    failures = []
+    for label, code, budget, unwanted in COMMANDS:
+        elapsed = measure(code, args.repeat)
+        limit = baseline + budget * args.budget
+        print('%-30s %8.3fs  (budget %.3fs)' % (label, elapsed, limit))
+        for seconds, module in slowest_imports(code, args.top):
+            print('    %-26s %8.3fs' % (module, seconds))
+
+        if elapsed > limit:
+            failures.append('%s took %.3fs, over the %.3fs budget.' % (label, elapsed, limit))
+        loaded = loaded_modules(code, unwanted)
+        if loaded:
+            failures.append('%s imports %s.' % (label, ', '.join(loaded)))
+
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmarks the linker on a generated project, timing each stage separately: config load, template rendering,
+linkspec discovery, content glob expansion, planning, and filesystem linking and relinking.
+
+The project has --packages packages, each with a linkspec linking a wide `content: ['*']` folder and a child
+folder with a chain of --depth nested linkspecs, read when resolving sources. The content folders have --entries
+entries in total, and the config generates its links with a Jinja loop, targets using --params chained
+parameters.
+
+Results are written as JSON, and can be compared with those of another version. Stages using modules or
+methods an older version does not have, e.g. the planning stages before link_plan, are skipped for it, so
+comparisons with such versions only cover config load and template rendering.
+
+Usage:
+    python benchmarks/bench_suite.py [--packages 100] [--entries 10000] [--depth 2] [--params 50] [--repeat 3]
+                                     [--output results.json] [--compare baseline.json] [--workdir DIR]
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import upkit  # noqa: E402
+from upkit import utils  # noqa: E402
+from upkit.package_linker import PackageLinker  # noqa: E402
+
+
+def optional_module(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+# missing from older versions.
+content_matcher = optional_module('upkit.content_matcher')
+link_plan = optional_module('upkit.link_plan')
+linkspec_index = optional_module('upkit.linkspec_index')
+reporting = optional_module('upkit.reporting')
+
+LINKSPEC = """links:
+  - source: '{{__dir__}}/Runtime'
+    target: '{{__target__}}/Runtime'
+    content: ['*']
+    exclude: ['*.tmp']
+  - source: '{{__dir__}}/Nested'
+    target: '{{__target__}}/Nested'
+"""
+
+NESTED_LINKSPEC = """links:
+  - source: '{{__dir__}}/Nested'
+    target: '{{__target__}}/Nested'
+  - source: '{{__dir__}}/Data'
+    target: '{{__target__}}/Data-{{ __target__ | length }}'
+"""
+
+
+def write(path, content):
+    utils.mkdir_p(os.path.dirname(path))
+    with open(path, 'w') as fh:
+        fh.write(content)
+
+
+def make_config(packages, params):
+    lines = ['params:', "  output: '{{__dir__}}/../target'", "  p0: 'value'"]
+    for i in range(1, params):
+        lines.append("  p%d: '{{p%d}}-%d'" % (i, i - 1, i))
+    lines.append('links:')
+    lines.append('{%% for i in range(%d) %%}' % packages)
+    lines.append("  - source: '{{__dir__}}/../packages/pkg{{ '%04d' % i }}/content'")
+    lines.append("    target: '{{output}}/pkg{{ '%%04d' %% i }}/{{p%d}}'" % (params - 1))
+    lines.append('{% endfor %}')
+    return '\n'.join(lines) + '\n'
+
+
+def make_project(workdir, packages, entries, depth, params):
+    """
+    :return: (config file, the folders of every linkspec, the content folders).
+    """
+    linkspec_folders = []
+    content_folders = []
+    per_package = max(1, entries // packages)
+
+    for p in range(packages):
+        content = os.path.join(workdir, 'packages', 'pkg%04d' % p, 'content')
+        write(os.path.join(content, 'linkspec.yaml'), LINKSPEC)
+        linkspec_folders.append(content)
+
+        runtime = os.path.join(content, 'Runtime')
+        utils.mkdir_p(runtime)
+        for i in range(per_package):
+            if i % 10 == 9:
+                utils.mkdir_p(os.path.join(runtime, 'Folder%05d' % i))
+            else:
+                utils.touch(os.path.join(runtime, 'File%05d%s' % (i, '.tmp' if i % 10 == 8 else '.cs')))
+        content_folders.append(runtime)
+
+        nested = content
+        for _ in range(depth):
+            nested = os.path.join(nested, 'Nested')
+            write(os.path.join(nested, 'linkspec.yaml'), NESTED_LINKSPEC)
+            write(os.path.join(nested, 'Data', 'data.txt'), '')
+            linkspec_folders.append(nested)
+        utils.mkdir_p(os.path.join(nested, 'Nested'))
+
+    config_file = os.path.join(workdir, 'project', 'upkit.yaml')
+    write(config_file, make_config(packages, params))
+    return config_file, linkspec_folders, content_folders
+
+
+def create_linker(config_file, manifest_file=None):
+    if manifest_file:
+        return PackageLinker(config_file=config_file, manifest_file=manifest_file)
+    return PackageLinker(config_file=config_file)
+
+
+def bench_config_load(config_file, linkspec_folders, content_folders):
+    create_linker(config_file)
+    return 1
+
+
+def bench_template_render(config_file, linkspec_folders, content_folders):
+    linker = create_linker(config_file)
+    for folder in linkspec_folders:
+        with open(os.path.join(folder, 'linkspec.yaml'), 'r') as fh:
+            content = fh.read()
+        linker._render_template(content, dict(linker.params, __dir__=folder, __target__=folder))
+    return len(linkspec_folders)
+
+
+def bench_linkspec_discovery(config_file, linkspec_folders, content_folders):
+    index = linkspec_index.LinkspecIndex()
+    for folder in linkspec_folders:
+        index.find(folder)
+    return len(linkspec_folders)
+
+
+def bench_glob_expansion(config_file, linkspec_folders, content_folders):
+    count = 0
+    for folder in content_folders:
+        matcher = content_matcher.ContentMatcher([os.path.join(folder, '*')], [os.path.join(folder, '*.tmp')])
+        count += sum(1 for _ in matcher.walk())
+    return count
+
+
+def bench_plan(config_file, linkspec_folders, content_folders):
+    return len(create_linker(config_file).plan())
+
+
+def bench_link(config_file, linkspec_folders, content_folders):
+    linker = create_linker(config_file)
+    operations = linker.plan()
+    utils.rmdir(linker.params['output'])
+    started = time.time()
+    link_plan.execute(operations, forced=True)
+    return len(operations), time.time() - started
+
+
+def bench_relink(config_file, linkspec_folders, content_folders):
+    manifest_file = os.path.join(os.path.dirname(config_file), '.upkit', 'manifest.json')
+    linker = create_linker(config_file, manifest_file)
+    if not os.path.isfile(manifest_file):
+        linker.run()
+        linker = create_linker(config_file, manifest_file)
+
+    operations = linker.plan()
+    started = time.time()
+    linker.apply(operations)
+    return len(operations), time.time() - started
+
+
+_HAS_PLAN = link_plan is not None and hasattr(PackageLinker, 'plan')
+
+# (name, function, whether this version supports it)
+STAGES = [
+    ('config_load', bench_config_load, True),
+    ('template_render', bench_template_render, True),
+    ('linkspec_discovery', bench_linkspec_discovery, linkspec_index is not None),
+    ('glob_expansion', bench_glob_expansion, content_matcher is not None),
+    ('plan', bench_plan, _HAS_PLAN),
+    ('link', bench_link, _HAS_PLAN),
+    ('relink', bench_relink, _HAS_PLAN and hasattr(PackageLinker, 'apply')),
+]
+
+
+def run_stage(function, repeat, *args):
+    runs = []
+    items = 0
+    for _ in range(repeat):
+        started = time.time()
+        result = function(*args)
+        elapsed = time.time() - started
+        # stages returning their own timing exclude their setup.
+        items, elapsed = result if isinstance(result, tuple) else (result, elapsed)
+        runs.append(elapsed)
+    return {'seconds': statistics.median(runs), 'runs': runs, 'items': items}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the linker on a generated project.')
+    parser.add_argument('--packages', type=int, default=100)
+    parser.add_argument('--entries', type=int, default=10000, help='Content entries across all packages.')
+    parser.add_argument('--depth', type=int, default=2, help='Nested linkspecs per package.')
+    parser.add_argument('--params', type=int, default=50, help='Chained config parameters.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', nargs='*', default=[name for name, _, _ in STAGES])
+    parser.add_argument('--output', default=None, help='JSON results file, default to standard output.')
+    parser.add_argument('--compare', default=None, help='JSON results of another run to compare with.')
+    parser.add_argument('--workdir', default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='upkit-bench-')
+    started = time.time()
+    project = make_project(workdir, args.packages, args.entries, args.depth, args.params)
+    generated = time.time() - started
+
+    # only errors are reported, out of the JSON results.
+    if reporting is not None:
+        reporting.set_reporter(reporting.Reporter(level=reporting.QUIET, stream=sys.stderr))
+
+    results = {}
+    for name, function, supported in STAGES:
+        if name not in args.stages:
+            continue
+        if not supported:
+            print('%-20s skipped, not supported by this version' % name, file=sys.stderr)
+            continue
+        results[name] = run_stage(function, args.repeat, *project)
+
+    report = {
+        'version': upkit.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'packages': args.packages, 'entries': args.entries, 'depth': args.depth,
+                       'params': args.params, 'repeat': args.repeat},
+        'generate_seconds': generated,
+        'results': results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as fh:
+            baseline = json.load(fh)['results']
+
+    for name, result in sorted(results.items(), key=lambda i: [n for n, _, _ in STAGES].index(i[0])):
+        line = '%-20s %8.3fs %8d items' % (name, result['seconds'], result['items'])
+        if baseline and name in baseline and result['seconds']:
+            line += '  %6.2fx' % (baseline[name]['seconds'] / result['seconds'])
+        print(line, file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if not args.workdir:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
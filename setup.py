@@ -23,9 +23,10 @@ setuptools.setup(
     packages=['upkit'],
     package_dir={'upkit': 'upkit'},
     package_data={'upkit': ['data/**/*']},
-    install_requires=['xmltodict', 'pyyaml', 'yamlordereddictloader', 'jinja2', 'gitpython', ],
+    install_requires=['xmltodict', 'pyyaml', 'jinja2', 'gitpython', ],
+    python_requires='>=3.6',
     classifiers=[
-        'Programming Language :: Python :: 2',
+        'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
@@ -0,0 +1,92 @@
+import glob
+import os
+import unittest
+
+from upkit import utils
+from upkit.content_matcher import ContentMatcher
+from upkit.link_plan import LinkOperation
+
+
+class ContentMatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.source = os.path.abspath('../temp/output/content-matcher')
+        utils.rmdir(self.source)
+        for path in ('a.cs', 'a.cs.meta', 'b.txt', '.hidden', '.hidden.cs', 'Editor/e.cs', 'Editor/e.txt',
+                     'Plugins/Android/lib.so', 'Plugins/iOS/lib.a', 'Plugins/readme.txt', '[x]/y.cs'):
+            utils.mkdir_p(os.path.dirname(os.path.join(self.source, path)))
+            utils.touch(os.path.join(self.source, path))
+        os.symlink(os.path.join(self.source, 'Editor'), os.path.join(self.source, 'EditorLink'))
+
+    def _patterns(self, items):
+        return [('!' if i.startswith('!') else '') + os.path.abspath(os.path.join(self.source, i.lstrip('!')))
+                for i in items]
+
+    def _glob(self, content, exclude):
+        exclude_items = set(p for i in self._patterns(exclude) for p in glob.glob(i))
+        return [p for i in self._patterns(content) for p in glob.glob(i) if p not in exclude_items]
+
+    def _match(self, content, exclude):
+        return list(ContentMatcher(self._patterns(content), self._patterns(exclude)).matches())
+
+    def test_match_as_glob(self):
+        cases = [
+            (['*'], []),
+            (['*'], ['*.meta', '.hidden']),
+            (['*.cs', '*'], ['Editor']),
+            (['.*'], []),
+            (['*/*.cs'], []),
+            (['Plugins/*'], ['Plugins/Android']),
+            (['Plugins/*/*'], ['*/iOS/*']),
+            (['*/*'], ['Edit?r/*.txt', 'EditorLink/*']),
+            (['**'], ['E*']),
+            (['Editor', 'a.cs', 'missing', 'missing/*'], ['Editor/e.cs']),
+            (['[[]x]/*', '[!a]*'], ['[[]x]']),
+            (['../content-matcher/*.cs'], ['a.cs']),
+            (['*'], [os.path.abspath('../temp/output/content-matcher/b.txt')]),
+        ]
+
+        for content, exclude in cases:
+            self.assertEqual(self._glob(content, exclude), self._match(content, exclude), (content, exclude))
+
+    def test_list_each_folder_once(self):
+        matcher = ContentMatcher(self._patterns(['*.cs', '*.txt', 'Plugins/*']), self._patterns(['*.meta', 'b*']))
+        list(matcher.matches())
+
+        self.assertEqual(sorted([self.source, os.path.join(self.source, 'Plugins')]), sorted(matcher._listings))
+
+    def _walk(self, content, exclude):
+        matcher = ContentMatcher(self._patterns(content), self._patterns(exclude))
+        return sorted((kind, path) for kind, _, path in matcher.walk()), matcher
+
+    def test_split_folders_with_excluded_entries(self):
+        items, matcher = self._walk(['Plugins', 'Editor'], ['Plugins/Android', '*.meta'])
+
+        self.assertEqual([(LinkOperation.LINK, 'Editor'),
+                          (LinkOperation.LINK, 'Plugins/iOS'),
+                          (LinkOperation.LINK, 'Plugins/readme.txt'),
+                          (LinkOperation.MKDIR, 'Plugins')], items)
+        self.assertNotIn(os.path.join(self.source, 'Plugins/Android'), matcher._listings)
+
+    def test_exclude_recursive_patterns(self):
+        items, matcher = self._walk(['*'], ['**/*.txt', '**/Android'])
+
+        self.assertEqual([(LinkOperation.LINK, 'Editor/e.cs'),
+                          (LinkOperation.LINK, 'EditorLink/e.cs'),
+                          (LinkOperation.LINK, 'Plugins/iOS/lib.a'),
+                          (LinkOperation.LINK, '[x]/y.cs'),
+                          (LinkOperation.LINK, 'a.cs'),
+                          (LinkOperation.LINK, 'a.cs.meta'),
+                          (LinkOperation.MKDIR, 'Editor'),
+                          (LinkOperation.MKDIR, 'EditorLink'),
+                          (LinkOperation.MKDIR, 'Plugins'),
+                          (LinkOperation.MKDIR, 'Plugins/iOS'),
+                          (LinkOperation.MKDIR, '[x]')], items)
+
+    def test_reinclude_negated_patterns(self):
+        items, _ = self._walk(['Plugins'], ['Plugins/*', '!Plugins/iOS', 'Plugins/iOS/*.a'])
+
+        self.assertEqual([(LinkOperation.MKDIR, 'Plugins'),
+                          (LinkOperation.MKDIR, 'Plugins/iOS')], items)
+
+        items, _ = self._walk(['*.cs*'], ['*.cs', '!a.cs'])
+        self.assertEqual([(LinkOperation.LINK, 'a.cs'), (LinkOperation.LINK, 'a.cs.meta')], items)
@@ -0,0 +1,238 @@
+import os
+import unittest
+from subprocess import check_call, check_output
+
+from upkit import utils
+from upkit.lockfile import Lockfile
+from upkit.package_linker import PackageLinker
+
+
+def _git(cwd, *args):
+    check_call(('git', '-c', 'user.name=upkit', '-c', 'user.email=upkit@localhost', '-c', 'init.defaultBranch=master')
+               + args, cwd=cwd)
+
+
+def _commit(repo, path, content):
+    file_path = os.path.join(repo, path)
+    utils.mkdir_p(os.path.dirname(file_path))
+    with open(file_path, 'w') as fh:
+        fh.write(content)
+    _git(repo, 'add', '-A')
+    _git(repo, 'commit', '-q', '-m', 'Add %s' % path)
+
+
+class GitResolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/git-resolver')
+        utils.rmdir(self.output)
+
+        self.origin = os.path.join(self.output, 'origin')
+        utils.mkdir_p(self.origin)
+        _git(self.origin, 'init', '-q')
+        _commit(self.origin, 'README.md', 'master')
+        _git(self.origin, 'tag', 'tag-1')
+        _git(self.origin, 'checkout', '-q', '-b', 'feature/ccc')
+        _commit(self.origin, 'ccc/333.txt', 'ccc')
+        _git(self.origin, 'checkout', '-q', 'master')
+
+        self.uri = 'file://%s' % self.origin
+        self.package_folder = os.path.join(self.output, 'packages')
+        self.target = os.path.join(self.output, 'lib-a')
+
+    def _link(self, source, **kwargs):
+        linker = PackageLinker(package_folder=self.package_folder, **kwargs)
+        linker.link(source=source, target=self.target, forced=True)
+        return linker
+
+    def _mirrors(self):
+        return os.listdir(os.path.join(self.package_folder, '.git-mirrors'))
+
+    def test_resolve_default_branch(self):
+        self._link('git:%s' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'ccc')))
+
+    def test_resolve_branch_and_path(self):
+        self._link('git:%s@feature/ccc#ccc' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, '333.txt')))
+
+    def test_resolve_tag(self):
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        self._link('git:%s@tag-1' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'eee')))
+
+    def test_resolve_invalid_branch(self):
+        with self.assertRaises(ValueError):
+            self._link('git:%s@missing' % self.uri)
+
+    def test_resolve_invalid_branch_shallow(self):
+        with self.assertRaises(ValueError):
+            self._link('git:%s@missing?shallow' % self.uri)
+
+    def test_report_fetch_errors_shallow(self):
+        from git.exc import GitCommandError
+
+        with self.assertRaises(GitCommandError):
+            self._link('git:file://%s@master?shallow' % os.path.join(self.output, 'missing'))
+
+    def test_share_mirror_between_branches(self):
+        self._link('git:%s' % self.uri)
+        self._link('git:%s@feature/ccc' % self.uri)
+
+        self.assertEqual(1, len(self._mirrors()))
+        self.assertTrue(os.path.isdir(os.path.join(self.target, 'ccc')))
+
+    def test_keep_mirror_on_failed_fetch(self):
+        self._link('git:%s@feature/ccc' % self.uri)
+        worktree = os.path.dirname(os.path.realpath(os.path.join(self.target, 'ccc')))
+
+        utils.rmdir(self.origin)
+        with self.assertRaises(Exception):
+            self._link('git:%s' % self.uri)
+
+        self.assertEqual(1, len(self._mirrors()))
+        check_call(['git', 'status', '-s'], cwd=worktree)
+
+    def test_update_existing_worktree(self):
+        self._link('git:%s' % self.uri)
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        self._link('git:%s' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'eee', '555.txt')))
+        self.assertEqual(1, len(self._mirrors()))
+
+    def test_resolve_shallow(self):
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        self._link('git:%s?depth=1' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'eee', '555.txt')))
+        self.assertEqual(b'1', check_output(['git', 'rev-list', '--count', 'HEAD'], cwd=self.target).strip())
+        self.assertEqual(1, len(self._mirrors()))
+        self.assertTrue(self._mirrors()[0].endswith('.shallow.git'))
+
+    def test_resolve_shallow_branch(self):
+        self._link('git:%s@feature/ccc?shallow#ccc' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, '333.txt')))
+
+    def test_resolve_sparse(self):
+        self._link('git:%s@feature/ccc?sparse#ccc' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, '333.txt')))
+        worktree = os.path.dirname(os.path.realpath(self.target))
+        self.assertTrue(os.path.isfile(os.path.join(worktree, 'README.md')))
+
+    def test_resolve_shallow_and_sparse(self):
+        _git(self.origin, 'checkout', '-q', 'feature/ccc')
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        self._link('git:%s@feature/ccc?depth=1&sparse#ccc' % self.uri)
+
+        worktree = os.path.dirname(os.path.realpath(self.target))
+        self.assertTrue(os.path.isfile(os.path.join(self.target, '333.txt')))
+        self.assertFalse(os.path.exists(os.path.join(worktree, 'eee')))
+
+    def test_resolve_unknown_option(self):
+        with self.assertRaises(ValueError):
+            self._link('git:%s?unknown' % self.uri)
+
+    def test_resolve_pinned_commit_without_network(self):
+        commit = check_output(['git', 'rev-parse', 'tag-1'], cwd=self.origin).strip().decode('ascii')
+        self._link('git:%s@%s' % (self.uri, commit))
+
+        # the remote is gone, the pinned commit is already checked out.
+        utils.rmdir(self.origin)
+        self._link('git:%s@%s' % (self.uri, commit))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'ccc')))
+
+    def test_resolve_pinned_commit_shallow(self):
+        commit = check_output(['git', 'rev-parse', 'tag-1'], cwd=self.origin).strip().decode('ascii')
+        self._link('git:%s@%s?shallow' % (self.uri, commit))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'ccc')))
+
+    def test_lock_resolved_commit(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        linker = self._link('git:%s@feature/ccc' % self.uri, lock_file=lock_file)
+        linker.lockfile.save()
+
+        commit = check_output(['git', 'rev-parse', 'feature/ccc'], cwd=self.origin).strip().decode('ascii')
+        tree = check_output(['git', 'rev-parse', 'feature/ccc^{tree}'], cwd=self.origin).strip().decode('ascii')
+        self.assertEqual({'git:%s@feature/ccc' % self.uri: {'commit': commit, 'tree': tree}},
+                         Lockfile.load(lock_file).entries)
+
+    def test_link_frozen_from_lock_file(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        self._link('git:%s' % self.uri, lock_file=lock_file).lockfile.save()
+
+        # new commits and a missing remote are ignored.
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        self._link('git:%s@feature/ccc' % self.uri)
+        utils.rmdir(self.origin)
+
+        self._link('git:%s' % self.uri, lock_file=lock_file, frozen=True)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'eee')))
+
+    def test_link_locked_commit(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        self._link('git:%s' % self.uri, lock_file=lock_file).lockfile.save()
+        locked = Lockfile.load(lock_file).entries
+
+        # the locked commit is fetched again on a machine without the package folder.
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        utils.rmdir(self.package_folder)
+        self._link('git:%s' % self.uri, lock_file=lock_file).lockfile.save()
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'eee')))
+        self.assertEqual(locked, Lockfile.load(lock_file).entries)
+
+        self._link('git:%s' % self.uri, lock_file=lock_file, update_lock=True).lockfile.save()
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'eee', '555.txt')))
+        self.assertNotEqual(locked, Lockfile.load(lock_file).entries)
+
+    def test_link_locked_commit_shallow(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        self._link('git:%s?shallow' % self.uri, lock_file=lock_file).lockfile.save()
+
+        _commit(self.origin, 'eee/555.txt', 'eee')
+        utils.rmdir(self.package_folder)
+        self._link('git:%s?shallow' % self.uri, lock_file=lock_file)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'eee')))
+
+    def test_link_frozen_with_mismatching_tree(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        self._link('git:%s' % self.uri, lock_file=lock_file).lockfile.save()
+
+        lockfile = Lockfile.load(lock_file)
+        lockfile.get('git:%s@' % self.uri)['tree'] = '0' * 40
+        lockfile.save()
+
+        with self.assertRaises(ValueError):
+            self._link('git:%s' % self.uri, lock_file=lock_file, frozen=True)
+
+    def test_link_frozen_without_lock(self):
+        with self.assertRaises(ValueError):
+            self._link('git:%s' % self.uri, lock_file=os.path.join(self.output, 'upkit.lock'), frozen=True)
+
+    def test_replace_existing_clone(self):
+        # folders created by full clones of previous versions are replaced by worktrees.
+        linker = PackageLinker(package_folder=self.package_folder)
+        repo_path = os.path.join(self.package_folder, linker.source_resolvers[1]._to_folder_name(self.uri))
+        _git(self.output, 'clone', '-q', self.origin, repo_path)
+
+        self._link('git:%s' % self.uri)
+
+        self.assertTrue(os.path.isfile(os.path.join(repo_path, '.git')))
+        self.assertTrue(os.path.isfile(os.path.join(self.target, 'README.md')))
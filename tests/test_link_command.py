@@ -1,6 +1,9 @@
+import json
 import os
+import sys
 import unittest
 from collections import namedtuple
+from io import StringIO
 
 from upkit import utils
 from upkit.tools import LinkPackageCommand
@@ -51,3 +54,47 @@ class LinkPackageCommandTestCase(unittest.TestCase):
         self.assertTrue(os.path.isfile(os.path.join(output, 'Assets/Plugins/ios-plugin.meta')))
         self.assertFalse(os.path.exists(os.path.join(output, 'Assets/.gitignore')))
 
+
+    def test_should_report_template_cache_hit_rate(self):
+        utils.rmdir('../temp/output/project-a')
+
+        command = LinkPackageCommand()
+
+        args_type = namedtuple('args', ['config', 'package_folder', 'params', 'output'])
+        args = args_type(config='../test_data/project-a/upkit.yaml', package_folder='../temp/packages', params={},
+                         output='json')
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            command.run(args)
+            events = [json.loads(line) for line in sys.stdout.getvalue().splitlines()]
+        finally:
+            sys.stdout = stdout
+
+        cache = [e for e in events if e['event'] == 'cache']
+        self.assertEqual(['templates'], [e['cache'] for e in cache])
+        self.assertTrue(0.0 < cache[0]['hit_rate'] <= 1.0)
+
+    def test_should_print_plan_on_dry_run(self):
+        output = '../temp/output/project-a'
+        utils.rmdir(output)
+
+        command = LinkPackageCommand()
+
+        args_type = namedtuple('args', ['config', 'package_folder', 'params', 'dry_run'])
+        args = args_type(config='../test_data/project-a/upkit.yaml', package_folder='../temp/packages', params={},
+                         dry_run=True)
+
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            command.run(args)
+            plan = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+
+        self.assertFalse(os.path.exists(output))
+        self.assertTrue(plan)
+        self.assertTrue(all(i['kind'] == 'link' for i in plan))
+        self.assertIn(os.path.abspath(os.path.join(output, 'Assets/Scripts')), [i['target'] for i in plan])
@@ -0,0 +1,97 @@
+import os
+import unittest
+
+from upkit import utils
+from upkit.link_manifest import LinkManifest
+from upkit.link_plan import LinkOperation, execute
+
+
+class LinkManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/manifest')
+        utils.rmdir(self.output)
+        self.manifest_file = os.path.join(self.output, '.upkit', 'manifest.json')
+        self.source = os.path.abspath('../test_data/lib-a.1.0.5/content')
+
+    def _operations(self, *names):
+        return [LinkOperation(LinkOperation.LINK, os.path.join(self.source, name), os.path.join(self.output, name))
+                for name in names]
+
+    def test_load_missing_manifest(self):
+        manifest = LinkManifest.load(self.manifest_file)
+        self.assertEqual({}, manifest.entries)
+
+    def test_keep_unchanged_links(self):
+        execute(self._operations('data0.txt', 'data1.txt'), forced=True,
+                manifest=LinkManifest.load(self.manifest_file))
+        inode = os.lstat(os.path.join(self.output, 'data0.txt')).st_ino
+
+        execute(self._operations('data0.txt', 'data1.txt'), forced=True,
+                manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertEqual(inode, os.lstat(os.path.join(self.output, 'data0.txt')).st_ino)
+        self.assertEqual(2, len(LinkManifest.load(self.manifest_file).entries))
+
+    def test_relink_changed_links(self):
+        execute(self._operations('data0.txt'), forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        target = os.path.join(self.output, 'data0.txt')
+        operation = LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'data1.txt'), target)
+        execute([operation], forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertEqual(os.path.join(self.source, 'data1.txt'), os.readlink(target))
+
+    def test_relink_removed_links(self):
+        execute(self._operations('data0.txt'), forced=True, manifest=LinkManifest.load(self.manifest_file))
+        os.unlink(os.path.join(self.output, 'data0.txt'))
+
+        execute(self._operations('data0.txt'), forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.output, 'data0.txt')))
+
+    def test_relink_links_to_removed_sources(self):
+        source = os.path.join(self.output, 'source')
+        utils.mkdir_p(source)
+        utils.touch(os.path.join(source, 'data.txt'))
+        operations = [LinkOperation(LinkOperation.LINK, os.path.join(source, 'data.txt'),
+                                    os.path.join(self.output, 'data.txt'))]
+        execute(operations, forced=True, manifest=LinkManifest.load(self.manifest_file))
+        utils.rmdir(source)
+
+        with self.assertRaises(ValueError):
+            execute(operations, forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+    def test_remove_stale_links(self):
+        execute(self._operations('data0.txt', 'data1.txt'), forced=True,
+                manifest=LinkManifest.load(self.manifest_file))
+        execute(self._operations('data0.txt'), forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.output, 'data0.txt')))
+        self.assertFalse(os.path.lexists(os.path.join(self.output, 'data1.txt')))
+        self.assertEqual([os.path.join(self.output, 'data0.txt')],
+                         list(LinkManifest.load(self.manifest_file).entries.keys()))
+
+    def test_keep_stale_targets_replaced_by_user(self):
+        execute(self._operations('data0.txt'), forced=True, manifest=LinkManifest.load(self.manifest_file))
+        target = os.path.join(self.output, 'data0.txt')
+        os.unlink(target)
+        utils.touch(target)
+
+        execute([], forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertTrue(os.path.isfile(target))
+        self.assertFalse(os.path.islink(target))
+
+    def test_split_linked_folder(self):
+        source = os.path.abspath('../test_data/lib-a.1.0.4/content')
+        target = os.path.join(self.output, 'content')
+        execute([LinkOperation(LinkOperation.LINK, source, target)], forced=True,
+                manifest=LinkManifest.load(self.manifest_file))
+
+        execute([LinkOperation(LinkOperation.MKDIR, source, target),
+                 LinkOperation(LinkOperation.LINK, os.path.join(source, 'child0'), os.path.join(target, 'child0'))],
+                forced=True, manifest=LinkManifest.load(self.manifest_file))
+
+        self.assertFalse(os.path.islink(target))
+        self.assertEqual(['child0'], os.listdir(target))
+        self.assertTrue(os.path.isfile(os.path.join(target, 'child0/data.txt')))
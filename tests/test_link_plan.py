@@ -0,0 +1,212 @@
+import os
+import unittest
+
+from upkit import link_plan, utils
+from upkit.link_manifest import LinkManifest
+from upkit.link_plan import LinkOperation, execute
+
+
+class LinkPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/link-plan')
+        utils.rmdir(self.output)
+        self.source = os.path.join(self.output, 'source')
+        for i in range(10):
+            utils.mkdir_p(os.path.join(self.source, 'folder%d' % i))
+            utils.touch(os.path.join(self.source, 'file%d.txt' % i))
+
+    def _operations(self, target):
+        operations = []
+        for f in range(10):
+            folder = os.path.join(target, 'folder%d' % f)
+            for i in range(10):
+                operations.append(LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'file%d.txt' % i),
+                                                os.path.join(folder, 'file%d.txt' % i)))
+            # a linked folder replaced by a folder of links, and a target linked twice.
+            operations.append(LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'folder%d' % f),
+                                            os.path.join(folder, 'split')))
+            operations.append(LinkOperation(LinkOperation.MKDIR, os.path.join(self.source, 'folder%d' % f),
+                                            os.path.join(folder, 'split')))
+            operations.append(LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'file0.txt'),
+                                            os.path.join(folder, 'split', 'data.txt')))
+            operations.append(LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'file1.txt'),
+                                            os.path.join(folder, 'split', 'data.txt')))
+            operations.append(LinkOperation(LinkOperation.COPY, os.path.join(self.source, 'file2.txt'),
+                                            os.path.join(folder, 'split', 'copy.txt')))
+        return operations
+
+    def _layout(self, folder):
+        result = []
+        for root, folders, files in os.walk(folder):
+            for name in folders + files:
+                path = os.path.join(root, name)
+                result.append((os.path.relpath(path, folder), os.readlink(path) if os.path.islink(path) else None))
+        return sorted(result)
+
+    def test_execute_concurrently_as_serially(self):
+        serial = os.path.join(self.output, 'serial')
+        concurrent = os.path.join(self.output, 'concurrent')
+
+        self.assertEqual((130, 0, 0), execute(self._operations(serial), forced=True))
+        self.assertEqual((130, 0, 0), execute(self._operations(concurrent), forced=True, jobs=8))
+        self.assertEqual(self._layout(serial), self._layout(concurrent))
+        self.assertEqual(os.path.join(self.source, 'file1.txt'),
+                         os.readlink(os.path.join(concurrent, 'folder0', 'split', 'data.txt')))
+
+        results = []
+        for target, jobs in ((serial, 1), (concurrent, 8)):
+            manifest_file = os.path.join(self.output, '%s.json' % os.path.basename(target))
+            for _ in range(2):
+                results.append(execute(self._operations(target), forced=True,
+                                       manifest=LinkManifest.load(manifest_file), jobs=jobs))
+        self.assertEqual(results[:2], results[2:])
+        self.assertEqual(self._layout(serial), self._layout(concurrent))
+
+    def test_batch_targets_under_other_targets_separately(self):
+        operations = [LinkOperation(LinkOperation.LINK, self.source, os.path.join(self.output, path))
+                      for path in ('a/1', 'a/2', 'a/1', 'b', 'b/1', 'a/3', 'a')]
+
+        self.assertEqual([['a/1', 'a/2', 'a/1', 'b'], ['b/1', 'a/3'], ['a']],
+                         [[os.path.relpath(o.target, self.output) for o in batch]
+                          for batch in link_plan._batches(operations)])
+
+
+class CollapseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/collapse')
+        utils.rmdir(self.output)
+        self.source = os.path.join(self.output, 'source')
+        for i in range(3):
+            utils.mkdir_p(os.path.join(self.source, 'folder%d' % i))
+            utils.touch(os.path.join(self.source, 'file%d.txt' % i))
+        self.target = os.path.join(self.output, 'target')
+
+    def _operations(self, names=None):
+        names = sorted(os.listdir(self.source)) if names is None else names
+        return [LinkOperation(LinkOperation.LINK, os.path.join(self.source, name), os.path.join(self.target, name),
+                              folder=(self.source, self.target)) for name in names]
+
+    def _visible_tree(self, folder):
+        result = []
+        for root, folders, files in os.walk(folder, followlinks=True):
+            result.extend(os.path.relpath(os.path.join(root, name), folder) for name in folders + files)
+        return sorted(result)
+
+    def test_collapse_links_to_all_entries(self):
+        operations = link_plan.collapse(self._operations())
+        self.assertEqual([LinkOperation(LinkOperation.LINK, self.source, self.target)], operations)
+
+        execute(self._operations(), forced=True)
+        expected = self._visible_tree(self.target)
+        utils.rmdir(self.target)
+
+        # a target folder of links from a previous run is replaced.
+        execute(self._operations(), forced=True)
+        execute(link_plan.collapse(self._operations()), forced=True)
+        self.assertTrue(utils.is_link(self.target))
+        self.assertEqual(expected, self._visible_tree(self.target))
+
+    def test_keep_links_to_entries(self):
+        operations = self._operations()
+
+        # an entry left out, e.g. hidden or excluded.
+        self.assertEqual(operations[1:], link_plan.collapse(operations[1:]))
+
+        # another operation in the target folder.
+        other = LinkOperation(LinkOperation.LINK, self.source, os.path.join(self.target, 'folder0', 'other'))
+        self.assertEqual(operations + [other], link_plan.collapse(operations + [other]))
+
+        # a folder created outside of the plan.
+        self.assertEqual(operations, link_plan.collapse(operations, reserved=[os.path.join(self.target, 'folder0')]))
+
+        # a file already in the target folder.
+        utils.mkdir_p(self.target)
+        utils.touch(os.path.join(self.target, 'file.txt'))
+        self.assertEqual(operations, link_plan.collapse(operations))
+
+    def test_split_collapsed_target(self):
+        execute(link_plan.collapse(self._operations()), forced=True)
+        utils.touch(os.path.join(self.source, '.hidden'))
+
+        operations = link_plan.collapse(self._operations(['file0.txt']))
+        self.assertEqual([LinkOperation.MKDIR, LinkOperation.LINK], [o.kind for o in operations])
+
+        execute(operations, forced=True)
+        self.assertFalse(utils.is_link(self.target))
+        self.assertEqual(['file0.txt'], os.listdir(self.target))
+        self.assertTrue(os.path.exists(os.path.join(self.source, '.hidden')))
+
+
+class StagedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/staged')
+        utils.rmdir(self.output)
+        self.source = os.path.join(self.output, 'source')
+        for i in range(3):
+            utils.mkdir_p(os.path.join(self.source, 'folder%d' % i))
+            utils.touch(os.path.join(self.source, 'file%d.txt' % i))
+
+        self.root = os.path.join(self.output, 'project', 'Assets')
+        utils.mkdir_p(self.root)
+        with open(os.path.join(self.root, 'own.txt'), 'w') as fh:
+            fh.write('own')
+        self.manifest_file = os.path.join(self.output, 'manifest.json')
+
+    def _operations(self, names):
+        return [LinkOperation(LinkOperation.LINK, os.path.join(self.source, name), os.path.join(self.root, name))
+                for name in names]
+
+    def _execute_staged(self, operations):
+        return link_plan.execute_staged(operations, self.root, forced=True,
+                                        manifest=LinkManifest.load(self.manifest_file))
+
+    def test_execute_staged(self):
+        settings = LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'folder0'),
+                                 os.path.join(self.output, 'project', 'ProjectSettings'))
+        self.assertEqual((4, 0, 0), self._execute_staged(self._operations(['file0.txt', 'folder0', 'folder1']) +
+                                                         [settings]))
+        self.assertEqual((0, 2, 2), self._execute_staged(self._operations(['file0.txt']) + [settings]))
+
+        self.assertEqual(sorted(['own.txt', 'file0.txt']), sorted(os.listdir(self.root)))
+        self.assertEqual(os.path.join(self.source, 'file0.txt'), os.readlink(os.path.join(self.root, 'file0.txt')))
+        with open(os.path.join(self.root, 'own.txt')) as fh:
+            self.assertEqual('own', fh.read())
+        self.assertEqual(sorted(['Assets', 'ProjectSettings']), sorted(os.listdir(os.path.dirname(self.root))))
+        self.assertEqual(sorted([os.path.join(self.root, 'file0.txt'), settings.target]),
+                         sorted(LinkManifest.load(self.manifest_file).entries))
+
+    def test_keep_previous_tree_on_error(self):
+        self._execute_staged(self._operations(['file0.txt']))
+
+        with self.assertRaises(ValueError):
+            self._execute_staged(self._operations(['file1.txt', 'missing.txt']))
+
+        self.assertEqual(sorted(['own.txt', 'file0.txt']), sorted(os.listdir(self.root)))
+        self.assertEqual(['Assets'], os.listdir(os.path.dirname(self.root)))
+
+    def test_link_in_place_after_swap(self):
+        settings = LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'folder0'),
+                                 os.path.join(self.output, 'project', 'ProjectSettings'))
+        missing = LinkOperation(LinkOperation.LINK, os.path.join(self.source, 'missing'),
+                                os.path.join(self.output, 'project', 'Packages'))
+
+        # nothing is linked in place if linking under root fails.
+        with self.assertRaises(ValueError):
+            self._execute_staged([settings] + self._operations(['file1.txt', 'missing.txt']))
+        self.assertEqual(['Assets'], os.listdir(os.path.dirname(self.root)))
+
+        with self.assertRaises(ValueError):
+            self._execute_staged(self._operations(['file1.txt']) + [settings, missing])
+        self.assertEqual(sorted(['own.txt', 'file1.txt']), sorted(os.listdir(self.root)))
+        self.assertEqual(sorted(['Assets', 'ProjectSettings']), sorted(os.listdir(os.path.dirname(self.root))))
+        self.assertEqual(sorted([os.path.join(self.root, 'file1.txt'), settings.target]),
+                         sorted(LinkManifest.load(self.manifest_file).entries))
+
+    def test_recover_interrupted_swap(self):
+        previous = self.root + '.upkit-previous'
+        os.rename(self.root, previous)
+        utils.mkdir_p(self.root + '.upkit-staging')
+
+        link_plan.recover_staged(self.root)
+        self.assertEqual(['Assets'], os.listdir(os.path.dirname(self.root)))
+        self.assertEqual(['own.txt'], os.listdir(self.root))
@@ -0,0 +1,73 @@
+import os
+import unittest
+
+from upkit import utils
+from upkit.linkspec_index import LinkspecIndex
+
+
+class LinkspecIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/linkspec-index')
+        utils.rmdir(self.output)
+        self.index_file = os.path.join(self.output, '.upkit', 'cache', 'linkspec-index.json')
+
+    def _make_source(self, name, *files):
+        source = os.path.join(self.output, name)
+        utils.mkdir_p(source)
+        for f in files:
+            utils.mkdir_p(os.path.dirname(os.path.join(source, f)))
+            utils.touch(os.path.join(source, f))
+        return source
+
+    def _age(self, *folders):
+        for folder in folders:
+            os.utime(folder, (1000000000, 1000000000))
+
+    def test_find_linkspec_in_order(self):
+        index = LinkspecIndex()
+        sources = [
+            self._make_source('a', 'linkspec.yml', 'linkspec.yaml', 'content/linkspec.yaml'),
+            self._make_source('b', 'linkspec.yml', 'content/linkspec.yaml'),
+            self._make_source('c', 'content/linkspec.yml', 'content/linkspec.yaml'),
+            self._make_source('d', 'content/linkspec.yml'),
+            self._make_source('e', 'content/data.txt'),
+        ]
+
+        self.assertEqual([os.path.join(self.output, 'a/linkspec.yaml'),
+                          os.path.join(self.output, 'b/linkspec.yml'),
+                          os.path.join(self.output, 'c/content/linkspec.yaml'),
+                          os.path.join(self.output, 'd/content/linkspec.yml'),
+                          None], [index.find(s) for s in sources])
+        self.assertIsNone(index.find(os.path.join(self.output, 'missing')))
+
+    def test_ignore_folders_named_linkspec(self):
+        source = self._make_source('a', 'content/linkspec.yml')
+        utils.mkdir_p(os.path.join(source, 'linkspec.yaml'))
+
+        self.assertEqual(os.path.join(source, 'content/linkspec.yml'), LinkspecIndex().find(source))
+
+    def test_reuse_index_of_unchanged_folders(self):
+        source = self._make_source('a', 'content/linkspec.yaml')
+        self._age(source, os.path.join(source, 'content'))
+
+        index = LinkspecIndex.load(self.index_file)
+        index.find(source)
+        index.save()
+
+        # a change the folder modification time does not show, to check the index is used.
+        utils.remove(os.path.join(source, 'content/linkspec.yaml'))
+        self._age(source, os.path.join(source, 'content'))
+        self.assertEqual(os.path.join(source, 'content/linkspec.yaml'),
+                         LinkspecIndex.load(self.index_file).find(source))
+
+        utils.touch(os.path.join(source, 'linkspec.yml'))
+        self.assertEqual(os.path.join(source, 'linkspec.yml'), LinkspecIndex.load(self.index_file).find(source))
+
+    def test_do_not_keep_recently_modified_folders(self):
+        source = self._make_source('a', 'linkspec.yaml')
+
+        index = LinkspecIndex.load(self.index_file)
+        index.find(source)
+        index.save()
+
+        self.assertEqual({}, LinkspecIndex.load(self.index_file).entries)
@@ -0,0 +1,105 @@
+import os
+import unittest
+
+from upkit import link_plan, materialize, utils
+from upkit.link_manifest import LinkManifest
+from upkit.link_plan import LinkOperation
+from upkit.package_linker import PackageLinker
+
+
+class MaterializeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/materialize')
+        utils.rmdir(self.output)
+        self.source = os.path.join(self.output, 'source')
+        utils.mkdir_p(os.path.join(self.source, 'folder', 'nested'))
+        for path in ('a.txt', 'folder/b.txt', 'folder/nested/c.txt'):
+            with open(os.path.join(self.source, path), 'w') as fh:
+                fh.write(path)
+        self.target = os.path.join(self.output, 'target', 'linked')
+
+    def _tree(self, folder):
+        result = []
+        for root, folders, files in os.walk(folder):
+            for name in files:
+                with open(os.path.join(root, name)) as fh:
+                    result.append((os.path.relpath(os.path.join(root, name), folder), fh.read()))
+        return sorted(result)
+
+    def _assert_materialized(self, mode):
+        self.assertEqual(mode, materialize.materialize(self.source, self.target, mode))
+        self.assertFalse(utils.is_link(self.target))
+        self.assertEqual(self._tree(self.source), self._tree(self.target))
+
+        same = os.path.samefile(os.path.join(self.source, 'folder/b.txt'), os.path.join(self.target, 'folder/b.txt'))
+        self.assertEqual(mode == materialize.HARDLINK, same)
+
+    def test_hardlink(self):
+        self._assert_materialized(materialize.HARDLINK)
+
+    def test_copy(self):
+        self._assert_materialized(materialize.COPY)
+
+    def test_reflink(self):
+        utils.mkdir_p(self.output)
+        if materialize.probe(os.path.join(self.source, 'a.txt'), self.output) != materialize.REFLINK:
+            self.skipTest('reflinks are not supported')
+        self._assert_materialized(materialize.REFLINK)
+
+    def test_keep_links_in_tree(self):
+        os.symlink('..', os.path.join(self.source, 'folder', 'parent'))
+        os.symlink('b.txt', os.path.join(self.source, 'folder', 'b-link.txt'))
+        materialize.materialize(self.source, self.target, materialize.COPY)
+
+        self.assertEqual('..', os.readlink(os.path.join(self.target, 'folder', 'parent')))
+        self.assertEqual('b.txt', os.readlink(os.path.join(self.target, 'folder', 'b-link.txt')))
+        with open(os.path.join(self.target, 'folder', 'nested', 'c.txt')) as fh:
+            self.assertEqual('folder/nested/c.txt', fh.read())
+
+    def test_auto(self):
+        mode = materialize.materialize(self.source, self.target, materialize.AUTO)
+        self.assertIn(mode, (materialize.REFLINK, materialize.HARDLINK, materialize.COPY))
+        self.assertEqual(self._tree(self.source), self._tree(self.target))
+        self.assertEqual(['linked'], os.listdir(os.path.dirname(self.target)))
+
+    def test_replace_existing_target(self):
+        materialize.materialize(self.source, self.target, materialize.SYMLINK)
+        with self.assertRaises(RuntimeError):
+            materialize.materialize(self.source, self.target, materialize.COPY)
+
+        materialize.materialize(self.source, self.target, materialize.COPY, forced=True)
+        self.assertFalse(utils.is_link(self.target))
+        self.assertEqual(self._tree(self.source), self._tree(self.target))
+
+    def test_plan_link_modes(self):
+        linker = PackageLinker(link_mode=materialize.COPY)
+        links = [
+            {'source': os.path.join(self.source, 'a.txt'), 'target': os.path.join(self.target, 'a.txt')},
+            {'source': os.path.join(self.source, 'folder'), 'target': os.path.join(self.target, 'folder'),
+             'mode': materialize.HARDLINK},
+        ]
+        operations = linker.plan_link(links=links)
+        self.assertEqual([materialize.COPY, materialize.HARDLINK], [o.mode for o in operations])
+
+        operations = linker.plan_link(links=links, mode=materialize.SYMLINK)
+        self.assertEqual([materialize.SYMLINK, materialize.HARDLINK], [o.mode for o in operations])
+
+    def test_reject_unknown_mode_when_planning(self):
+        linker = PackageLinker()
+        links = [{'source': os.path.join(self.source, 'a.txt'), 'target': os.path.join(self.target, 'a.txt'),
+                  'mode': 'junction'}]
+        with self.assertRaises(ValueError):
+            linker.plan_link(links=links)
+
+    def test_execute_materialized_links(self):
+        manifest_file = os.path.join(self.output, 'manifest.json')
+        operations = [LinkOperation(LinkOperation.LINK, self.source, self.target, mode=materialize.HARDLINK)]
+
+        self.assertEqual((1, 0, 0), link_plan.execute(operations, forced=True,
+                                                      manifest=LinkManifest.load(manifest_file)))
+        self.assertEqual(self._tree(self.source), self._tree(self.target))
+
+        # materialized trees are not links, stale ones are still removed.
+        self.assertEqual((0, 0, 1), link_plan.execute([], forced=True, manifest=LinkManifest.load(manifest_file)))
+        self.assertFalse(os.path.lexists(self.target))
+        self.assertEqual(3, len(self._tree(self.source)))
@@ -0,0 +1,137 @@
+import os
+import threading
+import unittest
+import zipfile
+from functools import partial
+
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from upkit import utils
+from upkit.lockfile import Lockfile
+from upkit.nuget import NugetInstaller
+from upkit.package_linker import PackageLinker
+
+
+def _make_package(path, package, version):
+    utils.mkdir_p(os.path.dirname(path))
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('[Content_Types].xml', '<Types/>')
+        archive.writestr('_rels/.rels', '<Relationships/>')
+        archive.writestr('package/services/metadata/core-properties/1.psmdcp', '<coreProperties/>')
+        archive.writestr('%s.nuspec' % package, '<package><metadata><id>%s</id><version>%s</version></metadata>'
+                                                '</package>' % (package, version))
+        archive.writestr('lib/net35/%s.dll' % package, 'dll')
+        archive.writestr('content/data%2B1.txt', 'data')
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class NugetInstallerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/nuget')
+        utils.rmdir(self.output)
+
+        self.feed = os.path.join(self.output, 'feed')
+        self.package_folder = os.path.join(self.output, 'packages')
+        _make_package(os.path.join(self.feed, 'Lib.A.1.0.0.nupkg'), 'Lib.A', '1.0.0')
+        _make_package(os.path.join(self.feed, 'lib.b', '2.0.0', 'lib.b.2.0.0.nupkg'), 'Lib.B', '2.0.0')
+
+    def test_install_from_flat_folder_feed(self):
+        folder = NugetInstaller(feed=self.feed).install(self.package_folder, 'Lib.A', '1.0.0')
+
+        self.assertEqual(os.path.join(self.package_folder, 'Lib.A.1.0.0'), folder)
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'lib/net35/Lib.A.dll')))
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'content/data+1.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'Lib.A.1.0.0.nupkg')))
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'Lib.A.nuspec')))
+        self.assertFalse(os.path.exists(os.path.join(folder, '_rels')))
+        self.assertFalse(os.path.exists(os.path.join(folder, 'package')))
+        self.assertFalse(os.path.exists(os.path.join(folder, '[Content_Types].xml')))
+
+    def test_install_from_hierarchical_folder_feed(self):
+        folder = NugetInstaller(feed=self.feed).install(self.package_folder, 'Lib.B', '2.0.0')
+
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'lib/net35/Lib.B.dll')))
+
+    def test_install_missing_package(self):
+        with self.assertRaises(ValueError):
+            NugetInstaller(feed=self.feed).install(self.package_folder, 'Lib.C', '1.0.0')
+
+        self.assertEqual([], os.listdir(self.package_folder))
+
+    def test_skip_installed_package(self):
+        installer = NugetInstaller(feed=self.feed)
+        installer.install(self.package_folder, 'Lib.A', '1.0.0')
+        utils.rmdir(self.feed)
+
+        folder = installer.install(self.package_folder, 'Lib.A', '1.0.0')
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'lib/net35/Lib.A.dll')))
+
+    def test_reinstall_incomplete_package(self):
+        folder = os.path.join(self.package_folder, 'Lib.A.1.0.0')
+        utils.mkdir_p(folder)
+        utils.touch(os.path.join(folder, 'partial.txt'))
+
+        NugetInstaller(feed=self.feed).install(self.package_folder, 'Lib.A', '1.0.0')
+
+        self.assertFalse(os.path.exists(os.path.join(folder, 'partial.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(folder, 'lib/net35/Lib.A.dll')))
+
+    def test_install_from_flat_container_feed(self):
+        container = os.path.join(self.output, 'v3-flatcontainer')
+        for package, version in (('Lib.A', '1.0.0'), ('Lib.B', '2.0.0')):
+            name = '%s.%s.nupkg' % (package.lower(), version)
+            _make_package(os.path.join(container, package.lower(), version, name), package, version)
+
+        server = HTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=container))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            installer = NugetInstaller(feed='http://127.0.0.1:%d/' % server.server_address[1])
+            folder_a = installer.install(self.package_folder, 'Lib.A', '1.0.0')
+            folder_b = installer.install(self.package_folder, 'Lib.B', '2.0.0')
+
+            with self.assertRaises(ValueError):
+                installer.install(self.package_folder, 'Lib.C', '1.0.0')
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertTrue(os.path.isfile(os.path.join(folder_a, 'lib/net35/Lib.A.dll')))
+        self.assertTrue(os.path.isfile(os.path.join(folder_b, 'lib/net35/Lib.B.dll')))
+
+    def test_link_frozen_from_lock_file(self):
+        lock_file = os.path.join(self.output, 'upkit.lock')
+        output = os.path.join(self.output, 'lib-a')
+
+        linker = PackageLinker(package_folder=self.package_folder, nuget_feed=self.feed, lock_file=lock_file)
+        linker.link(source='nuget:Lib.A@1.0.0', target=output, forced=True)
+        linker.lockfile.save()
+
+        locked = Lockfile.load(lock_file).entries['nuget:Lib.A@1.0.0']
+        self.assertEqual('1.0.0', locked['version'])
+        self.assertTrue(locked['sha512'])
+
+        utils.rmdir(self.feed)
+        linker = PackageLinker(package_folder=self.package_folder, lock_file=lock_file, frozen=True)
+        linker.link(source='nuget:Lib.A@1.0.0#lib/net35', target=output, forced=True)
+        self.assertTrue(os.path.isfile(os.path.join(output, 'Lib.A.dll')))
+
+        with open(os.path.join(self.package_folder, 'Lib.A.1.0.0', 'Lib.A.1.0.0.nupkg.sha512'), 'w') as fh:
+            fh.write('changed')
+
+        linker = PackageLinker(package_folder=self.package_folder, lock_file=lock_file, frozen=True)
+        with self.assertRaises(ValueError):
+            linker.link(source='nuget:Lib.A@1.0.0', target=output, forced=True)
+
+    def test_link_nuget_source_from_feed(self):
+        output = os.path.join(self.output, 'lib-a')
+
+        linker = PackageLinker(package_folder=self.package_folder, nuget_feed=self.feed)
+        linker.link(source='nuget:Lib.A@1.0.0#lib/net35', target=output, forced=True)
+
+        self.assertTrue(os.path.isfile(os.path.join(output, 'Lib.A.dll')))
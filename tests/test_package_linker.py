@@ -1,10 +1,12 @@
 import os
 import unittest
+from collections import ChainMap
 
 import yaml
 
 from upkit import utils
-from upkit.package_linker import PackageLinker
+from upkit.link_plan import LinkOperation
+from upkit.package_linker import PackageLinker, ResolveError
 
 
 class PackageLinkerTestCase(unittest.TestCase):
@@ -138,6 +140,20 @@ external_links:
         self.assertTrue(os.path.isfile('%s/aaa/resources/default-data.txt' % output))
         self.assertTrue(os.path.isfile('%s/aaa/resources/a/data.txt' % output))
 
+    def test_link_with_exclude_under_content_folder_in_linkspec(self):
+        output = '../temp/output/lib-a'
+        utils.rmdir(output)
+
+        linker = PackageLinker()
+        linker.link(source='../test_data/lib-a.1.0.4/content', target=output, content=['*'],
+                    exclude=['linkspec.yaml', 'child1/data.txt'], forced=True)
+
+        self.assertTrue(utils.is_link('%s/child0' % output))
+        self.assertTrue(os.path.isdir('%s/child1' % output))
+        self.assertFalse(utils.is_link('%s/child1' % output))
+        self.assertFalse(os.path.lexists('%s/child1/data.txt' % output))
+        self.assertFalse(os.path.lexists('%s/linkspec.yaml' % output))
+
     def test_link_with_no_target_if_linkspec_has_links(self):
         output = '../temp/output/lib-a'
         utils.rmdir(output)
@@ -440,3 +456,217 @@ external_links:
         self.assertTrue('aaaa', linker.params['b'])
         self.assertTrue('aaaa', linker.links[0]['source'])
 
+    def test_load_config_renders_unknown_variables_from_params(self):
+        output = '../temp/output/config'
+        utils.rmdir(output)
+        utils.mkdir_p(output)
+
+        config = os.path.join(output, 'upkit.yaml')
+        with open(config, 'w') as fh:
+            fh.write("{% set name = 'lib' %}\n"
+                     "params:\n  z: '{{name}}-z'\n  a: '{{z}}/a'\n"
+                     "links:\n- source: '{{a}}'\n  target: '{{__dir__}}/{{name}}'\n")
+
+        linker = PackageLinker(config_file=config)
+
+        self.assertEqual(['z', 'a'], [k for k in linker.params if k in ('z', 'a')])
+        self.assertEqual('lib-z/a', linker.params['a'])
+        self.assertEqual('{{a}}', linker.links[0]['source'])
+        self.assertEqual('%s/lib' % os.path.abspath(output), linker.links[0]['target'])
+
+
+    def test_plan_from_config(self):
+        output = '../temp/output/plan-config'
+        utils.rmdir(output)
+
+        linker = PackageLinker(config_file='../test_data/config.yaml', params={
+            'output': output
+        })
+        operations = linker.plan()
+
+        self.assertFalse(os.path.exists(output))
+        resources = os.path.abspath('../test_data/lib-a.1.0.8/content/child/resources')
+        self.assertEqual(
+            sorted((o.kind, o.target) for o in operations),
+            sorted([
+                (LinkOperation.COPY, os.path.join(resources, 'a')),
+                (LinkOperation.COPY, os.path.join(resources, 'default-data.txt')),
+                (LinkOperation.LINK, resources),
+                (LinkOperation.LINK, os.path.abspath(os.path.join(output, 'lib-a/child'))),
+                (LinkOperation.LINK, os.path.abspath(os.path.join(output, 'lib-c'))),
+            ])
+        )
+        self.assertEqual(os.path.abspath(os.path.join(output, 'lib-a/child')), operations[0].target)
+        self.assertEqual(os.path.abspath('../test_data/lib-a.1.0.8/content/linkspec.yaml'), operations[0].linkspec)
+        self.assertIsNone(operations[-1].linkspec)
+
+    def test_resolve_remote_sources_concurrently(self):
+        output = '../temp/output/resolve'
+        utils.rmdir(output)
+        package = os.path.join(output, 'package')
+        utils.mkdir_p(package)
+        with open(os.path.join(package, 'linkspec.yaml'), 'w') as fh:
+            fh.write("links:\n- source: 'fake:lib-a.1.0.0/content'\n  target: '{{__target__}}/nested'\n")
+
+        config = os.path.join(output, 'upkit.yaml')
+        with open(config, 'w') as fh:
+            fh.write("links:\n- source: 'fake:%s'\n  target: '{{__dir__}}/linked'\n" % os.path.abspath(package))
+
+        linker = PackageLinker(config_file=config, jobs=2)
+        resolver = FakeResolver(linker)
+        linker.source_resolvers.append(resolver)
+        linker.resolve()
+
+        self.assertEqual(['fake:%s' % os.path.abspath(package), 'fake:lib-a.1.0.0/content'], resolver.resolved)
+
+        linker.run()
+        self.assertTrue(os.path.isfile(os.path.join(output, 'linked/nested/data.txt')))
+        self.assertEqual(2, len(resolver.resolved))
+
+    def test_resolve_only_planned_sources(self):
+        output = '../temp/output/resolve'
+        utils.rmdir(output)
+        package = os.path.join(output, 'package')
+        child = os.path.join(output, 'child')
+        utils.mkdir_p(package)
+        utils.mkdir_p(child)
+        with open(os.path.join(package, 'linkspec.yaml'), 'w') as fh:
+            fh.write("links:\n- source: 'fake:%s'\n  target: '{{__target__}}/child'\n" % os.path.abspath(child))
+        # the linkspec of a child link is not used when planning.
+        with open(os.path.join(child, 'linkspec.yaml'), 'w') as fh:
+            fh.write("links:\n- source: 'fake:missing'\n  target: '{{__target__}}/missing'\n")
+
+        config = os.path.join(output, 'upkit.yaml')
+        with open(config, 'w') as fh:
+            fh.write("links:\n- source: 'fake:%s'\n  target: '{{__dir__}}/linked'\n" % os.path.abspath(package))
+
+        linker = PackageLinker(config_file=config)
+        resolver = FakeResolver(linker)
+        linker.source_resolvers.append(resolver)
+        linker.resolve()
+
+        self.assertEqual(['fake:%s' % os.path.abspath(package), 'fake:%s' % os.path.abspath(child)],
+                         resolver.resolved)
+
+    def test_resolve_reports_all_errors(self):
+        output = '../temp/output/resolve'
+        utils.rmdir(output)
+        utils.mkdir_p(output)
+
+        config = os.path.join(output, 'upkit.yaml')
+        with open(config, 'w') as fh:
+            fh.write("links:\n- source: 'fake:missing-a'\n  target: 'a'\n- source: 'fake:missing-b'\n  target: 'b'\n")
+
+        linker = PackageLinker(config_file=config)
+        linker.source_resolvers.append(FakeResolver(linker))
+
+        with self.assertRaises(ResolveError) as context:
+            linker.resolve()
+
+        self.assertEqual(['fake:missing-a', 'fake:missing-b'], sorted(s for s, _ in context.exception.errors))
+
+    def test_fetch_identical_remote_sources_once(self):
+        output = '../temp/output/resolve'
+        utils.rmdir(output)
+        utils.mkdir_p(output)
+
+        config = os.path.join(output, 'upkit.yaml')
+        with open(config, 'w') as fh:
+            fh.write("links:\n"
+                     "- source: 'fake:lib-a.1.0.4/content#child0'\n  target: '{{__dir__}}/child0'\n"
+                     "- source: 'fake:lib-a.1.0.4/content#child1'\n  target: '{{__dir__}}/child1'\n"
+                     "- source: ' fake:lib-a.1.0.4/content#child1'\n  target: '{{__dir__}}/child1-again'\n")
+
+        linker = PackageLinker(config_file=config)
+        resolver = FakeResolver(linker)
+        linker.source_resolvers.append(resolver)
+        linker.run()
+
+        self.assertEqual(['fake:lib-a.1.0.4/content'], resolver.resolved)
+        self.assertEqual(1, linker.resolution_memo.misses)
+        self.assertEqual(2, linker.resolution_memo.hits)
+        self.assertTrue(os.path.isfile(os.path.join(output, 'child0/data.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(output, 'child1-again/data.txt')))
+
+    def test_render_template_caches_compiled_templates(self):
+        linker = PackageLinker()
+        cache = linker.template_cache
+
+        self.assertEqual('a/b', linker._render_template('{{x}}/b', {'x': 'a'}))
+        self.assertEqual('c/b', linker._render_template('{{x}}/b', {'x': 'c'}))
+        self.assertEqual((1, 1), (cache.misses, cache.hits))
+
+        with self.assertRaises(ValueError):
+            linker._render_template('{{y}}/b', {'x': 'a'})
+        with self.assertRaises(ValueError):
+            linker._render_template('{{y}}/b', {'x': 'a'})
+        self.assertEqual((2, 2), (cache.misses, cache.hits))
+
+    def test_render_plain_string_skips_jinja(self):
+        linker = PackageLinker()
+        cache = linker.template_cache
+
+        for text in ('a/b', 'a}}b', 'line\r\nnext\n', 'x\r\r\n', '\n', ''):
+            self.assertEqual(linker._jinja_environment.from_string(text).render(), linker._render_template(text))
+        self.assertEqual(0, cache.misses)
+        self.assertEqual(1.0, cache.hit_rate)
+
+    def test_template_cache_is_bounded(self):
+        linker = PackageLinker()
+        cache = linker.template_cache
+        cache.max_size = 2
+
+        for template in ('{{x}}1', '{{x}}2', '{{x}}1', '{{x}}3', '{{x}}2'):
+            linker._render_template(template, {'x': 'a'})
+
+        self.assertEqual((4, 1), (cache.misses, cache.hits))
+
+    def test_template_cache_lookup_without_hit(self):
+        linker = PackageLinker()
+        cache = linker.template_cache
+
+        linker._render_template('{{x}}/b', {'x': 'a'})
+        self.assertEqual({'x'}, cache.get('{{x}}/b', count=False)[1])
+        self.assertEqual((1, 0), (cache.misses, cache.hits))
+
+    def test_plan_link_does_not_change_params(self):
+        output = os.path.abspath('../temp/output/lib-a')
+        params = {'name': 'lib-a'}
+
+        linker = PackageLinker()
+        operations = linker.plan_link(source='../test_data/lib-a.1.0.4/content', target='%s/{{name}}' % output,
+                                      params=params)
+
+        self.assertEqual({'name': 'lib-a'}, params)
+        self.assertEqual([os.path.join(output, 'lib-a/lib-a-child0'), os.path.join(output, 'lib-a/a/b/lib-a-child1')],
+                         [o.target for o in operations])
+
+    def test_render_template_in_param_scope(self):
+        linker = PackageLinker()
+        scope = ChainMap({'b': 'B'}, {'a': 'A', 'b': 'x'})
+
+        self.assertEqual('A/B', linker._render_template('{{a}}/{{b}}', scope))
+        self.assertEqual('0,1', linker._render_template('{{ range(2)|join(",") }}', scope))
+
+
+class FakeResolver(object):
+    scheme = 'fake:'
+
+    def __init__(self, package_linker=None):
+        self.package_linker = package_linker
+        self.resolved = []
+
+    def normalize(self, source):
+        uri, sub_path = (source.strip()[len(self.scheme):].split('#') + [''])[:2]
+        return (self.scheme, uri), sub_path
+
+    def resolve(self, source):
+        key, sub_path = self.normalize(source)
+        return os.path.join(self.package_linker.resolution_memo.get(key, lambda: self.fetch(key)), sub_path)
+
+    def fetch(self, key):
+        self.resolved.append('%s%s' % key)
+        path = os.path.abspath(os.path.join('../test_data', key[1]))
+        if not os.path.isdir(path):
+            raise ValueError('"%s" not found.' % path)
+        return path
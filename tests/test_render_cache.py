@@ -0,0 +1,63 @@
+import os
+import unittest
+
+from upkit import utils
+from upkit.package_linker import PackageLinker
+from upkit.render_cache import RenderCache
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/render-cache')
+        utils.rmdir(self.output)
+        self.cache_folder = os.path.join(self.output, '.upkit', 'cache')
+
+    def test_get_result_for_same_content_and_referenced_params(self):
+        RenderCache(self.cache_folder).set('linkspec', 'a: {{x}}', {'x': '1', 'y': '2'}, ['x'], {'a': '1'})
+
+        cache = RenderCache(self.cache_folder)
+        self.assertEqual({'a': '1'}, cache.get('linkspec', 'a: {{x}}', {'x': '1', 'y': 'changed'}))
+        self.assertIsNone(cache.get('linkspec', 'a: {{x}}', {'x': '2'}))
+        self.assertIsNone(cache.get('linkspec', 'a: {{x}}', {}))
+        self.assertIsNone(cache.get('linkspec', 'a: {{x}} ', {'x': '1'}))
+        self.assertIsNone(cache.get('config', 'a: {{x}}', {'x': '1'}))
+        self.assertEqual((1, 4), (cache.hits, cache.misses))
+
+    def test_ignore_invalid_entries(self):
+        cache = RenderCache(self.cache_folder)
+        cache.set('linkspec', 'a: 1', {}, [], {'a': 1})
+        for name in os.listdir(self.cache_folder):
+            with open(os.path.join(self.cache_folder, name), 'wb') as fh:
+                fh.write(b'invalid')
+
+        self.assertIsNone(RenderCache(self.cache_folder).get('linkspec', 'a: 1', {}))
+
+    def test_prune_least_recently_used_entries(self):
+        cache = RenderCache(self.cache_folder)
+        for i in range(4):
+            cache.set('linkspec', 'a: %d' % i, {}, [], {'a': 'x' * 1000})
+            path = os.path.join(self.cache_folder, '%s.pickle' % cache._entry_key('linkspec', 'a: %d' % i))
+            os.utime(path, (i, i))
+
+        cache.max_size = 2500
+        self.assertEqual(2, cache.prune())
+        self.assertIsNone(cache.get('linkspec', 'a: 1', {}))
+        self.assertIsNotNone(cache.get('linkspec', 'a: 2', {}))
+
+    def test_load_config_and_linkspecs_from_cache(self):
+        config = os.path.join(self.output, 'upkit.yaml')
+        utils.mkdir_p(self.output)
+        with open(config, 'w') as fh:
+            fh.write("{%% set name = 'lib' %%}\n"
+                     "params:\n  a: '{{name}}'\n"
+                     "links:\n- source: '%s'\n  target: '{{__dir__}}/{{a}}'\n"
+                     % os.path.abspath('../test_data/lib-a.1.0.4/content'))
+
+        linker = PackageLinker(config_file=config, cache_folder=self.cache_folder)
+        operations = linker.plan()
+        self.assertEqual((1, 2), (linker.render_cache.hits, linker.render_cache.misses))
+
+        cached_linker = PackageLinker(config_file=config, cache_folder=self.cache_folder)
+        self.assertEqual(operations, cached_linker.plan())
+        self.assertEqual(linker.params, cached_linker.params)
+        self.assertEqual((3, 0), (cached_linker.render_cache.hits, cached_linker.render_cache.misses))
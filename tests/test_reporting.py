@@ -0,0 +1,73 @@
+import json
+import os
+import unittest
+from io import StringIO
+
+from upkit import link_plan, reporting, utils
+from upkit.link_plan import LinkOperation
+
+
+class _Terminal(StringIO):
+    def isatty(self):
+        return True
+
+
+class ReportingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/reporting')
+        utils.rmdir(self.output)
+        utils.mkdir_p(os.path.join(self.output, 'source'))
+        self.operations = []
+        for i in range(3):
+            utils.touch(os.path.join(self.output, 'source', '%d.txt' % i))
+            self.operations.append(LinkOperation(LinkOperation.LINK, os.path.join(self.output, 'source', '%d.txt' % i),
+                                                 os.path.join(self.output, 'target', '%d.txt' % i)))
+
+    def _execute(self, reporter):
+        previous = reporting.set_reporter(reporter)
+        try:
+            return link_plan.execute(self.operations, forced=True)
+        finally:
+            reporting.set_reporter(previous)
+
+    def test_report_links_when_verbose(self):
+        for level, lines in ((reporting.QUIET, 0), (reporting.NORMAL, 0), (reporting.VERBOSE, 3)):
+            stream = StringIO()
+            self.assertEqual((3, 0, 0), self._execute(reporting.Reporter(level=level, stream=stream)))
+            self.assertEqual(lines, len(stream.getvalue().splitlines()))
+
+    def test_show_progress_at_bounded_rate(self):
+        stream = _Terminal()
+        reporter = reporting.Reporter(stream=stream, interval=3600)
+        progress = reporter.progress('Linking', total=1000)
+        for _ in range(1000):
+            progress.update()
+        progress.finish()
+        self.assertEqual('', stream.getvalue())
+
+        stream = _Terminal()
+        reporter = reporting.Reporter(stream=stream, interval=0)
+        progress = reporter.progress('Linking', total=2)
+        progress.update()
+        reporter.message('Done.')
+        self.assertEqual('\r\x1b[KLinking: 1/2\r\x1b[KDone.\n', stream.getvalue())
+
+    def test_clear_progress_on_error(self):
+        stream = _Terminal()
+        self.operations[1].source = os.path.join(self.output, 'missing.txt')
+        with self.assertRaises(ValueError):
+            self._execute(reporting.Reporter(stream=stream, interval=0))
+
+        self.assertIn('Linking: 2/3', stream.getvalue())
+        self.assertTrue(stream.getvalue().endswith('\r\x1b[K'))
+
+    def test_report_json_events(self):
+        stream = StringIO()
+        reporter = reporting.JsonReporter(level=reporting.VERBOSE, stream=stream)
+        self._execute(reporter)
+        reporter.error('Failed.')
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(['link', 'link', 'link', 'progress', 'error'], [e['event'] for e in events])
+        self.assertEqual(self.operations[0].target, events[0]['target'])
+        self.assertEqual(3, events[3]['count'])
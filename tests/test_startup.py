@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+class StartupTestCase(unittest.TestCase):
+    def _loaded_modules(self, code, modules):
+        check = '%s\nimport sys\nprint("loaded:" + ",".join(m for m in %r if m in sys.modules))' % (code, modules)
+        output = subprocess.check_output([sys.executable, '-c', check], cwd=os.path.abspath('..'),
+                                         universal_newlines=True)
+        return [m for m in output[output.rindex('loaded:') + len('loaded:'):].strip().split(',') if m]
+
+    def test_version_does_not_import_linker_dependencies(self):
+        code = ('import sys; sys.argv = ["upkit", "--version"]\n'
+                'from upkit.tools import execute_from_command_line\n'
+                'try:\n'
+                '    execute_from_command_line()\n'
+                'except SystemExit:\n'
+                '    pass')
+        self.assertEqual([], self._loaded_modules(code, ('yaml', 'jinja2', 'xmltodict', 'git')))
+
+    def test_linker_does_not_import_resolver_dependencies(self):
+        self.assertEqual([], self._loaded_modules('import upkit.package_linker', ('xmltodict', 'git', 'upkit.nuget')))
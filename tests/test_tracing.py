@@ -0,0 +1,58 @@
+import json
+import os
+import unittest
+from io import StringIO
+
+from upkit import tracing, utils
+from upkit.package_linker import PackageLinker
+
+
+class TracingTestCase(unittest.TestCase):
+    def tearDown(self):
+        tracing.disable()
+
+    def test_do_not_record_when_disabled(self):
+        @tracing.traced('add', 'test', lambda a, b: self.fail('described while disabled'))
+        def add(a, b):
+            return a + b
+
+        self.assertIsNone(tracing.disable())
+        with tracing.span('section', 'test'):
+            self.assertEqual(3, add(1, 2))
+
+    def test_record_spans(self):
+        @tracing.traced('add', 'test', lambda a, b: {'a': a})
+        def add(a, b):
+            return a + b
+
+        tracer = tracing.enable()
+        with tracing.span('section', 'test', path='a'):
+            add(1, 2)
+            add(3, 4)
+        self.assertIs(tracer, tracing.disable())
+
+        self.assertEqual([('section', 'test', 1), ('add', 'test', 2)],
+                         [(name, category, calls) for name, category, calls, _ in tracer.timings()])
+        self.assertEqual({'a': 3}, tracer.events[1]['args'])
+
+        stream = StringIO()
+        tracer.print_timings(stream)
+        self.assertIn('section', stream.getvalue())
+
+    def test_save_chrome_trace(self):
+        output = os.path.abspath('../temp/output/tracing')
+        utils.rmdir(output)
+
+        tracer = tracing.enable()
+        linker = PackageLinker(config_file='../test_data/config.yaml', params={'output': output})
+        linker.run()
+        tracing.disable()
+
+        trace_file = os.path.join(output, 'trace', 'trace.json')
+        tracer.save(trace_file)
+        with open(trace_file, 'r') as fh:
+            events = json.load(fh)['traceEvents']
+
+        names = set(e['name'] for e in events)
+        self.assertTrue(set(['load config', 'resolve', 'plan', 'read linkspec', 'apply', 'fs_link']) <= names)
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0 for e in events))
@@ -0,0 +1,66 @@
+import os
+import unittest
+
+from upkit import utils
+
+
+class FsLinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/fs-link')
+        utils.rmdir(self.output)
+        utils.mkdir_p(self.output)
+
+    def test_link_directory(self):
+        target = os.path.join(self.output, 'a', 'b', 'lib-a')
+        utils.fs_link('../test_data/lib-a.1.0.0/content', target)
+
+        self.assertTrue(os.path.islink(target))
+        self.assertTrue(os.path.isfile(os.path.join(target, 'data.txt')))
+
+    def test_link_existing_target_without_forced(self):
+        target = os.path.join(self.output, 'lib-a')
+        utils.mkdir_p(target)
+
+        with self.assertRaises(RuntimeError):
+            utils.fs_link('../test_data/lib-a.1.0.0/content', target)
+
+    def test_link_replaces_existing_target_when_forced(self):
+        target = os.path.join(self.output, 'lib-a')
+        utils.mkdir_p(target)
+        utils.touch(os.path.join(target, 'old.txt'))
+
+        utils.fs_link('../test_data/lib-a.1.0.0/content', target, forced=True)
+
+        self.assertTrue(os.path.islink(target))
+        self.assertFalse(os.path.exists(os.path.join(target, 'old.txt')))
+
+    def test_link_replaces_dangling_link_when_forced(self):
+        target = os.path.join(self.output, 'dangling')
+        os.symlink(os.path.join(self.output, 'missing'), target)
+
+        utils.fs_link('../test_data/lib-a.1.0.0/content/data.txt', target, forced=True)
+
+        self.assertTrue(os.path.isfile(target))
+
+    def test_link_missing_source(self):
+        with self.assertRaises(ValueError):
+            utils.fs_link('../test_data/missing', os.path.join(self.output, 'missing'))
+
+    def test_rmdir_does_not_follow_links(self):
+        source = os.path.join(self.output, 'source')
+        utils.mkdir_p(source)
+        utils.touch(os.path.join(source, 'data.txt'))
+
+        target = os.path.join(self.output, 'link')
+        utils.fs_link(source, target)
+        utils.rmdir(target)
+
+        self.assertFalse(os.path.lexists(target))
+        self.assertTrue(os.path.isfile(os.path.join(source, 'data.txt')))
+
+    def test_rmdir_missing_path(self):
+        utils.rmdir(os.path.join(self.output, 'missing'))
+
+    def test_remove_missing_path(self):
+        with self.assertRaises(OSError):
+            utils.remove(os.path.join(self.output, 'missing'))
@@ -0,0 +1,94 @@
+import os
+import unittest
+
+from upkit import utils
+from upkit.package_linker import PackageLinker
+from upkit.watcher import InotifyWatcher, LinkWatcher, PollingWatcher, create_watcher
+
+
+class LinkWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output = os.path.abspath('../temp/output/watcher')
+        utils.rmdir(self.output)
+        for source in ('a', 'b'):
+            utils.mkdir_p(os.path.join(self.output, source))
+            utils.touch(os.path.join(self.output, source, 'data.txt'))
+
+        self.config_file = os.path.join(self.output, 'upkit.yaml')
+        self._write_config(['a', 'b'])
+
+    def _write_config(self, sources):
+        with open(self.config_file, 'w') as fh:
+            fh.write('links:\n')
+            for source in sources:
+                fh.write("  - source: '{{__dir__}}/%s'\n    target: '{{__dir__}}/target/%s'\n" % (source, source))
+                fh.write("    content: ['*']\n")
+
+    def _create_watcher(self, watcher):
+        manifest_file = os.path.join(self.output, 'manifest.json')
+
+        # links each entry, which the tests check for, instead of the whole folders.
+        def _create_linker():
+            return PackageLinker(config_file=self.config_file, manifest_file=manifest_file, collapse=False)
+
+        linker_watcher = LinkWatcher(_create_linker, self.config_file, watcher=watcher, debounce=0)
+        self.addCleanup(linker_watcher.close)
+        return linker_watcher
+
+    def _wait(self, watcher):
+        events = []
+        for _ in range(10):
+            events = watcher.watcher.wait(1)
+            if events:
+                break
+        return events
+
+    def _relink_changed_links(self, watcher):
+        watcher.link_all()
+        self.assertTrue(os.path.islink(os.path.join(self.output, 'target/a/data.txt')))
+
+        utils.touch(os.path.join(self.output, 'b', 'new.txt'))
+        self.assertEqual([1], watcher.relink(self._wait(watcher)))
+        self.assertTrue(os.path.islink(os.path.join(self.output, 'target/b/new.txt')))
+
+        self._write_config(['a'])
+        self.assertEqual([0], watcher.relink(self._wait(watcher)))
+        self.assertFalse(os.path.lexists(os.path.join(self.output, 'target/b/data.txt')))
+
+    @unittest.skipUnless(InotifyWatcher.is_supported(), 'inotify is not supported')
+    def test_relink_changed_links_with_inotify(self):
+        self._relink_changed_links(self._create_watcher(InotifyWatcher()))
+
+    def test_relink_changed_links_with_polling(self):
+        # a folder modification time may not change within the file system timestamp granularity.
+        for folder in ('a', 'b', ''):
+            os.utime(os.path.join(self.output, folder), (1000000000, 1000000000))
+        os.utime(self.config_file, (1000000000, 1000000000))
+        self._relink_changed_links(self._create_watcher(PollingWatcher(interval=0.05)))
+
+    def test_relink_added_and_removed_linkspecs(self):
+        with open(self.config_file, 'w') as fh:
+            fh.write("links:\n  - source: '{{__dir__}}/a'\n    target: '{{__dir__}}/target/a'\n")
+        utils.touch(os.path.join(self.output, 'a', 'other.txt'))
+
+        watcher = self._create_watcher(create_watcher())
+        watcher.link_all()
+        self.assertTrue(os.path.islink(os.path.join(self.output, 'target/a')))
+
+        linkspec_file = os.path.join(self.output, 'a', 'linkspec.yaml')
+        with open(linkspec_file, 'w') as fh:
+            fh.write("content: ['data.txt']\n")
+        self.assertEqual([0], watcher.relink(self._wait(watcher)))
+        self.assertFalse(os.path.islink(os.path.join(self.output, 'target/a')))
+        self.assertEqual(['data.txt'], os.listdir(os.path.join(self.output, 'target/a')))
+
+        os.remove(linkspec_file)
+        self.assertEqual([0], watcher.relink(self._wait(watcher)))
+        self.assertTrue(os.path.islink(os.path.join(self.output, 'target/a')))
+
+    def test_ignore_unrelated_changes(self):
+        watcher = self._create_watcher(create_watcher())
+        watcher.link_all()
+
+        utils.touch(os.path.join(self.output, 'unrelated.txt'))
+        self.assertEqual([], watcher.relink(watcher.watcher.wait(0.2)))
@@ -0,0 +1,323 @@
+import fnmatch
+import os
+import re
+
+from upkit.link_plan import LinkOperation
+
+_magic_re = re.compile('([*?[])')
+
+# whether names need os.path.normcase before matching, as fnmatch does.
+_normcase_names = os.path.normcase('A') != 'A'
+
+
+def _has_magic(text):
+    return _magic_re.search(text) is not None
+
+
+def _is_hidden(name):
+    return name[0] == '.'
+
+
+class _Component(object):
+    """
+    A path component of a pattern, either a literal name or a wildcard pattern.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.is_magic = _has_magic(text)
+        self.match_hidden = _is_hidden(text)
+        self._match = re.compile(fnmatch.translate(os.path.normcase(text))).match if self.is_magic else None
+
+    def matches(self, name):
+        if not self.match_hidden and _is_hidden(name):
+            return False
+        return self._match(os.path.normcase(name) if _normcase_names else name) is not None
+
+    def filter(self, entries, dironly):
+        """
+        :param entries: a directory listing, a list of (name, is dir).
+        :param dironly: only match directories.
+        :return: the matching names, in listing order.
+        """
+        if _normcase_names:
+            return [name for name, is_dir in entries if (is_dir or not dironly) and self.matches(name)]
+
+        match = self._match
+        match_hidden = self.match_hidden
+        return [name for name, is_dir in entries
+                if (is_dir or not dironly) and (match_hidden or name[0] != '.') and match(name)]
+
+
+class _Pattern(object):
+    def __init__(self, pattern):
+        """
+        :param pattern: an absolute, normalized path pattern.
+        """
+        self.pattern = pattern
+        self.is_magic = _has_magic(pattern)
+
+        components = []
+        head = pattern
+        while True:
+            head, tail = os.path.split(head)
+            if not tail:
+                break
+            components.insert(0, tail)
+        self.root = head
+        self.components = [_Component(c) for c in components]
+
+        # the leading components without wildcards.
+        self.literal_length = 0
+        while self.literal_length < len(components) and not self.components[self.literal_length].is_magic:
+            self.literal_length += 1
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'wildcards', 'recursive', 'is_recursive', 'rules')
+
+    def __init__(self, is_recursive=False):
+        self.children = {}
+        self.wildcards = []
+        self.recursive = None
+        self.is_recursive = is_recursive
+        self.rules = []
+
+    def has_transitions(self):
+        return bool(self.is_recursive or self.children or self.wildcards or self.recursive)
+
+
+class ExcludeRules(object):
+    """
+    Exclude patterns compiled into a prefix trie of path components, evaluated one path component at a time so
+    that excluded folders are never listed.
+
+    Components have the semantics of glob: wildcards do not match hidden names unless they start with a dot, and
+    `**` matches any number of components, including none. A pattern prefixed with `!` re-includes the paths it
+    matches, the last matching pattern wins. Paths under an excluded folder cannot be re-included.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: absolute, normalized path patterns, each optionally prefixed with `!`.
+        """
+        self._roots = {}
+        self._states = {}
+        self.is_empty = not patterns
+
+        for index, text in enumerate(patterns):
+            negated = text.startswith('!')
+            pattern = _Pattern(text[1:] if negated else text)
+
+            node = self._roots.setdefault(pattern.root, _TrieNode())
+            for component in pattern.components:
+                if component.text == '**':
+                    if node.recursive is None:
+                        node.recursive = _TrieNode(is_recursive=True)
+                    node = node.recursive
+                elif not component.is_magic:
+                    node = node.children.setdefault(component.text, _TrieNode())
+                else:
+                    child = next((n for c, n in node.wildcards if c.text == component.text), None)
+                    if child is None:
+                        child = _TrieNode()
+                        node.wildcards.append((component, child))
+                    node = child
+            node.rules.append((index, negated))
+
+    @staticmethod
+    def _close(nodes):
+        closed = set()
+        pending = list(nodes)
+        while pending:
+            node = pending.pop()
+            if node not in closed:
+                closed.add(node)
+                if node.recursive is not None:
+                    pending.append(node.recursive)
+        return frozenset(closed)
+
+    def _step(self, state, name):
+        nodes = []
+        for node in state:
+            child = node.children.get(name, None)
+            if child is not None:
+                nodes.append(child)
+            for component, child in node.wildcards:
+                if component.matches(name):
+                    nodes.append(child)
+            if node.is_recursive and not _is_hidden(name):
+                nodes.append(node)
+
+        if not any(node.recursive is not None for node in nodes):
+            return frozenset(nodes)
+        return self._close(nodes)
+
+    def _state(self, path):
+        """
+        :param path: an absolute path.
+        :return: the trie nodes reached by the components of path.
+        """
+        state = self._states.get(path, None)
+        if state is not None:
+            return state
+
+        folder, name = os.path.split(path)
+        if not name:
+            root = self._roots.get(path, None)
+            state = self._close([root]) if root is not None else frozenset()
+        else:
+            parent = self._state(folder)
+            state = self._step(parent, name) if parent else parent
+
+        self._states[path] = state
+        return state
+
+    def is_excluded(self, folder, name):
+        """
+        :param folder: an absolute folder, which is not excluded.
+        :param name: the name of a path in folder.
+        :return:
+        """
+        if self.is_empty:
+            return False
+
+        state = self._state(folder)
+        if not state:
+            return False
+
+        rules = [rule for node in self._step(state, name) for rule in node.rules]
+        return bool(rules) and not max(rules)[1]
+
+    def may_match_under(self, folder):
+        """
+        Checks if a pattern may match paths under a folder, e.g. a folder matching `Plugins` may be linked as a
+        whole for an exclude pattern `*.meta` but not for `Plugins/Android`.
+        :param folder: an absolute path.
+        :return:
+        """
+        return not self.is_empty and any(node.has_transitions() for node in self._state(folder))
+
+
+class ContentMatcher(object):
+    """
+    Matches the content and exclude patterns of a link, content patterns having the semantics of glob.glob, while
+    listing each folder once for all patterns.
+    """
+
+    def __init__(self, content, exclude=None):
+        """
+        :param content: absolute, normalized path patterns, e.g. os.path.abspath(os.path.join(source, '*.cs')).
+        :param exclude: absolute, normalized path patterns of paths to leave out, see ExcludeRules.
+        """
+        self._content = [_Pattern(p) for p in content]
+        self._rules = ExcludeRules(exclude or [])
+        self._listings = {}
+        self._exists = {}
+
+    def matches(self):
+        """
+        Yields the paths matching content patterns, pattern by pattern in directory order as glob would, except
+        excluded ones. A path matching several content patterns is yielded for each.
+        :return:
+        """
+        for path, _ in self._matches():
+            yield path
+
+    def _matches(self):
+        """
+        :return: an iterator over (matching path, is dir or None if unknown).
+        """
+        for pattern in self._content:
+            for folder, names in self._expand(pattern):
+                is_dir = self._list(folder)[1] if pattern.is_magic else {}
+                for name in names:
+                    if not self._rules.is_excluded(folder, name):
+                        yield os.path.join(folder, name), is_dir.get(name, None)
+
+    @property
+    def listed_folders(self):
+        """
+        :return: the folders listed so far.
+        """
+        return list(self._listings)
+
+    def walk(self):
+        """
+        Yields what to link for the matching paths: a matching folder with excluded paths under it is split into
+        a folder of links to its kept entries, and its excluded sub-folders are not listed.
+        :return: an iterator over (LinkOperation.LINK or LinkOperation.MKDIR, path, path relative to the link
+        target).
+        """
+        for path, is_dir in self._matches():
+            for item in self._walk(path, os.path.basename(path), is_dir):
+                yield item
+
+    def _walk(self, path, relative_path, is_dir):
+        if is_dir is False or not self._rules.may_match_under(path) or not (is_dir or os.path.isdir(path)):
+            yield LinkOperation.LINK, path, relative_path
+            return
+
+        yield LinkOperation.MKDIR, path, relative_path
+        for name, is_child_dir in self._list(path)[0]:
+            if not self._rules.is_excluded(path, name):
+                for item in self._walk(os.path.join(path, name), os.path.join(relative_path, name), is_child_dir):
+                    yield item
+
+    def _expand(self, pattern):
+        """
+        :param pattern:
+        :return: a list of (folder, matching names in folder).
+        """
+        if not pattern.is_magic:
+            folder, name = os.path.split(pattern.pattern)
+            return [(folder, [name])] if self._lexists(pattern.pattern) else []
+
+        # like glob, the literal leading folder is listed without checking it exists.
+        folders = [os.path.join(pattern.root, *[c.text for c in pattern.components[:pattern.literal_length]])]
+
+        last = len(pattern.components) - 1
+        for i in range(pattern.literal_length, last + 1):
+            component = pattern.components[i]
+            expanded = []
+            for folder in folders:
+                if component.is_magic:
+                    names = component.filter(self._list(folder)[0], dironly=i < last)
+                elif self._lexists(os.path.join(folder, component.text)):
+                    names = [component.text]
+                else:
+                    continue
+
+                if names:
+                    expanded.append((folder, names))
+
+            if i == last:
+                return expanded
+            folders = [os.path.join(folder, name) for folder, names in expanded for name in names]
+
+    def _list(self, folder):
+        """
+        :param folder:
+        :return: ([(name, is dir)] in directory order, dict of name -> is dir)
+        """
+        listing = self._listings.get(folder, None)
+        if listing is None:
+            entries = []
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        entries.append((entry.name, is_dir))
+            except OSError:
+                pass
+            listing = self._listings[folder] = (entries, dict(entries))
+        return listing
+
+    def _lexists(self, path):
+        exists = self._exists.get(path, None)
+        if exists is None:
+            exists = self._exists[path] = os.path.lexists(path)
+        return exists
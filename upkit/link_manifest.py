@@ -0,0 +1,116 @@
+import json
+import os
+
+from upkit import utils
+
+
+class LinkManifest(object):
+    """
+    Records the links created by a link run, so the next run only changes what differs.
+    """
+    version = 1
+
+    def __init__(self, path, entries=None):
+        """
+        :param path: the manifest file, e.g. <project>/.upkit/manifest.json.
+        :param entries: a dict of target -> {'source': planned source, 'link': created link value}, and 'mode'
+        for targets materialized as real trees, see materialize.materialize.
+        """
+        self.path = path
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a manifest, a missing or unreadable manifest is empty so everything gets relinked.
+        :param path:
+        :return:
+        """
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return cls(path)
+
+        if not isinstance(data, dict) or data.get('version') != cls.version:
+            return cls(path)
+
+        return cls(path, entries=data.get('links', {}))
+
+    def save(self):
+        utils.mkdir_p(os.path.dirname(self.path))
+
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as fh:
+            json.dump({'version': self.version, 'links': self.entries}, fh, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def is_linked(self, source, target):
+        """
+        Checks if target is still the link created for source by a previous run, and source still exists.
+        :param source:
+        :param target:
+        :return:
+        """
+        entry = self.entries.get(target)
+        if not entry or entry.get('source') != source:
+            return False
+
+        try:
+            return os.readlink(target) == entry.get('link') and os.path.exists(source)
+        except OSError:
+            return False
+
+    def invalidate(self):
+        """
+        Forgets the state of recorded links, so all of them get relinked while stale ones are still removed.
+        :return:
+        """
+        for entry in self.entries.values():
+            entry['link'] = None
+
+    def add(self, source, target, mode=None):
+        """
+        Records target as linked to source, target must exist.
+        :param source:
+        :param target:
+        :param mode: the mode target was materialized with, None for links. Materialized targets are not
+        checked for changes, so they are created again by each run.
+        :return:
+        """
+        if mode is None:
+            self.entries[target] = {
+                'source': source,
+                'link': os.readlink(target),
+            }
+        else:
+            self.entries[target] = {
+                'source': source,
+                'link': None,
+                'mode': mode,
+            }
+
+    def remove_stale(self, targets):
+        """
+        Removes links recorded by a previous run which are not in given targets anymore, and materialized
+        targets. Paths replaced by anything else than a link are left untouched.
+        :param targets: the set of targets to keep.
+        :return: the list of removed targets.
+        """
+        removed = []
+        stale = [t for t in self.entries if t not in targets]
+
+        # deepest paths first.
+        for target in sorted(stale, key=len, reverse=True):
+            entry = self.entries.pop(target)
+            if utils.is_link(target):
+                utils.fs_unlink(target)
+                removed.append(target)
+            elif entry.get('mode') and os.path.lexists(target):
+                if os.path.isdir(target):
+                    utils.rmdir(target)
+                else:
+                    os.unlink(target)
+                removed.append(target)
+
+        return removed
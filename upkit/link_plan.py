@@ -0,0 +1,499 @@
+import errno
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from upkit import materialize, reporting, utils
+from upkit.link_manifest import LinkManifest
+
+# the maximum number of targets applied by a worker at once, when applying concurrently.
+_CHUNK_SIZE = 64
+
+
+class LinkOperation(object):
+    """
+    A single filesystem change planned by PackageLinker.
+    """
+    LINK = 'link'
+    COPY = 'copy'
+    MKDIR = 'mkdir'
+
+    def __init__(self, kind, source, target, link=None, linkspec=None, folder=None, mode=None):
+        """
+        :param kind: LINK to link target to source, COPY to copy source to target unless target exists, MKDIR to
+        create target as a folder for links to some of the entries of source.
+        :param source: absolute source path.
+        :param target: absolute target path.
+        :param link: the source of the top-level link the operation was planned from.
+        :param linkspec: path to the linkspec file defining the operation, if any.
+        :param folder: (source folder, target folder) of a content link matching all the entries of its source,
+        which the operation links one of, see collapse().
+        :param mode: how LINK creates target, see materialize.materialize, defaults to materialize.SYMLINK.
+        """
+        self.kind = kind
+        self.source = source
+        self.target = target
+        self.link = link
+        self.linkspec = linkspec
+        self.folder = folder
+        self.mode = mode
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'source': self.source,
+            'target': self.target,
+            'link': self.link,
+            'linkspec': self.linkspec,
+            'mode': self.mode,
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, LinkOperation) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'LinkOperation(%s, "%s" -> "%s")' % (self.kind, self.source, self.target)
+
+
+def execute(operations, forced=False, manifest=None, jobs=1):
+    """
+    Applies planned operations in order.
+    :param operations: a list of LinkOperation.
+    :param forced: replace existing link targets.
+    :param manifest: a LinkManifest from the previous run. When given, links left unchanged since that run are
+    kept as is, links not planned anymore are removed, and the manifest is updated and saved.
+    :param jobs: the number of threads applying operations. Operations are split into batches where no target is
+    under another one, the folders of a batch are created once, then its targets are applied concurrently, the
+    operations on a same target in order. The result is the same as applying operations one at a time.
+    :return: (links created, links left unchanged, stale links removed)
+    """
+    progress = reporting.get_reporter().progress('Linking', total=len(operations))
+    try:
+        result = _execute(operations, forced, manifest, jobs, progress)
+    finally:
+        # ends the progress line before errors are reported.
+        progress.finish()
+
+    if manifest is not None:
+        manifest.save()
+
+    return result
+
+
+def _execute(operations, forced, manifest, jobs, progress):
+    """
+    :return: (links created, links left unchanged, stale links removed)
+    """
+    removed = []
+    if manifest is not None:
+        removed = manifest.remove_stale(set(o.target for o in operations if o.kind == LinkOperation.LINK))
+        for target in removed:
+            reporting.get_reporter().event('unlink', target=target)
+
+    if jobs > 1 and len(operations) > _CHUNK_SIZE:
+        created, unchanged = _execute_concurrently(operations, forced, manifest, jobs, progress)
+    else:
+        created, unchanged = _execute_serially(operations, forced, manifest, progress)
+    return created, unchanged, len(removed)
+
+
+def _staging_folders(root):
+    """
+    :param root:
+    :return: (the folder where the new tree of root is built, the folder where the previous one is moved to)
+    """
+    return root + '.upkit-staging', root + '.upkit-previous'
+
+
+def recover_staged(root):
+    """
+    Cleans up after a staged run which was interrupted, e.g. killed: the staging folder is removed, and the
+    previous tree of root is moved back if it was moved aside but not replaced.
+    :param root:
+    :return:
+    """
+    staging, previous = _staging_folders(root)
+    if os.path.lexists(previous):
+        if os.path.lexists(root):
+            utils.rmdir(previous)
+        else:
+            os.rename(previous, root)
+    utils.rmdir(staging)
+
+
+def _exchange(path, other):
+    """
+    Atomically exchanges two paths with renameat2(RENAME_EXCHANGE), on Linux.
+    :param path:
+    :param other:
+    :return: False if not supported by the system or the filesystem.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    renameat2 = getattr(libc, 'renameat2', None)
+    if renameat2 is None:
+        return False
+
+    # AT_FDCWD and RENAME_EXCHANGE.
+    if renameat2(-100, os.fsencode(path), -100, os.fsencode(other), 2) == 0:
+        return True
+
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP):
+        return False
+    raise OSError(error, 'renameat2 failed: %s' % os.strerror(error), path)
+
+
+def _swap(root, staging, previous):
+    """
+    Moves the staging folder to root.
+    :return: the path of the previous tree of root, or None if root did not exist.
+    """
+    if not os.path.lexists(root):
+        os.rename(staging, root)
+        return None
+
+    if _exchange(staging, root):
+        return staging
+
+    # root is missing between both renames, recover_staged moves it back if interrupted.
+    os.rename(root, previous)
+    try:
+        os.rename(staging, root)
+    except OSError:
+        os.rename(previous, root)
+        raise
+    return previous
+
+
+def execute_staged(operations, root, forced=False, manifest=None, jobs=1):
+    """
+    Applies planned operations like execute, but the operations on targets under root are applied to a staging
+    copy of root, next to it, whose files are hard links to the files of root. The staging copy then replaces root
+    with renames, atomically on Linux. If anything fails before that, root is left as it was. Operations on other
+    targets are applied in place, once root is replaced, so that nothing is changed if the operations under root
+    fail. Links applied in place are recorded in the manifest even if some fail.
+    :param operations: a list of LinkOperation.
+    :param root: the folder to replace, e.g. the Assets folder of a Unity project.
+    :param forced: replace existing link targets.
+    :param manifest: a LinkManifest from the previous run, see execute.
+    :param jobs: the number of threads applying operations, see execute.
+    :return: (links created, links left unchanged, stale links removed)
+    """
+    root = os.path.abspath(root)
+    recover_staged(root)
+
+    # root itself or a folder containing it is replaced in place anyway.
+    if (os.path.lexists(root) and (utils.is_link(root) or not os.path.isdir(root))) or \
+            any(_is_under(root, o.target) for o in operations):
+        return execute(operations, forced=forced, manifest=manifest, jobs=jobs)
+
+    staging, previous = _staging_folders(root)
+
+    def _staged(path):
+        return staging + path[len(root):]
+
+    def _unstaged(path):
+        return root + path[len(staging):]
+
+    staged_operations = []
+    other_operations = []
+    for operation in operations:
+        if _is_under(operation.target, root):
+            staged_operations.append(LinkOperation(operation.kind, operation.source, _staged(operation.target),
+                                                   link=operation.link, linkspec=operation.linkspec,
+                                                   mode=operation.mode))
+        else:
+            other_operations.append(operation)
+
+    staged_manifest = other_manifest = None
+    if manifest is not None:
+        staged_manifest = LinkManifest(manifest.path, dict(
+            (_staged(t), e) for t, e in manifest.entries.items() if _is_under(t, root)))
+        other_manifest = LinkManifest(manifest.path, dict(
+            (t, e) for t, e in manifest.entries.items() if not _is_under(t, root)))
+
+    progress = reporting.get_reporter().progress('Linking', total=len(operations))
+    try:
+        try:
+            if os.path.isdir(root):
+                utils.clone_tree(root, staging)
+            else:
+                utils.mkdir_p(staging)
+
+            staged_result = _execute(staged_operations, forced, staged_manifest, jobs, progress)
+            replaced = _swap(root, staging, previous)
+        except:
+            utils.rmdir(staging)
+            raise
+
+        try:
+            other_result = _execute(other_operations, forced, other_manifest, jobs, progress)
+        finally:
+            if manifest is not None:
+                manifest.entries = dict(other_manifest.entries)
+                manifest.entries.update((_unstaged(t), e) for t, e in staged_manifest.entries.items())
+                manifest.save()
+
+            if replaced:
+                utils.rmdir(replaced)
+    finally:
+        progress.finish()
+
+    return tuple(a + b for a, b in zip(staged_result, other_result))
+
+
+def _apply(operation, forced, manifest):
+    """
+    :param operation:
+    :param forced:
+    :param manifest:
+    :return: True if a link was created, False if it was left unchanged, None for other operations.
+    """
+    if operation.kind == LinkOperation.LINK:
+        if manifest is not None and manifest.is_linked(operation.source, operation.target):
+            return False
+
+        if operation.mode in (None, materialize.SYMLINK):
+            utils.fs_link(operation.source, operation.target, hard_link=True, forced=forced)
+            mode = None
+        else:
+            mode = materialize.materialize(operation.source, operation.target, operation.mode, forced=forced)
+        reporting.get_reporter().event('link', source=operation.source, target=operation.target)
+
+        if manifest is not None:
+            manifest.add(operation.source, operation.target, mode=mode)
+        return True
+    elif operation.kind == LinkOperation.MKDIR:
+        if os.path.lexists(operation.target) and (utils.is_link(operation.target) or
+                                                 not os.path.isdir(operation.target)):
+            if not forced:
+                raise RuntimeError('Path "%s" exists.' % operation.target)
+            utils.remove(operation.target)
+        utils.mkdir_p(operation.target)
+    elif operation.kind == LinkOperation.COPY:
+        if not os.path.exists(operation.target):
+            utils.copy(operation.source, operation.target)
+    else:
+        raise ValueError('Unknown link operation "%s".' % operation.kind)
+    return None
+
+
+def _execute_serially(operations, forced, manifest, progress=None):
+    """
+    :return: (links created, links left unchanged)
+    """
+    created = unchanged = 0
+    for operation in operations:
+        if progress is not None:
+            progress.update()
+
+        result = _apply(operation, forced, manifest)
+        if result is True:
+            created += 1
+        elif result is False:
+            unchanged += 1
+    return created, unchanged
+
+
+def _parents(path):
+    parents = []
+    parent = os.path.dirname(path)
+    while parent != path:
+        parents.append(parent)
+        path, parent = parent, os.path.dirname(parent)
+    return parents
+
+
+def _batches(operations):
+    """
+    Splits operations into consecutive batches where no target is under another target of the same batch, so
+    that operations on different targets of a batch do not depend on each other.
+    :param operations:
+    :return: an iterator over lists of operations, in order.
+    """
+    batch = []
+    targets = set()
+    folders = set()
+
+    for operation in operations:
+        parents = _parents(operation.target)
+        if operation.target in folders or any(p in targets for p in parents):
+            yield batch
+            batch = []
+            targets = set()
+            folders = set()
+
+        batch.append(operation)
+        targets.add(operation.target)
+        folders.update(parents)
+
+    if batch:
+        yield batch
+
+
+def _execute_concurrently(operations, forced, manifest, jobs, progress):
+    """
+    :return: (links created, links left unchanged)
+    """
+    created = unchanged = 0
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for batch in _batches(operations):
+            # the operations of each target in order, and the folders of targets, in order of first use.
+            by_target = OrderedDict()
+            folders = OrderedDict()
+            for operation in batch:
+                by_target.setdefault(operation.target, []).append(operation)
+                folders[os.path.dirname(operation.target)] = True
+
+            for folder in folders:
+                if not os.path.isdir(folder):
+                    utils.mkdir_p(folder)
+
+            units = list(by_target.values())
+            chunk_size = max(1, min(_CHUNK_SIZE, (len(units) + jobs - 1) // jobs))
+            futures = []
+            for i in range(0, len(units), chunk_size):
+                chunk = [o for unit in units[i:i + chunk_size] for o in unit]
+                futures.append((len(chunk), executor.submit(_execute_serially, chunk, forced, manifest)))
+
+            # all the futures of a batch complete before the next batch starts, errors are raised in order.
+            errors = []
+            for count, future in futures:
+                try:
+                    chunk_created, chunk_unchanged = future.result()
+                except Exception as err:
+                    errors.append(err)
+                    continue
+                created += chunk_created
+                unchanged += chunk_unchanged
+                progress.update(count)
+
+            if errors:
+                raise errors[0]
+
+    return created, unchanged
+
+
+def _runs(operations):
+    """
+    Finds the runs of consecutive operations linking the entries of a same content link folder.
+    :param operations:
+    :return: a list of (index of the first operation, index after the last one, source folder, target folder).
+    """
+    runs = []
+    start = 0
+    while start < len(operations):
+        folder = operations[start].folder
+        end = start + 1
+        if folder is not None:
+            while end < len(operations) and operations[end].folder == folder:
+                end += 1
+            runs.append((start, end) + tuple(folder))
+        start = end
+    return runs
+
+
+def _is_collapsible_target(target_folder, names):
+    """
+    Checks a target folder can be replaced by a link without losing anything: it does not exist, is a link, or
+    only has links named as entries of the source folder, e.g. created by a previous run.
+    :param target_folder:
+    :param names: the entry names of the source folder.
+    :return:
+    """
+    if not os.path.lexists(target_folder) or utils.is_link(target_folder):
+        return True
+    if not os.path.isdir(target_folder):
+        return False
+
+    with os.scandir(target_folder) as it:
+        return all(entry.name in names and entry.is_symlink() for entry in it)
+
+
+def collapse(operations, reserved=()):
+    """
+    Replaces the links to the entries of a content link folder by a link to the folder itself, when the target
+    folder would have nothing else: no entry of the source is left out, hidden ones included, no other operation
+    targets a path in the target folder, and nothing but links to the source entries is already in it. The linked
+    tree is the same, with fewer links to create and scan.
+    :param operations: a list of LinkOperation, those which may be collapsed have a folder.
+    :param reserved: folders created outside of the plan, e.g. by a link template, target folders containing one
+    are not collapsed.
+    :return: a new list of LinkOperation.
+    """
+    runs = _runs(operations)
+    if not runs:
+        return operations
+
+    candidates = set(run[3] for run in runs)
+    min_length = min(len(c) for c in candidates)
+
+    # the number of targets in or under each candidate folder.
+    counts = dict((c, 0) for c in candidates)
+    for path in [o.target for o in operations] + list(reserved):
+        parent = os.path.dirname(path)
+        while len(parent) >= min_length:
+            if parent in counts:
+                counts[parent] += 1
+            next_parent = os.path.dirname(parent)
+            if next_parent == parent:
+                break
+            parent = next_parent
+
+    targets = set(o.target for o in operations)
+    result = []
+    done = 0
+    for start, end, source_folder, target_folder in runs:
+        result.extend(operations[done:start])
+        done = end
+        run = operations[start:end]
+
+        # materialized trees are real folders anyway.
+        collapsible = False
+        if run[0].mode in (None, materialize.SYMLINK) and counts[target_folder] == len(run) and \
+                target_folder not in targets and not _is_under(target_folder, source_folder) and \
+                not _is_under(source_folder, target_folder):
+            names = set(os.listdir(source_folder)) if os.path.isdir(source_folder) else set()
+            collapsible = bool(names) and names == set(os.path.basename(o.target) for o in run) and \
+                _is_collapsible_target(target_folder, names)
+
+        if collapsible:
+            result.append(LinkOperation(LinkOperation.LINK, source_folder, target_folder,
+                                        link=run[0].link, linkspec=run[0].linkspec, mode=run[0].mode))
+            continue
+
+        # links to entries must not be created through a link to the source folder, e.g. by a previous collapse.
+        if utils.is_link(target_folder):
+            result.append(LinkOperation(LinkOperation.MKDIR, source_folder, target_folder,
+                                        link=run[0].link, linkspec=run[0].linkspec))
+        result.extend(run)
+
+    result.extend(operations[done:])
+    return result
+
+
+def _is_under(path, folder):
+    return path == folder or path.startswith(os.path.join(folder, ''))
+
+
+def dump(operations, stream):
+    """
+    Writes operations to a stream as a JSON list.
+    :param operations:
+    :param stream:
+    :return:
+    """
+    json.dump([operation.to_dict() for operation in operations], stream, indent=2)
+    stream.write('\n')
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+
+from upkit import utils
+
+
+class LinkspecIndex(object):
+    """
+    Finds the linkspec file of source folders with one directory listing per folder, once per run. With a path,
+    e.g. <project>/.upkit/cache/linkspec-index.json, found linkspecs are also kept between runs and reused while
+    the listed folders keep their modification time.
+    """
+    version = 1
+    file_names = ('linkspec.yaml', 'linkspec.yml')
+    content_folder_name = 'content'
+
+    # folders modified this recently may change again within the filesystem timestamp granularity.
+    racy_seconds = 2
+
+    def __init__(self, path=None, entries=None):
+        """
+        :param path: the index file, the index is not kept between runs if None.
+        :param entries: a dict of source folder -> {'linkspec': path or None, 'folders': [[folder, mtime_ns]]}.
+        """
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self._found = {}
+        self._changed = False
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index, a missing or unreadable index is empty.
+        :param path:
+        :return:
+        """
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return cls(path)
+
+        if not isinstance(data, dict) or data.get('version') != cls.version:
+            return cls(path)
+
+        return cls(path, entries=data.get('sources', {}))
+
+    def save(self):
+        """
+        Saves the entries found by this run, if they changed.
+        :return:
+        """
+        if not self.path:
+            return
+
+        entries = dict((k, v) for k, v in self.entries.items() if k in self._found)
+        if not self._changed and len(entries) == len(self.entries):
+            return
+
+        utils.mkdir_p(os.path.dirname(self.path))
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as fh:
+            json.dump({'version': self.version, 'sources': entries}, fh, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+        self.entries = entries
+        self._changed = False
+
+    def find(self, source):
+        """
+        Finds the linkspec of a source folder: linkspec.yaml, linkspec.yml, content/linkspec.yaml or
+        content/linkspec.yml, in that order.
+        :param source: the source folder.
+        :return: the linkspec path or None.
+        """
+        source = os.path.abspath(source)
+        if source in self._found:
+            return self._found[source]
+
+        entry = self.entries.get(source, None)
+        if entry is not None and self._is_unchanged(entry):
+            linkspec = entry['linkspec']
+        else:
+            linkspec, folders = self._discover(source)
+            self._record(source, linkspec, folders)
+
+        self._found[source] = linkspec
+        return linkspec
+
+    def forget(self, folders):
+        """
+        Forgets the linkspecs found for the sources among folders, or whose content folder is among folders, so
+        that they are found again, e.g. after linkspecs were added to or removed from these folders.
+        :param folders:
+        :return:
+        """
+        folders = set(os.path.abspath(f) for f in folders)
+        for source in list(self._found):
+            if source in folders or os.path.join(source, self.content_folder_name) in folders:
+                del self._found[source]
+
+    def _discover(self, source):
+        """
+        :param source:
+        :return: (linkspec path or None, list of (listed folder, mtime_ns))
+        """
+        folders = []
+        folder = source
+        while folder:
+            try:
+                mtime = os.stat(folder).st_mtime_ns if self.path else None
+                entries = dict((e.name, e) for e in os.scandir(folder))
+            except OSError:
+                return None, []
+            folders.append((folder, mtime))
+
+            for name in self.file_names:
+                entry = entries.get(name, None)
+                if entry is not None and entry.is_file():
+                    return entry.path, folders
+
+            entry = entries.get(self.content_folder_name, None)
+            folder = entry.path if folder == source and entry is not None and entry.is_dir() else None
+
+        return None, folders
+
+    def _record(self, source, linkspec, folders):
+        if not self.path:
+            return
+
+        now = time.time()
+        if not folders or any(now - mtime / 1e9 < self.racy_seconds for _, mtime in folders):
+            if self.entries.pop(source, None) is not None:
+                self._changed = True
+            return
+
+        self.entries[source] = {
+            'linkspec': linkspec,
+            'folders': [[folder, mtime] for folder, mtime in folders],
+        }
+        self._changed = True
+
+    @staticmethod
+    def _is_unchanged(entry):
+        try:
+            return all(os.stat(folder).st_mtime_ns == mtime for folder, mtime in entry['folders'])
+        except (OSError, KeyError, TypeError, ValueError):
+            return False
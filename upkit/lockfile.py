@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+
+
+class Lockfile(object):
+    """
+    Records what each remote source resolved to (upkit.lock), so that later runs can link the same packages without
+    network access.
+    """
+    version = 1
+
+    def __init__(self, path, entries=None):
+        """
+        :param path: the lock file.
+        :param entries: a dict of source id -> resolved details, e.g. commit or version and content hash.
+        """
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self._used = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a lock file, a missing lock file is empty.
+        :param path:
+        :return:
+        """
+        if not os.path.isfile(path):
+            return cls(path)
+
+        with open(path, 'r') as fh:
+            try:
+                data = json.load(fh)
+            except ValueError:
+                raise ValueError('Invalid lock file "%s".' % path)
+
+        if not isinstance(data, dict) or data.get('version') != cls.version:
+            raise ValueError('Unsupported lock file "%s".' % path)
+
+        return cls(path, entries=data.get('sources', {}))
+
+    def get(self, source_id):
+        """
+        Gets the locked details of a source and marks it used by this run.
+        :param source_id:
+        :return: the details or None.
+        """
+        with self._lock:
+            self._used.add(source_id)
+            return self.entries.get(source_id, None)
+
+    def set(self, source_id, details):
+        with self._lock:
+            self._used.add(source_id)
+            self.entries[source_id] = details
+
+    def save(self):
+        """
+        Saves the entries used by this run, if they changed.
+        :return:
+        """
+        with self._lock:
+            entries = dict((k, v) for k, v in self.entries.items() if k in self._used)
+
+        if os.path.isfile(self.path) and entries == Lockfile.load(self.path).entries:
+            return
+
+        if not entries and not os.path.isfile(self.path):
+            return
+
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as fh:
+            json.dump({'version': self.version, 'sources': entries}, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        os.replace(temp_path, self.path)
@@ -0,0 +1,184 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+
+from upkit import tracing, utils
+
+SYMLINK = 'symlink'
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+COPY = 'copy'
+AUTO = 'auto'
+
+MODES = (SYMLINK, HARDLINK, REFLINK, COPY, AUTO)
+
+# the FICLONE ioctl request, from linux/fs.h.
+_FICLONE = 0x40049409
+
+# the modes tried by AUTO, cheapest first.
+_AUTO_MODES = (REFLINK, HARDLINK, COPY)
+
+# (source device, target device) -> the mode found by probe.
+_probed = {}
+_probed_lock = threading.Lock()
+
+
+def hardlink(source, target):
+    os.link(source, target)
+
+
+def reflink(source, target):
+    """
+    Clones a file on copy-on-write filesystems, e.g. Btrfs or XFS: the clone shares the data of source until
+    either changes.
+    :param source:
+    :param target:
+    :return:
+    """
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.ENOTSUP, 'Reflinks are only supported on Linux.', target)
+
+    import fcntl
+
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
+    shutil.copystat(source, target)
+
+
+def copy_file(source, target):
+    """
+    Copies a file, in the kernel with copy_file_range where available, which some filesystems, e.g. NFS 4.2,
+    turn into a server-side copy or a clone.
+    :param source:
+    :param target:
+    :return:
+    """
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        copied = False
+        if hasattr(os, 'copy_file_range'):
+            try:
+                size = os.fstat(src.fileno()).st_size
+                while os.copy_file_range(src.fileno(), dst.fileno(), max(size, 1 << 20)):
+                    pass
+                copied = True
+            except OSError as err:
+                if err.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP):
+                    raise
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        if not copied:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    shutil.copystat(source, target)
+
+
+_FILE_FUNCTIONS = {
+    HARDLINK: hardlink,
+    REFLINK: reflink,
+    COPY: copy_file,
+}
+
+
+def _first_file(folder):
+    """
+    :param folder:
+    :return: the path of a file under folder, or None if there is none.
+    """
+    for root, folders, files in os.walk(folder):
+        if files:
+            return os.path.join(root, files[0])
+    return None
+
+
+def probe(source, target_folder):
+    """
+    Finds the cheapest mode that works from a file to a folder, by trying them on a temporary file, the result is
+    remembered for the filesystems of both.
+    :param source: an existing file.
+    :param target_folder: an existing folder.
+    :return: REFLINK, HARDLINK or COPY.
+    """
+    key = (os.stat(source).st_dev, os.stat(target_folder).st_dev)
+    with _probed_lock:
+        mode = _probed.get(key)
+        if mode is not None:
+            return mode
+
+        mode = COPY
+        probe_file = os.path.join(target_folder, '.upkit-probe-%d' % os.getpid())
+        for candidate in _AUTO_MODES[:-1]:
+            try:
+                _FILE_FUNCTIONS[candidate](source, probe_file)
+            except OSError:
+                continue
+            finally:
+                if os.path.lexists(probe_file):
+                    os.unlink(probe_file)
+            mode = candidate
+            break
+
+        _probed[key] = mode
+        return mode
+
+
+def _materialize_tree(source, target, file_function):
+    os.mkdir(target)
+    with os.scandir(source) as it:
+        entries = list(it)
+
+    for entry in entries:
+        path = os.path.join(target, entry.name)
+        # links are not followed, e.g. to a parent folder.
+        if utils.is_link(entry.path):
+            utils.copy_link(entry.path, path)
+        elif entry.is_dir(follow_symlinks=False):
+            _materialize_tree(entry.path, path, file_function)
+        else:
+            file_function(entry.path, path)
+
+
+@tracing.traced('materialize', 'fs', lambda source, target, mode=SYMLINK, forced=False: {'target': target,
+                                                                                          'mode': mode})
+def materialize(source, target, mode=SYMLINK, forced=False):
+    """
+    Creates target from source with given mode:
+    SYMLINK links target to source, see utils.fs_link,
+    HARDLINK, REFLINK and COPY create a real tree of folders, where each file is respectively a hard link to, a
+    copy-on-write clone of, or a copy of the file of source, and each link a link with the same value,
+    AUTO uses the cheapest of REFLINK, HARDLINK and COPY which works between the filesystems of source and target.
+    :param source: the existing file or folder.
+    :param target: the path to create, its parent folders are created if needed.
+    :param mode:
+    :param forced: replace target if it already exists.
+    :return: the mode used.
+    """
+    if mode == SYMLINK:
+        utils.fs_link(source, target, forced=forced)
+        return mode
+    if mode not in MODES:
+        raise ValueError('Unknown link mode "%s".' % mode)
+
+    source = utils.realpath(source)
+    target = os.path.abspath(target)
+    if not os.path.exists(source):
+        raise ValueError('Path "%s" does not exist.' % source)
+
+    utils.clear_target(target, forced)
+
+    is_directory = os.path.isdir(source)
+    if mode == AUTO:
+        source_file = _first_file(source) if is_directory else source
+        mode = probe(source_file, os.path.dirname(target)) if source_file else COPY
+
+    if is_directory:
+        _materialize_tree(source, target, _FILE_FUNCTIONS[mode])
+    else:
+        _FILE_FUNCTIONS[mode](source, target)
+    return mode
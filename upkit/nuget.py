@@ -0,0 +1,270 @@
+import base64
+import hashlib
+import os
+import shutil
+import threading
+import zipfile
+
+from http import client
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+from upkit import utils
+
+DEFAULT_FEED = 'https://api.nuget.org/v3-flatcontainer/'
+
+# Package parts written by NuGet itself, which are not package content.
+_PACKAGE_PARTS = ('[Content_Types].xml', '_rels/', 'package/')
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class HttpConnectionPool(object):
+    """
+    Keeps one persistent HTTP connection per host and thread, so that downloads from the same feed reuse
+    connections.
+    """
+    max_redirects = 5
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _get_connection(self, scheme, netloc):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        key = (scheme, netloc)
+        if key not in connections:
+            if scheme == 'https':
+                connections[key] = client.HTTPSConnection(netloc, timeout=self.timeout)
+            elif scheme == 'http':
+                connections[key] = client.HTTPConnection(netloc, timeout=self.timeout)
+            else:
+                raise ValueError('Unsupported feed URL scheme "%s".' % scheme)
+        return connections[key]
+
+    def _discard_connection(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection:
+            connection.close()
+
+    def download(self, url, stream):
+        """
+        Downloads a URL into a stream, following redirects.
+        :param url:
+        :param stream: a binary stream to write to.
+        :return: False if the URL does not exist, True otherwise.
+        """
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            path = parts.path + ('?%s' % parts.query if parts.query else '')
+
+            # a kept-alive connection may have been closed by the server, retry once on a new one.
+            for attempt in (0, 1):
+                connection = self._get_connection(parts.scheme, parts.netloc)
+                try:
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    break
+                except (client.HTTPException, OSError):
+                    self._discard_connection(parts.scheme, parts.netloc)
+                    if attempt:
+                        raise
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urljoin(url, response.getheader('Location'))
+                continue
+
+            if response.status == 404:
+                response.read()
+                return False
+
+            if response.status != 200:
+                response.read()
+                raise RuntimeError('Failed to download "%s": HTTP %d %s.' % (url, response.status, response.reason))
+
+            while True:
+                chunk = response.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                stream.write(chunk)
+            return True
+
+        raise RuntimeError('Failed to download "%s": too many redirects.' % url)
+
+
+class NugetInstaller(object):
+    """
+    Installs NuGet packages into <output_folder>/<id>.<version>, from a v3 flat-container feed or a local folder
+    feed, without the nuget CLI.
+    """
+    hash_file_extension = '.nupkg.sha512'
+
+    def __init__(self, feed=None, connection_pool=None):
+        """
+        :param feed: a v3 flat-container URL, or a local folder containing .nupkg files.
+        :param connection_pool:
+        """
+        self.feed = feed or DEFAULT_FEED
+        self._connection_pool = connection_pool or HttpConnectionPool()
+
+    def get_package_folder(self, output_folder, package, version):
+        return os.path.join(output_folder, '%s.%s' % (package, version))
+
+    def is_installed(self, output_folder, package, version):
+        """
+        Checks if a package has been completely installed, the hash file being written last.
+        :param output_folder:
+        :param package:
+        :param version:
+        :return:
+        """
+        folder = self.get_package_folder(output_folder, package, version)
+        return os.path.isfile(os.path.join(folder, '%s.%s%s' % (package, version, self.hash_file_extension)))
+
+    def get_hash(self, output_folder, package, version):
+        """
+        :param output_folder:
+        :param package:
+        :param version:
+        :return: the base64 SHA-512 of an installed .nupkg, or None if the package is not installed.
+        """
+        folder = self.get_package_folder(output_folder, package, version)
+        try:
+            with open(os.path.join(folder, '%s.%s%s' % (package, version, self.hash_file_extension)), 'r') as fh:
+                return fh.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def install(self, output_folder, package, version):
+        """
+        Installs a package unless it is already installed.
+        :param output_folder:
+        :param package:
+        :param version:
+        :return: the package folder.
+        """
+        folder = self.get_package_folder(output_folder, package, version)
+        if self.is_installed(output_folder, package, version):
+            return folder
+
+        utils.mkdir_p(output_folder)
+        temp_folder = '%s.tmp-%d-%d' % (folder, os.getpid(), threading.current_thread().ident)
+        utils.rmdir(temp_folder)
+        utils.mkdir_p(temp_folder)
+
+        try:
+            name = '%s.%s' % (package, version)
+            nupkg_file = os.path.join(temp_folder, '%s.nupkg' % name)
+            with open(nupkg_file, 'wb') as fh:
+                writer = _HashingWriter(fh)
+                if not self._download(package, version, writer):
+                    raise ValueError('Package "%s" version "%s" not found in "%s".' % (package, version, self.feed))
+
+            _extract_package(nupkg_file, temp_folder)
+
+            with open(os.path.join(temp_folder, '%s%s' % (name, self.hash_file_extension)), 'w') as fh:
+                fh.write(writer.digest())
+
+            utils.rmdir(folder)
+            os.rename(temp_folder, folder)
+        finally:
+            utils.rmdir(temp_folder)
+
+        return folder
+
+    def _download(self, package, version, stream):
+        if os.path.isdir(self.feed):
+            path = _find_local_package(self.feed, package, version)
+            if not path:
+                return False
+            with open(path, 'rb') as fh:
+                shutil.copyfileobj(fh, stream, _CHUNK_SIZE)
+            return True
+
+        package_id = quote(package.lower())
+        package_version = quote(version.lower())
+        url = '%s/%s/%s/%s.%s.nupkg' % (self.feed.rstrip('/'), package_id, package_version,
+                                        package_id, package_version)
+        return self._connection_pool.download(url, stream)
+
+
+class _HashingWriter(object):
+    def __init__(self, stream):
+        self._stream = stream
+        self._hash = hashlib.sha512()
+
+    def write(self, data):
+        self._hash.update(data)
+        self._stream.write(data)
+
+    def digest(self):
+        return base64.b64encode(self._hash.digest()).decode('ascii')
+
+
+def _find_local_package(feed, package, version):
+    """
+    Finds a package in a folder feed, either flat (<id>.<version>.nupkg) or hierarchical
+    (<id>/<version>/<id>.<version>.nupkg), ignoring case.
+    :param feed:
+    :param package:
+    :param version:
+    :return: the .nupkg path or None.
+    """
+    file_name = ('%s.%s.nupkg' % (package, version)).lower()
+
+    candidates = [feed]
+    package_folder = _find_ignore_case(feed, package.lower())
+    if package_folder:
+        version_folder = _find_ignore_case(package_folder, version.lower())
+        if version_folder:
+            candidates.insert(0, version_folder)
+
+    for folder in candidates:
+        path = _find_ignore_case(folder, file_name)
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+def _find_ignore_case(folder, name):
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        return path
+
+    try:
+        for entry in os.listdir(folder):
+            if entry.lower() == name:
+                return os.path.join(folder, entry)
+    except OSError:
+        pass
+    return None
+
+
+def _extract_package(nupkg_file, folder):
+    """
+    Extracts package content, streaming each entry to disk.
+    :param nupkg_file:
+    :param folder:
+    :return:
+    """
+    folder = os.path.abspath(folder)
+    with zipfile.ZipFile(nupkg_file) as archive:
+        for info in archive.infolist():
+            name = unquote(info.filename)
+            if name.startswith(_PACKAGE_PARTS) or name.endswith('.psmdcp'):
+                continue
+
+            path = os.path.abspath(os.path.join(folder, name))
+            if not path.startswith(folder + os.sep):
+                raise ValueError('Invalid package entry "%s" in "%s".' % (info.filename, nupkg_file))
+
+            if name.endswith('/'):
+                utils.mkdir_p(path)
+                continue
+
+            utils.mkdir_p(os.path.dirname(path))
+            with archive.open(info) as reader, open(path, 'wb') as writer:
+                shutil.copyfileobj(reader, writer, _CHUNK_SIZE)
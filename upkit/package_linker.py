@@ -1,15 +1,21 @@
 import glob
-import copy
 import os
-from subprocess import call
+import re
+import threading
+from collections import ChainMap, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 
 import yaml
-import yamlordereddictloader
-import xmltodict
-from jinja2 import Template, Environment, meta, TemplateSyntaxError
-from git.repo.base import Repo
+from jinja2 import Environment, Undefined, meta, TemplateSyntaxError
 
-from upkit import utils
+from upkit import link_plan, materialize, reporting, tracing, utils
+from upkit.content_matcher import ContentMatcher
+from upkit.link_manifest import LinkManifest
+from upkit.link_plan import LinkOperation
+from upkit.linkspec_index import LinkspecIndex
+from upkit.lockfile import Lockfile
+from upkit.render_cache import RenderCache
 
 
 def _normalize_uri(uri):
@@ -37,90 +43,635 @@ def _normalize_uri(uri):
     return uri, details, sub_path
 
 
+def _split_uri_options(uri):
+    """
+    Splits options from a URI part, e.g. "master?depth=1&sparse" gives ("master", {"depth": "1", "sparse": ""}).
+    :param uri:
+    :return: (uri, options)
+    """
+    options = {}
+    if '?' not in uri:
+        return uri, options
+
+    idx = uri.rindex('?')
+    for option in uri[idx + 1:].split('&'):
+        if option:
+            name, _, value = option.partition('=')
+            options[name] = value
+
+    return uri[:idx], options
+
+
+def _param_scope(params, **overlay):
+    """
+    Creates a copy-on-write scope over params, values set in the scope do not change params.
+    :param params: a dict or a scope.
+    :param overlay: values to set in the new scope.
+    :return: a ChainMap.
+    """
+    parents = params.maps if isinstance(params, ChainMap) else [params]
+    return ChainMap(overlay, *parents)
+
+
+class _OrderedYamlLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+    """
+    Loads YAML with the C parser when available, keeping mappings in document order.
+    """
+
+
+def _construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node))
+
+
+_OrderedYamlLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _construct_ordered_mapping)
+
+
+def _load_yaml(content):
+    return yaml.load(content, Loader=_OrderedYamlLoader)
+
+
+class _PlaceholderUndefined(Undefined):
+    """
+    Renders an undefined config variable as itself, so that it can still be rendered from params later.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return '{{%s}}' % self._undefined_name if self._undefined_name else ''
+
+
+def _render_context(template, context):
+    """
+    Renders a compiled template in a context created by template.new_context(), the context then holds the
+    variables set by the template.
+    :param template:
+    :param context:
+    :return:
+    """
+    try:
+        return ''.join(template.root_render_func(context))
+    except Exception:
+        return template.environment.handle_exception()
+
+
+def _is_commit_sha(ref):
+    return len(ref) == 40 and all(c in '0123456789abcdef' for c in ref.lower())
+
+
+def _has_commit(repo, commit):
+    from git.exc import GitCommandError
+
+    try:
+        repo.git.cat_file('-e', '%s^{commit}' % commit)
+        return True
+    except GitCommandError:
+        return False
+
+
+class ResolveError(RuntimeError):
+    """
+    Raised when one or more remote sources cannot be resolved.
+    """
+    def __init__(self, errors):
+        """
+        :param errors: a list of (source, exception).
+        """
+        self.errors = errors
+        super(ResolveError, self).__init__('Failed to resolve %d source(s):\n%s' % (
+            len(errors), '\n'.join('  %s: %s' % (source, err) for source, err in errors)))
+
+
+class ResolutionMemo(object):
+    """
+    Remembers fetched remote packages during a link run, so that each one is fetched at most once.
+    """
+    def __init__(self):
+        self._futures = {}
+        self._ahead = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._futures
+
+    def get(self, key, fetch, ahead=False):
+        """
+        Gets the fetched package for a key, fetching it on first request. Concurrent requests for the same key wait
+        for the first fetch.
+        :param key: the normalized package key.
+        :param fetch: a function fetching the package and returning its local folder.
+        :param ahead: the package is fetched ahead of the requests using it, e.g. by PackageLinker.resolve, which
+        counts its own hits. Those requests then do not count as hits.
+        :return: the local folder.
+        """
+        with self._lock:
+            future = self._futures.get(key, None)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.misses += 1
+                if ahead:
+                    self._ahead.add(key)
+            elif key not in self._ahead:
+                self.hits += 1
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as err:
+                future.set_exception(err)
+
+        return future.result()
+
+    def count_hit(self):
+        """
+        Counts a request answered by an earlier one without calling get, e.g. a source listed twice.
+        :return:
+        """
+        with self._lock:
+            self.hits += 1
+
+    def peek(self, key):
+        """
+        Gets an already fetched package without counting a hit.
+        :param key:
+        :return:
+        """
+        return self._futures[key].result()
+
+
 class NugetResolver(object):
+    """
+    Resolves NuGet packages, downloaded and extracted in-process unless already present in the package folder.
+    """
     scheme = 'nuget:'
 
     def __init__(self, package_linker):
         self.package_linker = package_linker
+        self._installer = None
+        self._lock = threading.Lock()
+
+    def _get_installer(self):
+        with self._lock:
+            if not self._installer:
+                from upkit.nuget import NugetInstaller
+
+                self._installer = NugetInstaller(feed=self.package_linker.nuget_feed)
+            return self._installer
+
+    def normalize(self, source):
+        """
+        :param source:
+        :return: (key, sub_path), where key identifies the package to fetch.
+        """
+        package, version, sub_path = _normalize_uri(source.strip()[len(self.scheme):])
+        return (self.scheme, package, version), sub_path
 
     def resolve(self, source):
+        key, sub_path = self.normalize(source)
+        return os.path.join(self.package_linker.resolution_memo.get(key, partial(self.fetch, key)), sub_path)
+
+    def lock_id(self, key):
+        return '%s%s@%s' % key
+
+    @tracing.traced('nuget', 'resolver', lambda self, key: {'source': self.lock_id(key)})
+    def fetch(self, key):
         if not self.package_linker.package_folder:
             raise ValueError('"package_folder" is required but not specified, see -w parameter.')
 
-        source = source[len(self.scheme):]
-        package, version, sub_path = _normalize_uri(source)
+        reporting.get_reporter().event('fetch', source=self.lock_id(key))
+        _, package, version = key
+        if not version:
+            raise ValueError('Missing version of NuGet package "%s".' % package)
+
+        installer = self._get_installer()
+        package_folder = self.package_linker.package_folder
+        lockfile = self.package_linker.lockfile
+
+        if self.package_linker.frozen:
+            locked = lockfile.get(self.lock_id(key)) if lockfile else None
+            if not locked:
+                raise ValueError('"%s" is not locked, link without --frozen first.' % self.lock_id(key))
 
-        utils.mkdir_p(self.package_linker.package_folder)
-        call('nuget install %s -Version %s -OutputDirectory "%s"' % (package, version,
-                                                                     self.package_linker.package_folder),
-             shell=True)
-        return os.path.join(self.package_linker.package_folder, '%s.%s' % (package, version), sub_path)
+            package_hash = installer.get_hash(package_folder, package, version)
+            if not package_hash:
+                raise ValueError('"%s" is not in the package folder.' % self.lock_id(key))
+            if package_hash != locked.get('sha512', None):
+                raise ValueError('"%s" does not match the locked package hash.' % self.lock_id(key))
+
+            return installer.get_package_folder(package_folder, package, version)
+
+        folder = installer.install(package_folder, package, version)
+        if lockfile:
+            lockfile.set(self.lock_id(key), {
+                'version': version,
+                'sha512': installer.get_hash(package_folder, package, version),
+            })
+        return folder
 
 
 class GitResolver(object):
+    """
+    Resolves git repositories from one bare mirror per remote, with one worktree per branch, tag or commit.
+
+    Source options, given as `git:<url>[@<ref>][?<options>][#<sub_path>]`:
+    * `depth=N` (or `shallow` for depth 1) fetches only the last N commits of the ref, into a separate shallow
+      store instead of the full mirror.
+    * `sparse` checks out only `sub_path`, and skips fetching other files when combined with `depth`.
+    A ref given as a full commit SHA is pinned: an existing worktree at that commit is used without fetching.
+    """
+    # GitPython is imported by the methods using it, so that links without git sources do not load it.
     scheme = 'git:'
+    mirror_folder_name = '.git-mirrors'
+    options = ('depth', 'shallow', 'sparse')
 
     def __init__(self, package_linker):
         self.package_linker = package_linker
+        self._lock = threading.Lock()
+        self._mirror_locks = {}
+        self._fetched_mirrors = set()
+
+    def normalize(self, source):
+        """
+        :param source:
+        :return: (key, sub_path), where key identifies the repository, ref and fetch mode.
+        """
+        repo_uri, branch_or_tag, sub_path = _normalize_uri(source.strip()[len(self.scheme):])
+
+        repo_uri, options = _split_uri_options(repo_uri)
+        branch_or_tag, ref_options = _split_uri_options(branch_or_tag)
+        options.update(ref_options)
+
+        for name in options:
+            if name not in self.options:
+                raise ValueError('Unknown git source option "%s".' % name)
+
+        depth = 1 if 'shallow' in options else 0
+        if options.get('depth', None):
+            depth = int(options['depth'])
+
+        sparse_path = sub_path.strip('/') if 'sparse' in options else ''
+        return (self.scheme, repo_uri, branch_or_tag, depth, sparse_path), sub_path
 
     def resolve(self, source):
+        key, sub_path = self.normalize(source)
+        return os.path.join(self.package_linker.resolution_memo.get(key, partial(self.fetch, key)), sub_path)
+
+    def lock_id(self, key):
+        _, repo_uri, branch_or_tag, depth, sparse_path = key
+
+        options = []
+        if depth:
+            options.append('depth=%d' % depth)
+        if sparse_path:
+            options.append('sparse=%s' % sparse_path)
+
+        return '%s%s@%s%s' % (self.scheme, repo_uri, branch_or_tag, '?%s' % '&'.join(options) if options else '')
+
+    @tracing.traced('git', 'resolver', lambda self, key: {'source': self.lock_id(key)})
+    def fetch(self, key):
+        from git.repo.base import Repo
+
         if not self.package_linker.package_folder:
             raise ValueError('"package_folder" is required but not specified, see -w parameter.')
-        
-        repo_uri = source[len(self.scheme):]
 
-        repo_uri, branch_or_tag, sub_path = _normalize_uri(repo_uri)
+        reporting.get_reporter().event('fetch', source=self.lock_id(key))
 
-        # branch = branch_or_tag
-        # tag = None
-        # if branch_or_tag and ':' in branch_or_tag:
-        #     idx = branch_or_tag.index(':')
-        #     tag = branch_or_tag[idx + 1:]
-        #     branch = branch_or_tag[:idx]
+        _, repo_uri, branch_or_tag, depth, sparse_path = key
+        lockfile = self.package_linker.lockfile
 
         repo_id = repo_uri
         if branch_or_tag:
             repo_id = '%s.%s' % (repo_uri, branch_or_tag)
+        if depth:
+            repo_id = '%s.depth%d' % (repo_id, depth)
+        if sparse_path:
+            repo_id = '%s.sparse.%s' % (repo_id, sparse_path)
+
+        repo_path = os.path.join(self.package_linker.package_folder, self._to_folder_name(repo_id))
+
+        # locked commits are linked until asked to update them, and strictly when frozen.
+        locked = None
+        if lockfile and (self.package_linker.frozen or not self.package_linker.update_lock):
+            locked = lockfile.get(self.lock_id(key))
+        if self.package_linker.frozen and not locked:
+            raise ValueError('"%s" is not locked, link without --frozen first.' % self.lock_id(key))
+        if locked:
+            self._checkout_locked(repo_uri, repo_path, locked, depth, sparse_path)
+            return repo_path
+
+        # a pinned commit already checked out needs no network access.
+        pinned_commit = branch_or_tag if _is_commit_sha(branch_or_tag) else None
+        if pinned_commit and self._get_worktree_commit(repo_path) == pinned_commit:
+            mirror, commit = Repo(repo_path), pinned_commit
+        else:
+            with self._get_mirror_lock(repo_uri):
+                if depth:
+                    mirror, commit = self._fetch_shallow(repo_uri, branch_or_tag, depth, sparse_path)
+                else:
+                    mirror = self._update_mirror(repo_uri, required_commit=pinned_commit)
+                    commit = self._resolve_commit(mirror, branch_or_tag)
+                self._checkout_worktree(mirror, repo_path, commit, sparse_path)
+
+        if lockfile:
+            lockfile.set(self.lock_id(key), {
+                'commit': commit,
+                'tree': mirror.git.rev_parse('%s^{tree}' % commit),
+            })
 
-        repo_id = repo_id.replace('.', '_').replace(':', '_').replace('/', '_')
-        repo_path = os.path.join(self.package_linker.package_folder, repo_id)
-        utils.mkdir_p(self.package_linker.package_folder)
+        return repo_path
+
+    def _checkout_locked(self, repo_uri, repo_path, locked, depth, sparse_path):
+        """
+        Checks out a locked commit from the local mirror or shallow store, fetching it if it is missing unless
+        frozen, and checks that it has the locked tree.
+        :param repo_uri:
+        :param repo_path:
+        :param locked: the locked details, with 'commit' and 'tree'.
+        :param depth:
+        :param sparse_path:
+        :return:
+        """
+        from git.repo.base import Repo
+
+        commit = locked['commit']
+        if self._get_worktree_commit(repo_path) == commit:
+            self._check_locked_tree(Repo(repo_path), repo_uri, locked)
+            return
 
-        # Check if the repo already exists
-        repo = None
-        if os.path.isdir(repo_path):
+        store_path = self._get_mirror_path(repo_uri, suffix='.shallow.git' if depth else '.git')
+        with self._get_mirror_lock(repo_uri):
             try:
-                repo = Repo(repo_path)
-                if not hasattr(repo.remotes, 'origin') or not repo_uri == repo.remotes.origin.url:
-                    raise RuntimeError('Invalid existing repository %s' % repo_path)
+                store = Repo(store_path)
+            except Exception:
+                store = None
+
+            if not store or not _has_commit(store, commit):
+                if self.package_linker.frozen:
+                    raise ValueError('Locked commit %s of "%s" is not in the package folder.' % (commit, repo_uri))
+
+                if depth:
+                    store, _ = self._fetch_shallow(repo_uri, commit, depth, sparse_path)
                 else:
-                    repo.remotes.origin.pull()
-            except:
-                utils.rmdir(repo_path)
-                repo = None
+                    store = self._update_mirror(repo_uri, required_commit=commit)
+                if not _has_commit(store, commit):
+                    raise ValueError('Locked commit %s of "%s" is not in the remote, link with --update-lock to '
+                                     'lock another one.' % (commit, repo_uri))
+
+            self._check_locked_tree(store, repo_uri, locked)
+            self._checkout_worktree(store, repo_path, commit, sparse_path)
+
+    @staticmethod
+    def _check_locked_tree(repo, repo_uri, locked):
+        tree = repo.git.rev_parse('%s^{tree}' % locked['commit'])
+        if tree != locked.get('tree', None):
+            raise ValueError('Locked commit %s of "%s" does not have the locked tree %s.' % (
+                locked['commit'], repo_uri, locked.get('tree', None)))
+
+    def _to_folder_name(self, name):
+        return name.replace('.', '_').replace(':', '_').replace('/', '_')
+
+    def _get_mirror_path(self, repo_uri, suffix='.git'):
+        return os.path.join(self.package_linker.package_folder, self.mirror_folder_name,
+                            '%s%s' % (self._to_folder_name(repo_uri), suffix))
+
+    def _get_mirror_lock(self, repo_uri):
+        with self._lock:
+            if repo_uri not in self._mirror_locks:
+                self._mirror_locks[repo_uri] = threading.Lock()
+            return self._mirror_locks[repo_uri]
+
+    def _update_mirror(self, repo_uri, required_commit=None):
+        """
+        Clones or fetches the bare mirror of a remote, at most once per run.
+        :param repo_uri:
+        :param required_commit: if the mirror already has this commit, it is not fetched.
+        :return: the mirror Repo.
+        """
+        from git.repo.base import Repo
 
-        # the repository does not exist.
-        if not repo:
-            repo = Repo.clone_from(repo_uri, repo_path)
+        mirror_path = self._get_mirror_path(repo_uri)
 
-        self._swith_branch_or_tag(repo, branch_or_tag)
+        if repo_uri in self._fetched_mirrors:
+            return Repo(mirror_path)
 
-        return os.path.join(repo_path, sub_path)
+        from git.exc import InvalidGitRepositoryError, NoSuchPathError
 
-    def _swith_branch_or_tag(self, repo, branch_or_tag):
-        if not branch_or_tag:
-            return
+        mirror = None
+        if os.path.isdir(mirror_path):
+            # only an invalid mirror is rebuilt, the worktrees of other refs depend on it.
+            try:
+                mirror = Repo(mirror_path)
+                if not hasattr(mirror.remotes, 'origin') or not repo_uri == mirror.remotes.origin.url:
+                    mirror = None
+            except (InvalidGitRepositoryError, NoSuchPathError):
+                mirror = None
+
+            if mirror is None:
+                utils.rmdir(mirror_path)
+            else:
+                if required_commit and _has_commit(mirror, required_commit):
+                    return mirror
+                mirror.git.fetch('origin', '--prune', '--tags')
 
-        if hasattr(repo.remotes.origin.refs, branch_or_tag):
-            branch = repo.remotes.origin.refs[branch_or_tag]
-            branch.checkout()
-        elif hasattr(repo.tags, branch_or_tag):
-            tag_ref = repo.tags[branch_or_tag]
-            tag_branch = repo.create_head(branch_or_tag, tag_ref.commit)
-            tag_branch.checkout()
-        else:
+        # the mirror does not exist.
+        if not mirror:
+            utils.mkdir_p(os.path.dirname(mirror_path))
+            mirror = Repo.clone_from(repo_uri, mirror_path, mirror=True)
+
+        self._fetched_mirrors.add(repo_uri)
+        return mirror
+
+    def _fetch_shallow(self, repo_uri, branch_or_tag, depth, sparse):
+        """
+        Fetches the last commits of a single ref into the shallow store of a remote.
+        :param repo_uri:
+        :param branch_or_tag: a branch, tag or commit SHA, the remote HEAD if empty.
+        :param depth:
+        :param sparse: if set, file contents are fetched on checkout only.
+        :return: (store Repo, commit SHA)
+        """
+        from git.exc import GitCommandError
+        from git.repo.base import Repo
+
+        store_path = self._get_mirror_path(repo_uri, suffix='.shallow.git')
+
+        store = None
+        if os.path.isdir(store_path):
+            try:
+                store = Repo(store_path)
+                if not hasattr(store.remotes, 'origin') or not repo_uri == store.remotes.origin.url:
+                    raise RuntimeError('Invalid existing repository %s' % store_path)
+            except Exception:
+                utils.rmdir(store_path)
+                store = None
+
+        if not store:
+            store = Repo.init(store_path, mkdir=True, bare=True)
+            store.create_remote('origin', repo_uri)
+
+        if _is_commit_sha(branch_or_tag) and _has_commit(store, branch_or_tag):
+            return store, branch_or_tag
+
+        arguments = ['--depth=%d' % depth]
+        if sparse:
+            arguments.append('--filter=blob:none')
+
+        try:
+            store.git.fetch('origin', branch_or_tag or 'HEAD', *arguments)
+        except GitCommandError as err:
+            # network, authentication and other errors are raised as they are.
+            if "couldn't find remote ref" not in str(err.stderr).lower():
+                raise
             raise ValueError('"%s" is not a valid branch or tag.' % branch_or_tag)
 
+        return store, store.git.rev_parse('FETCH_HEAD^{commit}')
+
+    def _resolve_commit(self, mirror, branch_or_tag):
+        """
+        Resolves a branch, a tag or a commit to a commit SHA, the default branch is used if none is given.
+        :param mirror:
+        :param branch_or_tag:
+        :return:
+        """
+        from git.exc import GitCommandError
+
+        candidates = ['refs/heads/%s' % branch_or_tag, 'refs/tags/%s' % branch_or_tag, branch_or_tag] \
+            if branch_or_tag else ['HEAD']
+
+        for candidate in candidates:
+            try:
+                return mirror.git.rev_parse('--verify', '--quiet', '%s^{commit}' % candidate)
+            except GitCommandError:
+                continue
+
+        raise ValueError('"%s" is not a valid branch or tag.' % branch_or_tag)
+
+    def _get_worktree_commit(self, repo_path):
+        """
+        :param repo_path:
+        :return: the commit checked out in a worktree, or None if there is no worktree.
+        """
+        from git.repo.base import Repo
+
+        if not os.path.isfile(os.path.join(repo_path, '.git')):
+            return None
+
+        try:
+            return Repo(repo_path).head.commit.hexsha
+        except Exception:
+            return None
+
+    def _checkout_worktree(self, mirror, repo_path, commit, sparse_path=''):
+        """
+        Checks out a commit into a worktree of the mirror, creating the worktree if needed.
+        :param mirror:
+        :param repo_path:
+        :param commit:
+        :param sparse_path: if set, only this path is checked out.
+        :return:
+        """
+        from git.repo.base import Repo
+
+        # worktrees have a .git file pointing to the mirror, anything else is replaced.
+        if os.path.isfile(os.path.join(repo_path, '.git')):
+            try:
+                worktree = Repo(repo_path)
+                if os.path.realpath(worktree.common_dir) == os.path.realpath(mirror.git_dir):
+                    if worktree.head.commit.hexsha != commit:
+                        worktree.git.checkout('--force', '--detach', commit)
+                    return
+            except Exception:
+                pass
+
+        utils.rmdir(repo_path)
+        mirror.git.worktree('prune')
+
+        if not sparse_path:
+            mirror.git.worktree('add', '--force', '--detach', repo_path, commit)
+        else:
+            mirror.git.worktree('add', '--force', '--no-checkout', '--detach', repo_path, commit)
+            worktree = Repo(repo_path)
+            worktree.git.sparse_checkout('set', sparse_path)
+            worktree.git.checkout('--force', '--detach', commit)
+
+
+class TemplateCache(object):
+    """
+    A bounded LRU cache of compiled Jinja templates and their undeclared variables, keyed by template string.
+    """
+    _template_markers = ('{{', '{%', '{#')
+    _newline_re = re.compile(r'(\r\n|\r|\n)')
+
+    def __init__(self, environment, max_size=1024):
+        self._environment = environment
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.plain = 0
+
+    @classmethod
+    def is_template(cls, text):
+        return any(marker in text for marker in cls._template_markers)
+
+    def render_plain(self, text):
+        """
+        Renders a string without Jinja syntax as Jinja would: normalized newlines, without the trailing one.
+        :param text:
+        :return:
+        """
+        self.plain += 1
+        text = self._newline_re.sub('\n', text)
+        return text[:-1] if text.endswith('\n') else text
+
+    @staticmethod
+    def render(compiled, params):
+        """
+        Renders a compiled template with params as its context, params being any mapping, e.g. a scope, which is
+        not flattened into a new dict.
+        :param compiled:
+        :param params:
+        :return:
+        """
+        return _render_context(compiled, compiled.new_context(ChainMap(params, compiled.globals), shared=True))
+
+    def get(self, template, count=True):
+        """
+        :param template: the template string.
+        :param count: count a hit, False when looking up a template which was just rendered, which saves nothing.
+        :return: (compiled template, set of undeclared variable names)
+        """
+        with self._lock:
+            entry = self._entries.get(template, None)
+            if entry is not None:
+                self._entries.move_to_end(template)
+                if count:
+                    self.hits += 1
+                return entry
+
+        ast = self._environment.parse(template)
+        entry = (self._environment.from_string(ast), frozenset(meta.find_undeclared_variables(ast)))
+
+        with self._lock:
+            self.misses += 1
+            self._entries[template] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    @property
+    def hit_rate(self):
+        """
+        :return: the ratio of renders which did not compile a template.
+        """
+        total = self.hits + self.misses + self.plain
+        return float(self.hits + self.plain) / total if total else 0.0
+
 
 class UnityProjectLinkTemplate(object):
     """
@@ -145,13 +696,50 @@ class UnityProjectLinkTemplate(object):
     def pre_run(self, package_linker):
         utils.mkdir_p(package_linker.params['__plugins__'])
 
+    def reserved_folders(self, params):
+        """
+        :param params:
+        :return: the folders created outside of link operations, by pre_run or by Unity, which must not end up
+        in a linked source folder.
+        """
+        return [params['__plugins__'], os.path.join(params['__project__'], 'Library')]
+
+    def staging_folder(self, params):
+        """
+        :param params:
+        :return: the folder replaced as a whole by staged runs, Unity only imports what changes in Assets.
+        """
+        return params['__assets__']
+
+    def manifest_file(self, params):
+        return os.path.abspath(os.path.join(params['__project__'], '.upkit', 'manifest.json'))
+
 
 class PackageLinker(object):
-    def __init__(self, config_file=None, package_folder=None, link_template=None, params={}):
+    def __init__(self, config_file=None, package_folder=None, link_template=None, params={}, manifest_file=None,
+                 jobs=4, nuget_feed=None, lock_file=None, frozen=False, cache_folder=None, link_jobs=1,
+                 collapse=True, staged=False, link_mode='symlink', update_lock=False):
         """
         :param config_file: the config file
         :param package_folder: the folder where Nuget and other remote packages will be resolved to.
         :param params: command-line parameters.
+        :param manifest_file: the file recording created links between runs, defaults to the one given by the
+        link template if any.
+        :param jobs: the maximum number of remote sources resolved concurrently.
+        :param nuget_feed: a NuGet v3 flat-container URL or a local folder of .nupkg files, defaults to nuget.org.
+        :param lock_file: the file recording what remote sources resolved to, e.g. upkit.lock.
+        :param frozen: resolve remote sources strictly from the lock file and the package folder, without network
+        access.
+        :param cache_folder: the folder caching parsed config and linkspec files, and where linkspecs were found,
+        between runs, e.g. <project>/.upkit/cache, no cache if None.
+        :param link_jobs: the number of threads applying filesystem operations, see link_plan.execute.
+        :param collapse: link a target folder to its source folder, instead of linking each entry, when a content
+        link matches all the entries of the source and nothing else goes to the target, see link_plan.collapse.
+        :param staged: build the staging folder of the link template in a copy next to it, replacing it only once
+        linked, so a failed run leaves it as it was, see link_plan.execute_staged.
+        :param link_mode: how targets are linked unless a link sets its own mode, see materialize.materialize.
+        :param update_lock: resolve Git sources again instead of checking out the commits of the lock file, and
+        lock the new commits.
         """
 
         self._data_folder = os.path.abspath(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data'))
@@ -163,6 +751,7 @@ class PackageLinker(object):
         ]
 
         self._jinja_environment = Environment()
+        self.template_cache = TemplateCache(self._jinja_environment)
         self._params = {
             '__cwd__': os.path.abspath(os.getcwd()),
         }
@@ -172,49 +761,39 @@ class PackageLinker(object):
         else:
             self.package_folder = None
 
+        self.manifest_file = os.path.abspath(manifest_file) if manifest_file else None
+        self.jobs = jobs
+        self.link_jobs = link_jobs
+        self.collapse = collapse
+        self.staged = staged
+        self.link_mode = link_mode
+        self.nuget_feed = nuget_feed
+        self.lockfile = Lockfile.load(os.path.abspath(lock_file)) if lock_file else None
+        self.frozen = frozen
+        self.update_lock = update_lock
+        self.resolution_memo = ResolutionMemo()
+
+        # folders listed and files read while planning, changing them may change the plan.
+        self.dependencies = set()
+        self.render_cache = None
+        self.linkspec_index = LinkspecIndex()
+        if cache_folder:
+            cache_folder = os.path.abspath(cache_folder)
+            self.render_cache = RenderCache(cache_folder)
+            self.linkspec_index = LinkspecIndex.load(os.path.join(cache_folder, 'linkspec-index.json'))
+
+        self.config_file = os.path.abspath(config_file) if config_file else None
         if config_file:
             with open(config_file, 'r') as fh:
                 content = fh.read()
 
-                params.update({
-                    '__cwd__': os.path.abspath(os.getcwd()),
-                    '__dir__': os.path.abspath(os.path.dirname(config_file)),
-                })
-                self._params = copy.deepcopy(params)
-
-                jinja_support = True
-                if jinja_support:
-                    import jinja2
-
-                    template = Template(content)
-                    default_variables = set(
-                        name for name in dir(template.module)
-                        if not name.startswith('__') and getattr(template.module, name)
-                    )
-
-                    ast = self._jinja_environment.parse(content)
-                    undeclared_variables = meta.find_undeclared_variables(ast)
-                    second_pass_params = copy.deepcopy(params)
-
-                    for v in undeclared_variables:
-                        if v not in second_pass_params and v not in default_variables:
-                            second_pass_params[v] = '{{%s}}' % v
-
-                    @jinja2.contextfunction
-                    def __complete_internal__(context):
-                        self._params.update(context.vars)
-
-                        # Must return something.
-                        return ''
+                params = dict(params,
+                              __cwd__=os.path.abspath(os.getcwd()),
+                              __dir__=os.path.abspath(os.path.dirname(config_file)))
+                self._params = dict(params)
 
-                    content = '%s\n{{ __complete_internal__() }}' % content
-
-                    # Transform the content.
-                    content = Template(content).render(
-                        __complete_internal__=__complete_internal__, **second_pass_params
-                    )
-
-                config_data = yaml.load(content, Loader=yamlordereddictloader.Loader)
+                config_data, config_variables = self._load_config(content, params)
+                self._params.update(config_variables)
 
                 # parameters
                 params_data = config_data.get('params', {})
@@ -222,6 +801,8 @@ class PackageLinker(object):
 
                 if self._link_template:
                     self._link_template.expand_params(self._params)
+                    if not self.manifest_file:
+                        self.manifest_file = self._link_template.manifest_file(self._params)
 
                 # links
                 links_data = config_data.get('links', {})
@@ -232,6 +813,7 @@ class PackageLinker(object):
                         'target': i.get('target', None),
                         'content': i.get('content', None),
                         'exclude': i.get('exclude', None),
+                        'mode': i.get('mode', None),
                         'links': i.get('links', None),
                         'external_links': i.get('external_links', None),
                         # 'linkspec': package_linkspec,
@@ -274,15 +856,156 @@ class PackageLinker(object):
             #         self._links = [_to_link(item, packages_folder, os.path.abspath(destination))
             #                        for item in utils.guaranteed_list(packages_data['packages']['package'])]
 
-    def _try_resolve_source(self, source):
+    @tracing.traced('load config', 'config')
+    def _load_config(self, content, params):
+        """
+        Renders and parses a config file.
+        :param content: the config file content.
+        :param params:
+        :return: (config data, variables set by the config)
+        """
+        if self.render_cache:
+            cached = self.render_cache.get('config', content, params)
+            if cached is not None:
+                return cached
+
+        # Render once: variables unknown yet are kept as {{name}} for params to render later, and variables set by
+        # the config become params.
+        environment = Environment(undefined=_PlaceholderUndefined)
+        ast = environment.parse(content)
+        template = environment.from_string(ast)
+        context = template.new_context(params)
+        result = (_load_yaml(_render_context(template, context)), dict(context.vars))
+
+        if self.render_cache:
+            self.render_cache.set('config', content, params, meta.find_undeclared_variables(ast), result)
+        return result
+
+    def _resolve_source(self, source, params):
+        """
+        Resolves a source to a local path, remote sources are resolved once per run.
+        :param source: the source spec.
+        :param params:
+        :return:
+        """
+        source = self._render_template(source, params)
         resolver = self._get_source_resolver(source)
 
         if resolver:
-            normalized_source = source.strip()
-            return resolver.resolve(normalized_source), resolver
+            return resolver.resolve(source)
 
         # fallback to file resolver.
-        return utils.realpath(source), None
+        return os.path.abspath(source)
+
+    @tracing.traced('resolve', 'phase')
+    def resolve(self, jobs=None):
+        """
+        Resolves the remote sources of configured links, and of their child links, concurrently. As when planning,
+        only the linkspecs of configured links are read, child links are resolved but not scanned.
+        :param jobs: the maximum number of concurrent resolutions, defaults to self.jobs.
+        :return:
+        """
+        errors = []
+        pending = [(link, self._params, True) for link in self._links]
+
+        progress = reporting.get_reporter().progress('Resolving')
+        executor = ThreadPoolExecutor(max_workers=max(1, jobs or self.jobs))
+        try:
+            while pending:
+                futures = {}
+                scanned = []
+
+                for link, params, top_level in pending:
+                    source = link.get('source', None)
+                    if not source:
+                        scanned.append((link, params, top_level, None, None))
+                        continue
+
+                    try:
+                        source = self._render_template(source, params).strip()
+                    except ValueError:
+                        # reported when planning.
+                        continue
+
+                    resolver = self._get_source_resolver(source)
+                    if not resolver:
+                        scanned.append((link, params, top_level, os.path.abspath(source), None))
+                        continue
+
+                    key, sub_path = resolver.normalize(source)
+                    if key not in self.resolution_memo and key not in futures:
+                        futures[key] = source, executor.submit(
+                            self.resolution_memo.get, key, partial(resolver.fetch, key), ahead=True
+                        )
+                    else:
+                        self.resolution_memo.count_hit()
+
+                    scanned.append((link, params, top_level, sub_path, key))
+
+                for key, (source, future) in futures.items():
+                    try:
+                        future.result()
+                    except Exception as err:
+                        errors.append((source, err))
+                    progress.update()
+
+                pending = []
+                for link, params, top_level, source, key in scanned:
+                    # plan_link only reads the linkspecs of configured links, not of their child links.
+                    if not top_level:
+                        continue
+
+                    if key:
+                        try:
+                            source = os.path.join(self.resolution_memo.peek(key), source)
+                        except Exception:
+                            # reported once when fetched.
+                            continue
+
+                    pending.extend(self._find_nested_links(link, params, source))
+        finally:
+            executor.shutdown(wait=True)
+            progress.finish()
+
+        if errors:
+            raise ResolveError(errors)
+
+    def _find_nested_links(self, link, params, source):
+        """
+        Finds the child links of a link, as planning would see them.
+        :param link: the link spec.
+        :param params:
+        :param source: the local source of the link, if any.
+        :return: a list of (child link spec, child params, False).
+        """
+        params = _param_scope(params)
+        links = link.get('links', None)
+
+        if source:
+            if not os.path.isdir(source):
+                return []
+            params['__source__'] = source
+
+            if not any(link.get(k, None) for k in ('content', 'links', 'external_links', 'exclude')):
+                try:
+                    package_linkspec, linkspec_path = self.read_package_linkspec(
+                        source, params=_param_scope(params, __target__=link.get('target', None))
+                    )
+                except ValueError:
+                    return []
+
+                links = package_linkspec.get('links', None)
+                if linkspec_path:
+                    params['__dir__'] = os.path.dirname(linkspec_path)
+
+        target = link.get('target', None)
+        if target:
+            try:
+                params['__target__'] = os.path.abspath(self._render_template(target, params))
+            except ValueError:
+                pass
+
+        return [(item, params, False) for item in links or []]
 
     def _get_source_resolver(self, source):
         normalized_source = source.strip()
@@ -300,14 +1023,17 @@ class PackageLinker(object):
             if k not in exclude:
                 self._params[k] = self._render_template(item, self._params)
 
+    @tracing.traced('render', 'jinja')
     def _render_template(self, template, params={}):
         try:
-            ast = self._jinja_environment.parse(template)
-            variables = meta.find_undeclared_variables(ast)
+            if isinstance(template, str) and not TemplateCache.is_template(template):
+                return self.template_cache.render_plain(template)
+
+            compiled, variables = self.template_cache.get(template)
             for v in variables:
                 if v not in params:
                     raise ValueError('Unknown parameter "%s"' % v)
-            return Template(template).render(**params)
+            return self.template_cache.render(compiled, params)
         except TypeError as err:
             raise ValueError('Syntax error at "%s", error: %s' % (template, str(err)))
         except TemplateSyntaxError as err:
@@ -322,22 +1048,97 @@ class PackageLinker(object):
     links = property(get_links)
     params = property(get_params)
 
-    def run(self):
+    @tracing.traced('plan', 'phase')
+    def plan(self):
+        """
+        Computes the operations needed to link all configured links, without changing the target tree.
+        Remote sources are resolved while planning.
+        :return: an ordered list of LinkOperation.
+        """
+        self.resolve()
+
+        operations = []
+        for link in self._links:
+            operations.extend(self.plan_config_link(link))
+        return self.collapse_links(operations)
+
+    def collapse_links(self, operations):
+        """
+        Collapses the links to all the entries of content link folders, if enabled, see link_plan.collapse.
+        :param operations: the operations of all configured links.
+        :return: a list of LinkOperation.
+        """
+        if not self.collapse:
+            return operations
+
+        reserved = []
+        if self._link_template and hasattr(self._link_template, 'reserved_folders'):
+            reserved = self._link_template.reserved_folders(self._params)
+        return link_plan.collapse(operations, reserved=reserved)
+
+    def plan_config_link(self, link):
+        """
+        Computes the operations of one of the configured links. Remote sources are resolved if needed.
+        :param link: an item of links.
+        :return: an ordered list of LinkOperation.
+        """
+        return self.plan_link(source=link['source'],
+                              target=link['target'],
+                              content=link['content'],
+                              exclude=link['exclude'],
+                              links=link['links'],
+                              mode=link.get('mode', None),
+                              set_dir=('__dir__' in self._params),
+                              params=self._params)
+
+    @tracing.traced('run', 'phase')
+    def run(self, incremental=True):
+        """
+        Links all configured links.
+        :param incremental: when a manifest file is set, only change links which differ from the previous run.
+        :return:
+        """
+        self.apply(self.plan(), incremental=incremental)
+
+    @tracing.traced('apply', 'phase')
+    def apply(self, operations, incremental=True):
+        """
+        Applies planned operations to the target tree.
+        :param operations: the operations of all configured links.
+        :param incremental: when a manifest file is set, only change links which differ from the previous run.
+        :return:
+        """
         if self._link_template:
             self._link_template.pre_run(self)
 
-        for link in self._links:
-            self.link(source=link['source'],
-                      target=link['target'],
-                      content=link['content'],
-                      exclude=link['exclude'],
-                      links=link['links'],
-                      forced=True,
-                      set_dir=('__dir__' in self._params),
-                      params=self._params)
+        manifest = None
+        if self.manifest_file:
+            manifest = LinkManifest.load(self.manifest_file)
+            if not incremental:
+                manifest.invalidate()
+
+        if self.staged:
+            if not self._link_template:
+                raise ValueError('Staged linking requires a link template.')
+            created, unchanged, removed = link_plan.execute_staged(
+                operations, self._link_template.staging_folder(self._params), forced=True, manifest=manifest,
+                jobs=self.link_jobs)
+        else:
+            created, unchanged, removed = link_plan.execute(operations, forced=True, manifest=manifest,
+                                                            jobs=self.link_jobs)
+        reporting.get_reporter().message(
+            'Links: %d created, %d unchanged, %d removed.' % (created, unchanged, removed))
+
+        if self.lockfile and not self.frozen:
+            self.lockfile.save()
+
+        if self.render_cache:
+            self.linkspec_index.save()
+            self.render_cache.prune()
 
+    @tracing.traced('link', 'phase')
     def link(self, source=None, target=None, content=None, exclude=None, links=None, external_links=None,
-             forced=False, set_dir=True, params={}):
+             forced=False, set_dir=True, params={}, mode=None):
         """
         Link a source folder to a sub-folder in destination folder using given name.
         :param source:
@@ -345,8 +1146,25 @@ class PackageLinker(object):
         :param forced:
         :param set_dir:
         :param params:
+        :param mode: see plan_link.
         :return:
         """
+        operations = self.plan_link(source=source, target=target, content=content, exclude=exclude, links=links,
+                                    external_links=external_links, set_dir=set_dir, params=params, mode=mode)
+        link_plan.execute(self.collapse_links(operations), forced=forced, jobs=self.link_jobs)
+
+    def plan_link(self, source=None, target=None, content=None, exclude=None, links=None, external_links=None,
+                  set_dir=True, params={}, mode=None):
+        """
+        Computes the operations to link a source folder to a sub-folder in destination folder.
+        :param source:
+        :param target:
+        :param set_dir:
+        :param params:
+        :param mode: how targets are linked, see materialize.materialize, defaults to link_mode. Sub-links may
+        set their own.
+        :return: an ordered list of LinkOperation.
+        """
 
         # Priority: links > content > source
         if not source and not links:
@@ -354,25 +1172,49 @@ class PackageLinker(object):
                 'Either "source" or "links" must be defined.'
             )
 
+        operations = []
+        origin = source
         linkspec_path = None
         package_linkspec = {}
-
-        # make a copy of the dict
-        params = copy.deepcopy(params)
+        operation_linkspec = None
+        mode = mode or self.link_mode
+
+        def _add(kind, item_source, item_target, folder=None, item_mode=None):
+            item_mode = (item_mode or mode) if kind == LinkOperation.LINK else None
+            # rejected before anything is linked.
+            if item_mode is not None and item_mode not in materialize.MODES:
+                location = operation_linkspec or self.config_file
+                raise ValueError('Unknown link mode "%s"%s, expected one of %s.' % (
+                    item_mode, ' in "%s"' % location if location else '', ', '.join(materialize.MODES)))
+
+            operations.append(LinkOperation(kind, item_source, item_target,
+                                            link=origin, linkspec=operation_linkspec, folder=folder,
+                                            mode=item_mode))
+
+        def _add_content(item_source, item_target, item_content, item_exclude, item_mode=None):
+            # links matching every entry of the source folder may be collapsed into a single link, see collapse.
+            item_content = [self._render_template(i, params) for i in item_content]
+            folder = None
+            if not item_exclude and item_content == ['*']:
+                folder = (os.path.abspath(item_source), item_target)
+
+            for kind, content_item, content_item_path in self._match_content(item_source, item_content,
+                                                                             item_exclude, params):
+                _add(kind, content_item, os.path.abspath(os.path.join(item_target, content_item_path)), folder,
+                     item_mode)
+
+        # values set below only apply to this link.
+        params = _param_scope(params)
 
         if source:
-            resolver = self._get_source_resolver(source)
-            if not resolver:
-                source = os.path.abspath(self._render_template(source, params))
-            else:
-                source = resolver.resolve(source)
+            source = self._resolve_source(source, params)
 
             if not os.path.isdir(source):
                 raise ValueError('Source path "%s" not found.' % source)
 
             # Try to resolve package linkspec.
             package_linkspec, linkspec_path = self.read_package_linkspec(
-                source, params=dict(__source__=source, __target__=target, **params)
+                source, params=_param_scope(params, __source__=source, __target__=target)
             )
 
             params['__source__'] = source
@@ -386,6 +1228,7 @@ class PackageLinker(object):
                 exclude = package_linkspec.get('exclude', exclude)
                 external_links = package_linkspec.get('external_links', external_links)
                 target = package_linkspec.get('target', target)
+                operation_linkspec = linkspec_path
 
         if target:
             target = os.path.abspath(self._render_template(target, params))
@@ -398,24 +1241,9 @@ class PackageLinker(object):
                 raise ValueError('"target" is undefined but no links can be found in the linkspec.')
 
             if not content:
-                utils.fs_link(source, target, hard_link=True, forced=forced)
+                _add(LinkOperation.LINK, source, target)
             else:
-                exclude_items = set(
-                    p for item in exclude
-                    for p in glob.glob(os.path.abspath(os.path.join(source, self._render_template(item, params))))
-                ) if exclude else set()
-
-                content_items = [
-                    p for item in content
-                    for p in glob.glob(os.path.abspath(os.path.join(source, self._render_template(item, params))))
-                ]
-                for content_item in content_items:
-                    if content_item in exclude_items:
-                        continue
-
-                    content_item_name = os.path.basename(content_item)
-                    content_item_target = os.path.abspath(os.path.join(target, content_item_name))
-                    utils.fs_link(content_item, content_item_target, hard_link=True, forced=forced)
+                _add_content(source, target, content, exclude)
         else:
             for item in child_packages:
                 item_target_spec = item.get('target', None)
@@ -427,34 +1255,15 @@ class PackageLinker(object):
                 if not item_source_spec:
                     raise ValueError('"source" is required.')
 
-                item_source = os.path.abspath(self._render_template(item_source_spec, params))
+                item_source = self._resolve_source(item_source_spec, params)
 
                 content = item.get('content', None)
 
                 # content will overwrite the source
                 if not content:
-                    utils.fs_link(item_source, item_target, hard_link=True, forced=forced)
+                    _add(LinkOperation.LINK, item_source, item_target, item_mode=item.get('mode', None))
                 else:
-                    exclude = item.get('exclude', None)
-                    exclude_items = set(
-                        p for i in exclude
-                        for p in glob.glob(os.path.abspath(
-                            os.path.join(item_source, self._render_template(i, params)))
-                        )
-                    ) if exclude else set()
-
-                    content_items = [
-                        p for i in content for p in
-                        glob.glob(os.path.abspath(os.path.join(item_source, self._render_template(i, params))))
-                    ]
-
-                    for content_item in content_items:
-                        if content_item in exclude_items:
-                            continue
-
-                        content_item_name = os.path.basename(content_item)
-                        content_item_target = os.path.abspath(os.path.join(item_target, content_item_name))
-                        utils.fs_link(content_item, content_item_target, hard_link=True, forced=forced)
+                    _add_content(item_source, item_target, content, item.get('exclude', None), item.get('mode', None))
 
         # external packages
         external_packages = external_links
@@ -462,7 +1271,7 @@ class PackageLinker(object):
             for item in external_packages:
                 item_source = os.path.abspath(self._render_template(item['source'], params))
                 item_target = os.path.abspath(self._render_template(item['target'], params))
-                utils.fs_link(item_source, item_target, hard_link=True, forced=forced)
+                _add(LinkOperation.LINK, item_source, item_target)
 
                 default_content = item.get('default_content', None)
                 if default_content:
@@ -473,8 +1282,36 @@ class PackageLinker(object):
                     for content_item in content_items:
                         content_item_name = os.path.basename(content_item)
                         content_item_target = os.path.abspath(os.path.join(item_target, content_item_name))
-                        if not os.path.exists(content_item_target):
-                            utils.copy(content_item, content_item_target)
+                        _add(LinkOperation.COPY, content_item, content_item_target)
+
+        return operations
+
+    def _match_content(self, source, content, exclude, params):
+        """
+        Matches the content and exclude patterns of a link in its source folder.
+        :param source: the source folder.
+        :param content: a list of rendered glob patterns relative to source.
+        :param exclude: a list of exclude patterns relative to source, see ExcludeRules, or None.
+        :param params:
+        :return: an iterator over (LinkOperation.LINK or LinkOperation.MKDIR, path, path relative to the target).
+        """
+        def _pattern(item):
+            return os.path.abspath(os.path.join(source, item))
+
+        def _exclude_pattern(item):
+            item = self._render_template(item, params)
+            return '!' + _pattern(item[1:]) if item.startswith('!') else _pattern(item)
+
+        exclude_patterns = [_exclude_pattern(item) for item in exclude or []]
+        content_patterns = [_pattern(item) for item in content]
+
+        matcher = ContentMatcher(content_patterns, exclude_patterns)
+        with tracing.span('match content', 'glob', source=source):
+            for item in matcher.walk():
+                yield item
+
+        self.dependencies.add(os.path.abspath(source))
+        self.dependencies.update(matcher.listed_folders)
 
     def read_package_linkspec(self, source, params={}):
         """
@@ -487,37 +1324,39 @@ class PackageLinker(object):
         linkspec = {} if not linkspec else linkspec
         return linkspec, path
 
+    @tracing.traced('read linkspec', 'linkspec', lambda self, source, params={}: {'source': source})
     def _read_linkspec_yaml_file(self, source, params={}):
-        file = os.path.join(source, 'linkspec.yaml')
-        if not os.path.isfile(file):
-            file = os.path.join(source, 'linkspec.yml')
-
-        if not os.path.isfile(file):
-            file = os.path.join(source, 'content', 'linkspec.yaml')
-
-        if not os.path.isfile(file):
-            file = os.path.join(source, 'content', 'linkspec.yml')
+        source = os.path.abspath(source)
+        self.dependencies.update([source, os.path.join(source, LinkspecIndex.content_folder_name)])
 
-        if not os.path.isfile(file):
+        file = self.linkspec_index.find(source)
+        if not file:
             return None, None
+        self.dependencies.add(file)
 
         with open(file, 'r') as fh:
             content = fh.read()
 
-            jinja_support = True
-            if jinja_support:
-                params.update({
-                    '__dir__': os.path.dirname(file),
-                })
-                content = self._render_template(content, params)
+        params = _param_scope(params, __dir__=os.path.dirname(file))
+        if self.render_cache:
+            linkspec = self.render_cache.get('linkspec', content, params)
+            if linkspec is not None:
+                return linkspec, file
 
-            return yaml.load(content, Loader=yamlordereddictloader.Loader), file
+        linkspec = _load_yaml(self._render_template(content, params))
+
+        if self.render_cache:
+            variables = self.template_cache.get(content, count=False)[1] if TemplateCache.is_template(content) else ()
+            self.render_cache.set('linkspec', content, params, variables, linkspec)
+        return linkspec, file
 
     def _read_package_linkspec_file(self, source):
         file = os.path.join(source, 'package.linkspec')
         if not os.path.isfile(file):
             return None
 
+        import xmltodict
+
         with open(file, 'r') as fh:
             content = fh.read()
             data = xmltodict.parse(content)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from upkit import utils
+
+
+class RenderCache(object):
+    """
+    Caches the parsed result of rendered config and linkspec files on disk, e.g. in <project>/.upkit/cache, so
+    that unchanged files load without Jinja and YAML.
+
+    An entry is keyed by the file kind and content, and holds the names of the params the file references and a
+    result per set of values of these params. Changing the file or a referenced param is a cache miss.
+    """
+    version = 1
+    file_extension = '.pickle'
+
+    def __init__(self, folder, max_size=32 * 1024 * 1024, max_variants=8):
+        """
+        :param folder: the cache folder.
+        :param max_size: the size in bytes above which least recently used entries are removed by prune().
+        :param max_variants: the maximum number of results kept per file content.
+        """
+        self.folder = folder
+        self.max_size = max_size
+        self.max_variants = max_variants
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry_key(self, kind, content):
+        digest = hashlib.sha256(('%s:%d:%s' % (kind, self.version, content)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_file(self, entry_key):
+        return os.path.join(self.folder, entry_key + self.file_extension)
+
+    @staticmethod
+    def _params_key(variables, params):
+        values = tuple((v, repr(params[v])) if v in params else (v,) for v in variables)
+        return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()
+
+    def _load_entry(self, entry_key):
+        entry = self._entries.get(entry_key, None)
+        if entry is not None:
+            return entry
+
+        entry = None
+        try:
+            with open(self._entry_file(entry_key), 'rb') as fh:
+                entry = pickle.load(fh)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+            pass
+
+        if not isinstance(entry, dict) or entry.get('version') != self.version:
+            entry = None
+
+        self._entries[entry_key] = entry
+        return entry
+
+    def get(self, kind, content, params):
+        """
+        Gets the result cached for a file rendered with given params.
+        :param kind: the kind of file, files of different kinds are rendered differently.
+        :param content: the file content.
+        :param params: the params the file would be rendered with.
+        :return: the result or None.
+        """
+        entry_key = self._entry_key(kind, content)
+        with self._lock:
+            entry = self._load_entry(entry_key)
+            data = None
+            if entry is not None:
+                data = entry['results'].get(self._params_key(entry['variables'], params), None)
+
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # mark the entry recently used.
+        try:
+            os.utime(self._entry_file(entry_key), None)
+        except OSError:
+            pass
+
+        return pickle.loads(data)
+
+    def set(self, kind, content, params, variables, result):
+        """
+        Caches the result of a file rendered with given params.
+        :param kind:
+        :param content:
+        :param params:
+        :param variables: the names of the params the file references.
+        :param result: a picklable result, other results are not cached.
+        :return:
+        """
+        try:
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+
+        entry_key = self._entry_key(kind, content)
+        variables = tuple(sorted(variables))
+
+        with self._lock:
+            entry = self._load_entry(entry_key)
+            if entry is None or entry['variables'] != variables:
+                entry = {'version': self.version, 'variables': variables, 'results': OrderedDict()}
+
+            results = entry['results']
+            results[self._params_key(variables, params)] = data
+            while len(results) > self.max_variants:
+                results.popitem(last=False)
+            self._entries[entry_key] = entry
+
+            utils.mkdir_p(self.folder)
+            path = self._entry_file(entry_key)
+            temp_path = '%s.tmp-%d-%d' % (path, os.getpid(), threading.current_thread().ident)
+            with open(temp_path, 'wb') as fh:
+                pickle.dump(entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+
+    def prune(self):
+        """
+        Removes least recently used entries until the cache is smaller than max_size.
+        :return: the number of removed entries.
+        """
+        try:
+            files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.folder)
+                     if e.is_file() and e.name.endswith(self.file_extension)]
+        except OSError:
+            return 0
+
+        size = sum(f[1] for f in files)
+        removed = 0
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            utils.remove(path)
+            size -= file_size
+            removed += 1
+
+        if removed:
+            with self._lock:
+                self._entries.clear()
+        return removed
@@ -0,0 +1,197 @@
+import json
+import sys
+import threading
+import time
+
+QUIET = 0
+NORMAL = 1
+VERBOSE = 2
+
+
+class Progress(object):
+    """
+    Counts the items of a long operation, e.g. links created, and shows the count at a bounded rate.
+    """
+
+    def __init__(self, reporter, name, total=None):
+        """
+        :param reporter:
+        :param name: what is counted, e.g. Linking.
+        :param total: the expected count, or None if unknown.
+        """
+        self.reporter = reporter
+        self.name = name
+        self.total = total
+        self.count = 0
+        self._shown = time.monotonic()
+
+    def update(self, count=1):
+        self.count += count
+        now = time.monotonic()
+        if now - self._shown >= self.reporter.interval:
+            self._shown = now
+            self.reporter.show_progress(self)
+
+    def finish(self):
+        self.reporter.finish_progress(self)
+
+
+class Reporter(object):
+    """
+    Reports what a run does as text: messages and events up to a level, and progress counters, which are only
+    shown on terminals. Output is flushed at most every interval seconds, except for messages and errors.
+    """
+    formats = {
+        'fetch': 'Fetch "%(source)s".',
+        'link': 'Create filesystem link: "%(source)s" -> "%(target)s"',
+        'unlink': 'Remove stale link: "%(target)s"',
+        'cache': 'Cache of %(cache)s: %(hits)d hit(s), %(misses)d miss(es), hit rate %(hit_rate).2f.',
+    }
+
+    def __init__(self, level=NORMAL, stream=None, interval=0.1):
+        """
+        :param level: QUIET, NORMAL or VERBOSE.
+        :param stream: defaults to sys.stdout at the time of writing.
+        :param interval: the minimum time in seconds between progress updates and between flushes.
+        """
+        self.level = level
+        self.interval = interval
+        self._stream = stream
+        self._lock = threading.RLock()
+        self._flushed = time.monotonic()
+        self._progress_shown = False
+
+    @property
+    def stream(self):
+        return self._stream or sys.stdout
+
+    def is_enabled(self, level):
+        return level <= self.level
+
+    def message(self, text, level=NORMAL):
+        if level <= self.level:
+            self._write(text, flush=True)
+
+    def error(self, text):
+        """
+        Reports an error, at any level.
+        :param text:
+        :return:
+        """
+        self._write(text, flush=True)
+
+    def event(self, kind, level=VERBOSE, **details):
+        """
+        Reports an event, e.g. a link created.
+        :param kind: a key of formats.
+        :param level:
+        :param details: the values formatted in the event text.
+        :return:
+        """
+        if level <= self.level:
+            self._write(self.formats[kind] % details)
+
+    def timings(self, tracer):
+        """
+        Reports the timings of a traced run.
+        :param tracer: a tracing.Tracer.
+        :return:
+        """
+        with self._lock:
+            self._clear_progress()
+            tracer.print_timings(self.stream)
+            self.flush()
+
+    def progress(self, name, total=None):
+        """
+        :param name:
+        :param total:
+        :return: a new Progress.
+        """
+        return Progress(self, name, total)
+
+    def show_progress(self, progress):
+        if self.level < NORMAL or not self.stream.isatty():
+            return
+
+        with self._lock:
+            text = '%s: %d' % (progress.name, progress.count)
+            if progress.total is not None:
+                text = '%s/%d' % (text, progress.total)
+            self.stream.write('\r\x1b[K%s' % text)
+            self._progress_shown = True
+            self.flush()
+
+    def finish_progress(self, progress):
+        with self._lock:
+            self._clear_progress()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self.stream.flush()
+            self._flushed = time.monotonic()
+
+    def _clear_progress(self):
+        if self._progress_shown:
+            self.stream.write('\r\x1b[K')
+            self._progress_shown = False
+
+    def _write(self, text, flush=False):
+        with self._lock:
+            self._clear_progress()
+            self.stream.write(text + '\n')
+            if flush or time.monotonic() - self._flushed >= self.interval:
+                self.flush()
+
+
+class JsonReporter(Reporter):
+    """
+    Reports what a run does as a stream of JSON objects, one per line, each with an "event" name.
+    """
+
+    def message(self, text, level=NORMAL):
+        if level <= self.level:
+            self._emit({'event': 'message', 'text': text}, flush=True)
+
+    def error(self, text):
+        self._emit({'event': 'error', 'text': text}, flush=True)
+
+    def event(self, kind, level=VERBOSE, **details):
+        if level <= self.level:
+            self._emit(dict(details, event=kind))
+
+    def timings(self, tracer):
+        spans = [{'name': name, 'category': category, 'calls': calls, 'seconds': total}
+                 for name, category, calls, total in tracer.timings()]
+        self._emit({'event': 'timings', 'spans': spans}, flush=True)
+
+    def show_progress(self, progress):
+        if self.level >= NORMAL:
+            self._emit({'event': 'progress', 'name': progress.name, 'count': progress.count,
+                        'total': progress.total})
+
+    def finish_progress(self, progress):
+        self.show_progress(progress)
+        self.flush()
+
+    def _emit(self, data, flush=False):
+        self._write(json.dumps(data, sort_keys=True), flush=flush)
+
+
+# the reporter of the current run.
+_reporter = Reporter()
+
+
+def get_reporter():
+    return _reporter
+
+
+def set_reporter(reporter):
+    """
+    :param reporter: the reporter of the next runs.
+    :return: the previous reporter.
+    """
+    global _reporter
+    previous, _reporter = _reporter, reporter
+    return previous
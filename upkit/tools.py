@@ -4,8 +4,6 @@ import shutil
 import sys
 import traceback
 
-from jinja2 import Environment, PackageLoader, select_autoescape, Template
-
 from upkit import utils
 
 
@@ -13,6 +11,21 @@ class LinkPackageCommand(object):
     help = 'Link packages with given configs'
 
     def build_argument_parser(self, parser):
+        self.add_linker_arguments(parser)
+
+        parser.add_argument('--dry-run', dest='dry_run', action='store_const', const=True,
+                            help='Print the planned link operations as JSON without linking.')
+
+        parser.add_argument('--full', dest='full', action='store_const', const=True,
+                            help='Relink every target, instead of only those changed since the previous link.')
+
+        parser.add_argument('--timings', dest='timings', action='store_const', const=True,
+                            help='Print the time spent in each phase of the link.')
+
+        parser.add_argument('--trace', dest='trace', default=None,
+                            help='Write a Chrome trace JSON file of the link, e.g. for chrome://tracing.')
+
+    def add_linker_arguments(self, parser):
         parser.add_argument(dest='config', default='upkit.yaml', nargs='?',
                             help='Path to link configuration file (config.yaml)')
 
@@ -22,25 +35,166 @@ class LinkPackageCommand(object):
         parser.add_argument('-p', dest='params', action='append',
                             help='Parameters.')
 
-    def run(self, args):
+        parser.add_argument('--nuget-feed', dest='nuget_feed', default=None,
+                            help='NuGet v3 flat-container URL or local folder of .nupkg files, '
+                                 'default to nuget.org.')
+
+        parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=4,
+                            help='Maximum number of remote packages resolved concurrently.')
+
+        parser.add_argument('--link-jobs', dest='link_jobs', type=int, default=1,
+                            help='Number of threads creating links, e.g. 8 on network or overlay filesystems.')
+
+        parser.add_argument('--no-collapse', dest='no_collapse', action='store_const', const=True,
+                            help='Link each entry matched by `content: [\'*\']`, instead of linking the whole folder '
+                                 'when nothing else goes to it.')
+
+        parser.add_argument('--link-mode', dest='link_mode', default='symlink',
+                            choices=['symlink', 'hardlink', 'reflink', 'copy', 'auto'],
+                            help='Link targets with symbolic links, or create them as real folders of hard links, '
+                                 'copy-on-write clones or copies, auto picks the cheapest working one.')
+
+        parser.add_argument('--staged', dest='staged', action='store_const', const=True,
+                            help='Link Assets into a staging copy next to it, then swap it in, so a link failing '
+                                 'in Assets leaves the project as it was.')
+
+        parser.add_argument('--frozen', '--offline', dest='frozen', action='store_const', const=True,
+                            help='Link remote packages strictly from upkit.lock and the package folder, '
+                                 'without network access.')
+
+        parser.add_argument('--update-lock', dest='update_lock', action='store_const', const=True,
+                            help='Resolve Git sources to their latest commits instead of the ones in upkit.lock, '
+                                 'and lock them.')
+
+        parser.add_argument('--no-cache', dest='no_cache', action='store_const', const=True,
+                            help='Render and parse config and linkspec files without the cache in .upkit/cache.')
+
+        verbosity = parser.add_mutually_exclusive_group()
+        verbosity.add_argument('-q', '--quiet', dest='quiet', action='store_const', const=True,
+                               help='Only report errors.')
+        verbosity.add_argument('-v', '--verbose', dest='verbose', action='store_const', const=True,
+                               help='Report each link created or removed, and each remote package fetched.')
+
+        parser.add_argument('--output', dest='output', choices=['text', 'json'], default='text',
+                            help='Report as text, or as a stream of JSON events, one per line.')
+
+    def create_reporter(self, args, stream=None):
+        from upkit import reporting
+
+        level = reporting.NORMAL
+        if getattr(args, 'quiet', False):
+            level = reporting.QUIET
+        elif getattr(args, 'verbose', False):
+            level = reporting.VERBOSE
+
+        if getattr(args, 'output', 'text') == 'json':
+            return reporting.JsonReporter(level=level, stream=stream)
+        return reporting.Reporter(level=level, stream=stream)
+
+    def create_linker(self, args):
         from upkit.package_linker import PackageLinker, UnityProjectLinkTemplate
 
+        params = dict((k, v) for (k, v) in [i.split('=') for i in utils.guaranteed_list(args.params)])
+
+        package_folder = args.package_folder
+        if not package_folder:
+            package_folder = os.path.join(os.path.dirname(args.config), '.packages')
+
+        link_template = UnityProjectLinkTemplate()
+
+        cache_folder = None
+        if not getattr(args, 'no_cache', False):
+            cache_folder = os.path.join(os.path.dirname(args.config), '.upkit', 'cache')
+
+        return PackageLinker(config_file=args.config, package_folder=package_folder,
+                             link_template=link_template, params=params,
+                             jobs=getattr(args, 'jobs', None) or 4,
+                             nuget_feed=getattr(args, 'nuget_feed', None),
+                             lock_file=os.path.join(os.path.dirname(args.config), 'upkit.lock'),
+                             frozen=getattr(args, 'frozen', False),
+                             update_lock=getattr(args, 'update_lock', False),
+                             cache_folder=cache_folder,
+                             link_jobs=getattr(args, 'link_jobs', None) or 1,
+                             collapse=not getattr(args, 'no_collapse', False),
+                             staged=getattr(args, 'staged', False),
+                             link_mode=getattr(args, 'link_mode', None) or 'symlink')
+
+    def run(self, args):
+        from upkit import link_plan, reporting, tracing
+
+        dry_run = getattr(args, 'dry_run', False)
+        timings = getattr(args, 'timings', False)
+        trace = getattr(args, 'trace', None)
+        if timings or trace:
+            tracing.enable()
+
+        # a dry run writes the plan to stdout.
+        reporter = self.create_reporter(args, stream=sys.stderr if dry_run else None)
+        previous_reporter = reporting.set_reporter(reporter)
         try:
-            params = dict((k, v) for (k, v) in [i.split('=') for i in utils.guaranteed_list(args.params)])
+            linker = self.create_linker(args)
+
+            if dry_run:
+                link_plan.dump(linker.plan(), sys.stdout)
+                return
 
-            if not args.package_folder:
-                args.package_folder = os.path.join(os.path.dirname(args.config), '.packages')
+            linker.run(incremental=not getattr(args, 'full', False))
 
-            link_template = UnityProjectLinkTemplate()
+            memo = linker.resolution_memo
+            if memo.misses or memo.hits:
+                reporter.message('Remote packages: %d fetched, %d cache hit(s).' % (memo.misses, memo.hits))
 
-            linker = PackageLinker(config_file=args.config, package_folder=args.package_folder,
-                                   link_template=link_template, params=params)
-            linker.run()
-            print('Package link completed.')
+            # plain strings are rendered without compiling, as hits.
+            templates = linker.template_cache
+            if templates.hits or templates.misses or templates.plain:
+                reporter.event('cache', level=reporting.NORMAL, cache='templates',
+                               hits=templates.hits + templates.plain, misses=templates.misses,
+                               hit_rate=templates.hit_rate)
+            reporter.message('Package link completed.')
         except:
-            print('Package link failed with errors.')
-            print(traceback.format_exc())
+            reporter.error('Package link failed with errors.')
+            reporter.error(traceback.format_exc())
             sys.exit(1)
+        finally:
+            tracer = tracing.disable()
+            if tracer and trace:
+                tracer.save(trace)
+                reporter.message('Trace written to "%s".' % trace)
+            if tracer and timings:
+                reporter.timings(tracer)
+            reporting.set_reporter(previous_reporter)
+
+
+class WatchPackageCommand(LinkPackageCommand):
+    help = 'Link packages with given configs, then relink them on changes'
+
+    def build_argument_parser(self, parser):
+        self.add_linker_arguments(parser)
+
+        parser.add_argument('--poll', dest='poll', action='store_const', const=True,
+                            help='Poll for changes every second, instead of using inotify on Linux.')
+
+        parser.add_argument('--debounce', dest='debounce', type=float, default=0.2,
+                            help='Seconds without changes to wait for before relinking.')
+
+    def run(self, args):
+        from upkit import reporting
+        from upkit.watcher import LinkWatcher, create_watcher
+
+        reporter = self.create_reporter(args)
+        previous_reporter = reporting.set_reporter(reporter)
+
+        watcher = LinkWatcher(lambda: self.create_linker(args), args.config,
+                              watcher=create_watcher(polling=getattr(args, 'poll', False)),
+                              debounce=getattr(args, 'debounce', 0.2))
+        reporter.message('Watching "%s", press Ctrl+C to stop.' % os.path.abspath(args.config))
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            reporting.set_reporter(previous_reporter)
 
 
 class CreatePackageCommand(object):
@@ -48,10 +202,19 @@ class CreatePackageCommand(object):
 
     def __init__(self):
         # self.data_folder = os.path.abspath(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data'))
-        self.env = Environment(
-            loader=PackageLoader('upkit', 'data/create-package'),
-            autoescape=select_autoescape(['html', 'xml', 'nuspec'])
-        )
+        self._env = None
+
+    @property
+    def env(self):
+        # created on first use, so that other commands do not import jinja2.
+        if self._env is None:
+            from jinja2 import Environment, PackageLoader, select_autoescape
+
+            self._env = Environment(
+                loader=PackageLoader('upkit', 'data/create-package'),
+                autoescape=select_autoescape(['html', 'xml', 'nuspec'])
+            )
+        return self._env
 
     def build_argument_parser(self, parser):
         parser.add_argument('location', help='Package location')
@@ -118,6 +281,7 @@ class UnityTools(object):
     def __init__(self):
         self._commands = {
             'link': LinkPackageCommand(),
+            'watch': WatchPackageCommand(),
             'create-package': CreatePackageCommand(),
         }
 
@@ -0,0 +1,171 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# the enabled Tracer, spans cost a single check while it is None.
+_tracer = None
+
+
+class Tracer(object):
+    """
+    Records spans, timed sections of a run, as Chrome trace events (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self):
+        self.events = []
+        self._started = time.perf_counter()
+        self._pid = os.getpid()
+
+    def add(self, name, category, started, ended, args=None):
+        """
+        Records a span, spans can be recorded from any thread.
+        :param name:
+        :param category: e.g. resolver, linkspec or fs.
+        :param started: the time.perf_counter() at the start of the span.
+        :param ended: the time.perf_counter() at the end of the span.
+        :param args: a dict of details shown with the span, or None.
+        :return:
+        """
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (started - self._started) * 1e6,
+            'dur': (ended - started) * 1e6,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def timings(self):
+        """
+        :return: a list of (name, category, calls, total seconds), in order of first call.
+        """
+        totals = OrderedDict()
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            key = (event['name'], event['cat'])
+            calls, total = totals.get(key, (0, 0.0))
+            totals[key] = (calls + 1, total + event['dur'] / 1e6)
+        return [key + value for key, value in totals.items()]
+
+    def print_timings(self, stream=None):
+        """
+        Prints the calls and total time of each span name. Spans include the spans nested in them, and concurrent
+        spans, e.g. of resolvers, may add up to more than the wall time.
+        :param stream: defaults to sys.stdout.
+        :return:
+        """
+        stream = stream or sys.stdout
+        stream.write('%-10s %-24s %8s %10s\n' % ('Category', 'Span', 'Calls', 'Total'))
+        for name, category, calls, total in self.timings():
+            stream.write('%-10s %-24s %8d %9.3fs\n' % (category, name, calls, total))
+
+    def save(self, path):
+        """
+        Writes the trace as a Chrome trace JSON file.
+        :param path:
+        :return:
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with open(path, 'w') as fh:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, fh)
+
+
+class _Span(object):
+    __slots__ = ('_tracer', '_name', '_category', '_args', '_started')
+
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._tracer.add(self._name, self._category, self._started, time.perf_counter(), self._args)
+        return False
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def enable():
+    """
+    Starts recording spans.
+    :return: the new Tracer.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable():
+    """
+    Stops recording spans.
+    :return: the Tracer which recorded them, or None if tracing was not enabled.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def span(name, category, **args):
+    """
+    Times a section of code when tracing is enabled, e.g. `with tracing.span('copy', 'fs', path=path):`.
+    :param name:
+    :param category:
+    :param args: details shown with the span.
+    :return: a context manager.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _null_span
+    return _Span(tracer, name, category, args)
+
+
+def traced(name, category, describe=None):
+    """
+    Decorates a function to record a span per call when tracing is enabled.
+    :param name:
+    :param category:
+    :param describe: a function taking the call arguments and returning the span details, only called when
+    tracing is enabled.
+    :return:
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return function(*args, **kwargs)
+
+            with _Span(tracer, name, category, describe(*args, **kwargs) if describe else None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,9 +1,12 @@
 import errno
 import os
 import shutil
+import stat
 from subprocess import call
 from sys import platform
 
+from upkit import tracing
+
 
 def guaranteed_list(x):
     if not x:
@@ -24,26 +27,89 @@ def realpath(path):
     return os.path.realpath(path)
 
 
+def _is_windows():
+    return platform == 'cygwin' or platform == 'win32'
+
+
 def is_link(path):
-    if platform == 'cygwin' or platform == 'win32':
+    if _is_windows():
         from upkit import win32
         return os.path.islink(path) or win32.is_junction(path)
     else:
         return os.path.islink(path)
 
 
-def remove(path):
-    if platform == 'cygwin' or platform == 'win32':
-        call('cmd /c rm "%s"' % path, shell=True)
+def _check_call(command):
+    """
+    Runs a shell command and raises an error if it fails.
+    :param command:
+    :return:
+    """
+    code = call(command, shell=True)
+    if code != 0:
+        raise RuntimeError('Command "%s" failed with exit code %d.' % (command, code))
+
+
+def _lstat(path):
+    """
+    Stats a path without following symbolic links.
+    :param path:
+    :return: the stat result, or None if the path does not exist.
+    """
+    try:
+        return os.lstat(path)
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENOTDIR):
+            return None
+        raise
+
+
+def _stat(path):
+    """
+    Stats a path, following symbolic links.
+    :param path:
+    :return: the stat result, or None if the path does not exist.
+    """
+    try:
+        return os.stat(path)
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENOTDIR):
+            return None
+        raise
+
+
+def _remove_lstat(path, st):
+    """
+    Removes an existing path given its lstat result: links and files are unlinked, directories are
+    removed recursively.
+    :param path:
+    :param st:
+    :return:
+    """
+    if stat.S_ISDIR(st.st_mode):
+        shutil.rmtree(path)
     else:
-        call('rm "%s"' % path, shell=True)
+        os.unlink(path)
+
+
+def remove(path):
+    os.unlink(path)
 
 
 def rmdir(path):
-    if platform == 'cygwin' or platform == 'win32':
-        call('cmd /c rmdir /Q /S "%s"' % path, shell=True)
+    """
+    rm -rf, a missing path is not an error. Links, junctions included, are removed without following them.
+    :param path:
+    :return:
+    """
+    st = _lstat(path)
+    if st is None:
+        return
+
+    if _is_windows() and is_link(path):
+        fs_unlink(path)
     else:
-        call('rm -rf "%s"' % path, shell=True)
+        _remove_lstat(path, st)
 
 
 def mkdir_p(path):
@@ -71,16 +137,55 @@ def copy(source, target):
         shutil.copy(source, target)
 
 
-def fs_unlink(path):
-    is_directory = os.path.isdir(path)
+def copy_link(source, target):
+    """
+    Creates a link with the same value as an existing link, or on Windows, to the same path.
+    :param source: an existing link.
+    :param target:
+    :return:
+    """
+    if _is_windows():
+        fs_link(realpath(source), target)
+    else:
+        os.symlink(os.readlink(source), target)
+
 
-    if platform == 'cygwin' or platform == 'win32':
-        if is_directory:
-            call('cmd /c rmdir /Q "%s"' % path, shell=True)
+def clone_tree(source, target):
+    """
+    Copies a folder cheaply: folders are created, links are created again with the same value, and files are
+    hard linked, or copied where hard links are not supported.
+    :param source: an existing folder.
+    :param target: the copy to create, its parent folder must exist.
+    :return:
+    """
+    os.mkdir(target)
+    with os.scandir(source) as it:
+        entries = list(it)
+
+    for entry in entries:
+        path = os.path.join(target, entry.name)
+        if is_link(entry.path):
+            copy_link(entry.path, path)
+        elif entry.is_dir(follow_symlinks=False):
+            clone_tree(entry.path, path)
         else:
-            call('cmd /c del /Q "%s"' % path, shell=True)
+            try:
+                os.link(entry.path, path)
+            except OSError:
+                shutil.copy2(entry.path, path)
+
+
+def fs_unlink(path):
+    """
+    Removes a link without following it.
+    :param path:
+    :return:
+    """
+    # on Windows, links to folders and junctions are removed as empty folders.
+    if _is_windows() and os.path.isdir(path):
+        os.rmdir(path)
     else:
-        call('rm "%s"' % path, shell=True)
+        os.unlink(path)
 
 
 def touch(path):
@@ -88,48 +193,52 @@ def touch(path):
         os.utime(path, None)
 
 
-def fs_link(source, target, hard_link=True, forced=False):
+def clear_target(target, forced=False):
     """
-    
-    :param source:
+    Makes way for a new target: an existing target is removed, links without following them, or its parent
+    folders are created.
     :param target:
-    :param hard_link:
-    :param forced:
+    :param forced: remove an existing target, instead of raising an error.
     :return:
     """
-    source = realpath(source)
-    target = os.path.abspath(target)
-
-    if not os.path.exists(source):
-        raise ValueError('Path "%s" does not exist.' % source)
-
-    if os.path.exists(target):
+    # A single lstat tells whether the target exists, and what it is (dangling links included).
+    target_stat = _lstat(target)
+    if target_stat is not None:
         if not forced:
             raise RuntimeError('Path "%s" exists.' % target)
 
-        if is_link(target):
+        if _is_windows() and is_link(target):
             fs_unlink(target)
         else:
-            if os.path.isdir(target):
-                rmdir(target)
-            else:
-                remove(target)
+            _remove_lstat(target, target_stat)
     else:
         parent_dir = os.path.dirname(target)
         mkdir_p(parent_dir)
 
-    is_directory = os.path.isdir(source)
-    print('Create filesystem link: "%s" -> "%s"' % (source, target))
 
-    if platform == 'cygwin' or platform == 'win32':
-        if not is_directory:
-            call('cmd /C mklink "%s" "%s"' % (target, source), shell=True)
-        else:
-            if hard_link:
-                call('cmd /C mklink /J "%s" "%s"' % (target, source), shell=True)
-            else:
-                call('cmd /C mklink /D "%s" "%s"' % (target, source), shell=True)
+@tracing.traced('fs_link', 'fs', lambda source, target, hard_link=True, forced=False: {'target': target})
+def fs_link(source, target, hard_link=True, forced=False):
+    """
+    Creates a filesystem link from target to source.
+    :param source: the existing file or folder.
+    :param target: the link to create, its parent folders are created if needed.
+    :param hard_link: on Windows, link folders using junctions instead of symbolic links.
+    :param forced: replace target if it already exists.
+    :return:
+    """
+    source = realpath(source)
+    target = os.path.abspath(target)
 
-    else:
-        call('ln -s "%s" "%s"' % (source, target), shell=True)
+    source_stat = _stat(source)
+    if source_stat is None:
+        raise ValueError('Path "%s" does not exist.' % source)
+
+    clear_target(target, forced)
 
+    is_directory = stat.S_ISDIR(source_stat.st_mode)
+
+    if _is_windows() and is_directory and hard_link:
+        # junctions do not need the symbolic link privilege, and are only created by mklink.
+        _check_call('cmd /C mklink /J "%s" "%s"' % (target, source))
+    else:
+        os.symlink(source, target, target_is_directory=is_directory)
@@ -0,0 +1,317 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+from upkit import reporting
+
+# inotify(7) flags.
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+_STRUCTURE_EVENTS = _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_CONTENT_EVENTS = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_ATTRIB
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class WatchEvent(object):
+    """
+    A change in a watched folder.
+    """
+
+    def __init__(self, folder, name=None, structure=True):
+        """
+        :param folder: the watched folder, None if changes may have been missed.
+        :param name: the name of the changed entry in folder, None for the folder itself.
+        :param structure: True if entries were added, removed or renamed, False if an entry content changed.
+        """
+        self.folder = folder
+        self.name = name
+        self.structure = structure
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, self.name) if self.name else self.folder
+
+    def __repr__(self):
+        return 'WatchEvent("%s", %s)' % (self.path, 'structure' if self.structure else 'content')
+
+
+class InotifyWatcher(object):
+    """
+    Watches folders with inotify (Linux), without using any CPU while nothing changes.
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, 'inotify_init1 failed: %s' % os.strerror(errno))
+        self._folders = {}
+        self._watches = {}
+
+    @staticmethod
+    def is_supported():
+        return sys.platform.startswith('linux')
+
+    def watch(self, paths):
+        """
+        Watches the given paths instead of the previous ones, the folder of a file being watched for the file.
+        :param paths: folders and files.
+        :return:
+        """
+        folders = set(p if os.path.isdir(p) else os.path.dirname(p) for p in paths)
+
+        for folder in list(self._folders):
+            if folder not in folders:
+                self._libc.inotify_rm_watch(self._fd, self._folders.pop(folder))
+
+        mask = _STRUCTURE_EVENTS | _CONTENT_EVENTS | _IN_ONLYDIR
+        for folder in folders - set(self._folders):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), mask)
+            if wd >= 0:
+                self._folders[folder] = wd
+                self._watches[wd] = folder
+
+    def wait(self, timeout=None):
+        """
+        Waits for changes.
+        :param timeout: in seconds, None to wait until something changes.
+        :return: a list of WatchEvent, empty on timeout.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0')) or None
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                events.append(WatchEvent(None))
+                continue
+
+            folder = self._watches.get(wd, None)
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                if folder is not None and self._folders.get(folder) == wd:
+                    del self._folders[folder]
+                continue
+
+            if folder is not None:
+                events.append(WatchEvent(folder, name, structure=bool(mask & _STRUCTURE_EVENTS)))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(object):
+    """
+    Watches folders and files by comparing their modification times at a fixed interval.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._mtimes = {}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def watch(self, paths):
+        self._mtimes = dict((p, self._mtime(p)) for p in paths)
+
+    def wait(self, timeout=None):
+        started = time.time()
+        while True:
+            events = []
+            for path, mtime in list(self._mtimes.items()):
+                current = self._mtime(path)
+                if current == mtime:
+                    continue
+
+                self._mtimes[path] = current
+                if current is None or mtime is None or os.path.isdir(path):
+                    events.append(WatchEvent(path))
+                else:
+                    events.append(WatchEvent(os.path.dirname(path), os.path.basename(path), structure=False))
+
+            if events:
+                return events
+
+            remaining = None if timeout is None else timeout - (time.time() - started)
+            if remaining is not None and remaining <= 0:
+                return []
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def create_watcher(polling=False, interval=1.0):
+    """
+    :param polling: poll even if inotify is available.
+    :param interval: the polling interval in seconds.
+    :return: an InotifyWatcher, or a PollingWatcher if inotify is not available.
+    """
+    if not polling and InotifyWatcher.is_supported():
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(interval=interval)
+
+
+class LinkWatcher(object):
+    """
+    Links configured links, then relinks those affected by changes in the config file, the linkspecs and the
+    content folders they depend on. Only the changed links are replaced, from the link manifest.
+    """
+
+    def __init__(self, create_linker, config_file, watcher=None, debounce=0.2):
+        """
+        :param create_linker: a function returning a new PackageLinker for the config file.
+        :param config_file:
+        :param watcher: an InotifyWatcher or PollingWatcher, defaults to create_watcher().
+        :param debounce: the quiet time in seconds after a change before relinking, so that bursts of changes are
+        handled at once.
+        """
+        self._create_linker = create_linker
+        self.config_file = os.path.abspath(config_file)
+        self.watcher = watcher or create_watcher()
+        self.debounce = debounce
+        self.linker = None
+        self._operations = []
+        self._dependencies = []
+
+    def link_all(self):
+        """
+        Reloads the config and links all configured links.
+        :return:
+        """
+        self.linker = None
+        linker = self._create_linker()
+        operations = []
+        dependencies = []
+        try:
+            linker.resolve()
+            for link in linker.links:
+                linker.dependencies = set()
+                operations.append(linker.plan_config_link(link))
+                dependencies.append(linker.dependencies)
+        except Exception:
+            # watch what was read, so that fixing the error relinks.
+            self._watch(dependencies + [linker.dependencies])
+            raise
+
+        self.linker = linker
+        self._operations = operations
+        self._dependencies = dependencies
+        self._apply()
+
+    def relink(self, events):
+        """
+        Relinks the links affected by changes.
+        :param events: a list of WatchEvent.
+        :return: the indices of the relinked links, all of them if the config was reloaded.
+        """
+        if self.linker is None or any(e.folder is None or e.path == self.config_file for e in events):
+            self.link_all()
+            return list(range(len(self._operations)))
+
+        affected = [i for i, dependencies in enumerate(self._dependencies)
+                    if any(self._depends(dependencies, e) for e in events)]
+        if not affected:
+            return []
+
+        # linkspecs may have been added to or removed from linked sources.
+        self.linker.linkspec_index.forget(e.folder for e in events if e.structure)
+        try:
+            for i in affected:
+                self.linker.dependencies = set()
+                self._operations[i] = self.linker.plan_config_link(self.linker.links[i])
+                self._dependencies[i] = self.linker.dependencies
+        except Exception:
+            self._dependencies[i] = self._dependencies[i] | self.linker.dependencies
+            self._watch(self._dependencies)
+            raise
+
+        self._apply()
+        return affected
+
+    def run(self):
+        """
+        Links, then relinks on changes until interrupted.
+        :return:
+        """
+        self._safely(self.link_all)
+        while True:
+            events = self.watcher.wait()
+            while events:
+                more = self.watcher.wait(self.debounce)
+                if not more:
+                    break
+                events.extend(more)
+
+            if events:
+                self._safely(self.relink, events)
+
+    def close(self):
+        self.watcher.close()
+
+    @staticmethod
+    def _depends(dependencies, event):
+        if event.structure:
+            return event.folder in dependencies or event.path in dependencies
+        return event.path in dependencies
+
+    def _apply(self):
+        self.linker.apply(self.linker.collapse_links([o for operations in self._operations for o in operations]))
+        self._watch(self._dependencies)
+
+    def _watch(self, dependencies):
+        paths = set([self.config_file])
+        for items in dependencies:
+            paths.update(p for p in items if os.path.exists(p))
+        self.watcher.watch(paths)
+
+    def _safely(self, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            reporter = reporting.get_reporter()
+            reporter.error('Link failed with errors, waiting for changes.')
+            reporter.error(traceback.format_exc())